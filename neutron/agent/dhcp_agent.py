@@ -18,8 +18,10 @@
 import os
 import socket
 import uuid
+import weakref
 
 import eventlet
+from eventlet import semaphore
 import netaddr
 from oslo.config import cfg
 
@@ -33,7 +35,6 @@ from neutron.common import constants
 from neutron.common import exceptions
 from neutron.common import legacy
 from neutron.common import topics
-from neutron.common import utils
 from neutron import context
 from neutron import manager
 from neutron.openstack.common import importutils
@@ -69,6 +70,12 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.IntOpt('dhcp_reload_delay', default=1,
+                   help=_("Number of seconds to wait after a port event "
+                          "before reloading the DHCP server of the network, "
+                          "the port events received in the meantime are "
+                          "applied by the same reload. 0 reloads on every "
+                          "event.")),
     ]
 
     def __init__(self, host=None):
@@ -76,6 +83,11 @@ class DhcpAgent(manager.Manager):
         self.needs_resync = False
         self.conf = cfg.CONF
         self.cache = NetworkCache()
+        # Events are handled under a lock per network, so that the events
+        # of different networks do not wait for each other
+        self._network_locks = weakref.WeakValueDictionary()
+        # Networks with a delayed reload of their allocations
+        self._pending_reloads = set()
         self.root_helper = config.get_root_helper(self.conf)
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
@@ -116,6 +128,15 @@ class DhcpAgent(manager.Manager):
         self.periodic_resync()
         self.lease_relay.start()
 
+    def _network_lock(self, network_id):
+        # The lock is dropped once no greenthread holds a reference on it,
+        # no IO switch can happen between the lookup and the insertion
+        lock = self._network_locks.get(network_id)
+        if lock is None:
+            lock = semaphore.Semaphore()
+            self._network_locks[network_id] = lock
+        return lock
+
     def _ns_name(self, network):
         if self.conf.use_namespaces:
             return NS_PREFIX + network.id
@@ -241,63 +262,94 @@ class DhcpAgent(manager.Manager):
         if new_cidrs:
             self.device_manager.update(network)
 
-    @utils.synchronized('dhcp-agent')
+    def _schedule_reload(self, network_id):
+        """Reload the allocations of a network, after dhcp_reload_delay.
+
+        Must be called with the lock of the network held. A single reload
+        is scheduled for all the calls made until it runs, and it uses the
+        ports in the cache at that time.
+        """
+        if not self.conf.dhcp_reload_delay:
+            self._reload_allocations(network_id)
+        elif network_id not in self._pending_reloads:
+            self._pending_reloads.add(network_id)
+            eventlet.spawn_after(self.conf.dhcp_reload_delay,
+                                 self._delayed_reload,
+                                 network_id)
+
+    def _delayed_reload(self, network_id):
+        with self._network_lock(network_id):
+            # The events received from now on need another reload
+            self._pending_reloads.discard(network_id)
+            self._reload_allocations(network_id)
+
+    def _reload_allocations(self, network_id):
+        network = self.cache.get_network_by_id(network_id)
+        if network:
+            self.call_driver('reload_allocations', network)
+
     def network_create_end(self, context, payload):
         """Handle the network.create.end notification event."""
         network_id = payload['network']['id']
-        self.enable_dhcp_helper(network_id)
+        with self._network_lock(network_id):
+            self.enable_dhcp_helper(network_id)
 
-    @utils.synchronized('dhcp-agent')
     def network_update_end(self, context, payload):
         """Handle the network.update.end notification event."""
         network_id = payload['network']['id']
-        if payload['network']['admin_state_up']:
-            self.enable_dhcp_helper(network_id)
-        else:
-            self.disable_dhcp_helper(network_id)
+        with self._network_lock(network_id):
+            if payload['network']['admin_state_up']:
+                self.enable_dhcp_helper(network_id)
+            else:
+                self.disable_dhcp_helper(network_id)
 
-    @utils.synchronized('dhcp-agent')
     def network_delete_end(self, context, payload):
         """Handle the network.delete.end notification event."""
-        self.disable_dhcp_helper(payload['network_id'])
+        network_id = payload['network_id']
+        with self._network_lock(network_id):
+            self.disable_dhcp_helper(network_id)
 
-    @utils.synchronized('dhcp-agent')
     def subnet_update_end(self, context, payload):
         """Handle the subnet.update.end notification event."""
         network_id = payload['subnet']['network_id']
-        self.refresh_dhcp_helper(network_id)
+        with self._network_lock(network_id):
+            self.refresh_dhcp_helper(network_id)
 
     # Use the update handler for the subnet create event.
     subnet_create_end = subnet_update_end
 
-    @utils.synchronized('dhcp-agent')
     def subnet_delete_end(self, context, payload):
         """Handle the subnet.delete.end notification event."""
         subnet_id = payload['subnet_id']
         network = self.cache.get_network_by_subnet_id(subnet_id)
         if network:
-            self.refresh_dhcp_helper(network.id)
+            with self._network_lock(network.id):
+                self.refresh_dhcp_helper(network.id)
 
-    @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
         """Handle the port.update.end notification event."""
         port = DictModel(payload['port'])
-        network = self.cache.get_network_by_id(port.network_id)
-        if network:
-            self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+        with self._network_lock(port.network_id):
+            network = self.cache.get_network_by_id(port.network_id)
+            if network:
+                self.cache.put_port(port)
+                self._schedule_reload(network.id)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
 
-    @utils.synchronized('dhcp-agent')
     def port_delete_end(self, context, payload):
         """Handle the port.delete.end notification event."""
         port = self.cache.get_port_by_id(payload['port_id'])
-        if port:
-            network = self.cache.get_network_by_id(port.network_id)
-            self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+        if not port:
+            return
+        with self._network_lock(port.network_id):
+            # The network may have been deleted while waiting for the lock
+            port = self.cache.get_port_by_id(payload['port_id'])
+            network = port and self.cache.get_network_by_id(port.network_id)
+            if network:
+                self.cache.remove_port(port)
+                self._schedule_reload(network.id)
 
     def enable_isolated_metadata_proxy(self, network):
 
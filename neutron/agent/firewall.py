@@ -54,6 +54,11 @@ class FirewallDriver(object):
 
     __metaclass__ = abc.ABCMeta
 
+    # Whether the driver keeps the rules and members given to
+    # update_security_group_rules and update_security_group_members, the
+    # ports are then received with the ids of their security groups only
+    supports_security_group_info = False
+
     def prepare_port_filter(self, port):
         """Prepare filters for the port.
 
@@ -84,6 +89,24 @@ class FirewallDriver(object):
         """Stop filtering port."""
         raise NotImplementedError()
 
+    def update_security_group_rules(self, sg_id, sg_rules):
+        """Update the rules of a security group.
+
+        Only used when the ports are received with the ids of their
+        security groups instead of their rules, the rules of the groups
+        of a port apply to it in addition to its security_group_rules.
+        """
+        pass
+
+    def update_security_group_members(self, sg_id, sg_members):
+        """Update the member IPs of a remote security group.
+
+        Only used when the rules are received with their remote_group_id
+        unexpanded, sg_members maps each ethertype to the list of member
+        IPs of the group.
+        """
+        pass
+
     def filter_defer_apply_on(self):
         """Defer application of filtering rule."""
         pass
@@ -17,7 +17,12 @@
 # @author: Dan Wendlandt, Nicira, Inc
 #
 
+import heapq
+import itertools
+import time
+
 import eventlet
+from eventlet import semaphore
 import netaddr
 from oslo.config import cfg
 
@@ -35,7 +40,6 @@ from neutron.common import utils as common_utils
 from neutron import context
 from neutron import manager
 from neutron.openstack.common import importutils
-from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import periodic_task
@@ -49,7 +53,13 @@ LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
-RPC_LOOP_INTERVAL = 1
+
+# Priorities of the router updates, the lowest being processed first
+PRIORITY_RPC_UPDATE = 0
+PRIORITY_SYNC_ROUTERS = 1
+
+UPDATE_ROUTER = 'update'
+DELETE_ROUTER = 'delete'
 
 
 class L3PluginApi(proxy.RpcProxy):
@@ -67,11 +77,17 @@ class L3PluginApi(proxy.RpcProxy):
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.host = host
 
-    def get_routers(self, context, router_ids=None):
-        """Make a remote process call to retrieve the sync data for routers."""
+    def get_routers(self, context, router_ids=None, revisions=None):
+        """Make a remote process call to retrieve the sync data for routers.
+
+        revisions are the revisions of the routers known by the agent, by
+        router id. The routers whose revision did not change are returned
+        flagged as unchanged, without their data.
+        """
         return self.call(context,
                          self.make_msg('sync_routers', host=self.host,
-                                       router_ids=router_ids),
+                                       router_ids=router_ids,
+                                       revisions=revisions),
                          topic=self.topic)
 
     def get_external_network_id(self, context):
@@ -96,6 +112,8 @@ class RouterInfo(object):
         self._snat_action = None
         self.internal_ports = []
         self.floating_ips = []
+        # Revision of the router data last processed successfully
+        self.revision = None
         self.root_helper = root_helper
         self.use_namespaces = use_namespaces
         # Invoke the setter for establishing initial SNAT action
@@ -138,6 +156,157 @@ class RouterInfo(object):
         self._snat_action = None
 
 
+class RouterUpdate(object):
+    """An update or deletion of a router to be processed by the agent.
+
+    router is the sync data of the router, or None if it must be fetched
+    from the server when the update is processed. timestamp is the time
+    at which router was fetched, or the update notified.
+    """
+
+    def __init__(self, router_id, priority, action=UPDATE_ROUTER,
+                 router=None, timestamp=None):
+        self.router_id = router_id
+        self.priority = priority
+        self.action = action
+        self.router = router
+        self.timestamp = timestamp or time.time()
+        self.seq = None
+        self.started_at = None
+
+
+def _needs_fetch(update):
+    """Return whether the router of an update is to be fetched."""
+    return update.action != DELETE_ROUTER and not update.router
+
+
+class RouterUpdateQueue(object):
+    """Queue of the router updates to be processed by the agent workers.
+
+    A single update is kept pending per router: the most recent one, with
+    the highest priority of the updates it replaced. The updates are
+    returned by priority, then in the order they were added, and a router
+    is never returned again before the processing of its previous update
+    is done. The time of the last update processed is kept per router, so
+    that updates older than the state of the router can be ignored.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._pending = {}
+        self._processing = set()
+        self._deferred = set()
+        self._timestamps = {}
+        self._counter = itertools.count()
+        # Counts the entries of the heap
+        self._ready = semaphore.Semaphore(0)
+        self._latency = {'count': 0, 'average': 0, 'max': 0}
+
+    def _push(self, update):
+        heapq.heappush(self._heap,
+                       (update.priority, update.seq, update.router_id))
+        self._ready.release()
+
+    def add(self, update):
+        pending = self._pending.get(update.router_id)
+        if pending:
+            if pending.timestamp > update.timestamp:
+                pending.priority = min(pending.priority, update.priority)
+                update = pending
+            else:
+                update.priority = min(pending.priority, update.priority)
+        update.seq = next(self._counter)
+        self._pending[update.router_id] = update
+        self._push(update)
+
+    def _get(self, blocking=True, accept=None):
+        while True:
+            if not self._ready.acquire(blocking=blocking):
+                return None
+            entry = heapq.heappop(self._heap)
+            priority, seq, router_id = entry
+            update = self._pending.get(router_id)
+            if not update or update.seq != seq:
+                # The entry of an update replaced by a later one
+                continue
+            if router_id in self._processing:
+                self._deferred.add(router_id)
+                continue
+            if accept and not accept(update):
+                # The update is left for the next get
+                heapq.heappush(self._heap, entry)
+                self._ready.release()
+                return None
+            del self._pending[router_id]
+            self._processing.add(router_id)
+            update.started_at = time.time()
+            return update
+
+    def get(self, blocking=True):
+        """Return the next update to be processed.
+
+        Wait for it, unless blocking is False, in which case None is
+        returned if no update is ready.
+        """
+        return self._get(blocking)
+
+    def get_batch(self, size, batchable):
+        """Wait for the next update, and return it in a batch.
+
+        When batchable(update) is true, the next ready updates are added
+        to the batch while they are batchable too, up to size updates.
+        """
+        updates = [self.get()]
+        if batchable(updates[0]):
+            while len(updates) < size:
+                update = self._get(blocking=False, accept=batchable)
+                if not update:
+                    break
+                updates.append(update)
+        return updates
+
+    def done(self, update, timestamp=None):
+        """Release the router of a processed update.
+
+        timestamp is the time of the router state the agent now has, if
+        the processing succeeded.
+        """
+        router_id = update.router_id
+        self._processing.discard(router_id)
+        if timestamp:
+            self._timestamps[router_id] = max(
+                timestamp, self._timestamps.get(router_id, 0))
+        if router_id in self._deferred:
+            self._deferred.remove(router_id)
+            self._push(self._pending[router_id])
+        latency = time.time() - update.started_at
+        count = self._latency['count'] + 1
+        self._latency['average'] += (
+            (latency - self._latency['average']) / count)
+        self._latency['count'] = count
+        self._latency['max'] = max(self._latency['max'], latency)
+        LOG.debug(_("Router %(router_id)s processed in %(latency).3fs"),
+                  {'router_id': router_id, 'latency': latency})
+
+    def is_stale(self, update):
+        return update.timestamp < self._timestamps.get(update.router_id, 0)
+
+    def forget(self, timestamp):
+        """Forget the routers last processed before timestamp."""
+        for router_id, last in self._timestamps.items():
+            if last < timestamp:
+                del self._timestamps[router_id]
+
+    def __len__(self):
+        return len(self._pending)
+
+    def get_stats(self):
+        """Return the queue depth and processing latency of updates."""
+        return {'pending': len(self._pending),
+                'processing': len(self._processing),
+                'latency': dict(self._latency)}
+
+
 class L3NATAgent(manager.Manager):
     """Manager for L3NatAgent
 
@@ -181,6 +350,14 @@ class L3NATAgent(manager.Manager):
                           "by the agents.")),
         cfg.BoolOpt('enable_metadata_proxy', default=True,
                     help=_("Allow running metadata proxy.")),
+        cfg.IntOpt('router_update_workers', default=8,
+                   help=_("Number of routers processed concurrently. "
+                          "Router updates notified by the server are "
+                          "processed before the ones of the periodic "
+                          "resync.")),
+        cfg.IntOpt('router_update_batch_size', default=32,
+                   help=_("Maximum number of routers notified by the server "
+                          "fetched together by a worker.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -206,15 +383,12 @@ class L3NATAgent(manager.Manager):
         self.context = context.get_admin_context_without_session()
         self.plugin_rpc = L3PluginApi(topics.PLUGIN, host)
         self.fullsync = True
-        self.updated_routers = set()
-        self.removed_routers = set()
-        self.sync_progress = False
+        self.router_queue = RouterUpdateQueue()
+        # Whether the external bridge exists, and the external network id
+        self._external_network = None
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
 
-        self.rpc_loop = loopingcall.FixedIntervalLoopingCall(
-            self._rpc_loop)
-        self.rpc_loop.start(interval=RPC_LOOP_INTERVAL)
         super(L3NATAgent, self).__init__(host=self.conf.host)
 
     def _destroy_router_namespaces(self, only_router_id=None):
@@ -605,7 +779,8 @@ class L3NATAgent(manager.Manager):
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
         LOG.debug(_('Got router deleted notification for %s'), router_id)
-        self.removed_routers.add(router_id)
+        self.router_queue.add(RouterUpdate(router_id, PRIORITY_RPC_UPDATE,
+                                           action=DELETE_ROUTER))
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
@@ -614,37 +789,37 @@ class L3NATAgent(manager.Manager):
             # This is needed for backward compatiblity
             if isinstance(routers[0], dict):
                 routers = [router['id'] for router in routers]
-            self.updated_routers.update(routers)
+            for router_id in routers:
+                self.router_queue.add(RouterUpdate(router_id,
+                                                   PRIORITY_RPC_UPDATE))
 
     def router_removed_from_agent(self, context, payload):
         LOG.debug(_('Got router removed from agent :%r'), payload)
-        self.removed_routers.add(payload['router_id'])
+        self.router_deleted(context, payload['router_id'])
 
     def router_added_to_agent(self, context, payload):
         LOG.debug(_('Got router added to agent :%r'), payload)
         self.routers_updated(context, payload)
 
-    def _process_routers(self, routers, all_routers=False):
-        pool = eventlet.GreenPool()
+    def _external_bridge_exists(self):
         if (self.conf.external_network_bridge and
             not ip_lib.device_exists(self.conf.external_network_bridge)):
             LOG.error(_("The external network bridge '%s' does not exist"),
                       self.conf.external_network_bridge)
-            return
-
-        target_ex_net_id = self._fetch_external_net_id()
-        # if routers are all the routers we have (They are from router sync on
-        # starting or when error occurs during running), we seek the
-        # routers which should be removed.
-        # If routers are from server side notification, we seek them
-        # from subset of incoming routers and ones we have now.
-        if all_routers:
-            prev_router_ids = set(self.router_info)
-        else:
-            prev_router_ids = set(self.router_info) & set(
-                [router['id'] for router in routers])
+            return False
+        return True
+
+    def _process_routers(self, routers, target_ex_net_id):
+        # The known routers which are not to be processed anymore, e.g.
+        # because they are now down, are removed
+        prev_router_ids = set(self.router_info) & set(
+            [router['id'] for router in routers])
         cur_router_ids = set()
         for r in routers:
+            if r.get(l3_constants.ROUTER_UNCHANGED_KEY):
+                # The agent asked for revisions, so it knows the router
+                cur_router_ids.add(r['id'])
+                continue
             if not r['admin_state_up']:
                 continue
 
@@ -663,60 +838,172 @@ class L3NATAgent(manager.Manager):
                 self._router_added(r['id'], r)
             ri = self.router_info[r['id']]
             ri.router = r
-            pool.spawn_n(self.process_router, ri)
+            self._process_router_revision(
+                ri, r.get(l3_constants.ROUTER_REVISION_KEY))
         # identify and remove routers that no longer exist
         for router_id in prev_router_ids - cur_router_ids:
-            pool.spawn_n(self._router_removed, router_id)
-        pool.waitall()
-
-    @lockutils.synchronized('l3-agent', 'neutron-')
-    def _rpc_loop(self):
-        # _rpc_loop and _sync_routers_task will not be
-        # executed in the same time because of lock.
-        # so we can clear the value of updated_routers
-        # and removed_routers
-        try:
-            if self.updated_routers:
-                router_ids = list(self.updated_routers)
-                self.updated_routers.clear()
-                routers = self.plugin_rpc.get_routers(
-                    self.context, router_ids)
-                self._process_routers(routers)
-            self._process_router_delete()
-        except Exception:
-            LOG.exception(_("Failed synchronizing routers"))
-            self.fullsync = True
-
-    def _process_router_delete(self):
-        current_removed_routers = list(self.removed_routers)
-        for router_id in current_removed_routers:
             self._router_removed(router_id)
-            self.removed_routers.remove(router_id)
+
+    def _process_router_revision(self, ri, revision):
+        # The revision is only recorded once the router is processed, so
+        # that a router whose processing failed is processed again
+        ri.revision = None
+        self.process_router(ri)
+        ri.revision = revision
+
+    def _router_revisions(self, router_ids=None):
+        """Return the known revisions of the routers, by router id."""
+        if router_ids is None:
+            router_ids = self.router_info.keys()
+        return dict((router_id, self.router_info[router_id].revision)
+                    for router_id in router_ids
+                    if router_id in self.router_info and
+                    self.router_info[router_id].revision)
+
+    def _fetch_routers(self, updates):
+        """Fetch the routers of the updates notified without their data.
+
+        The routers are fetched in a single call. The updates of the
+        routers which were deleted or removed from the agent are turned
+        into deletions. Return whether any router was fetched.
+        """
+        router_ids = [update.router_id for update in updates
+                      if _needs_fetch(update)]
+        if not router_ids:
+            return False
+        timestamp = time.time()
+        routers = dict((router['id'], router) for router in
+                       self.plugin_rpc.get_routers(
+                           self.context, router_ids,
+                           self._router_revisions(router_ids)))
+        for update in updates:
+            if update.router_id in router_ids:
+                update.timestamp = timestamp
+                update.router = routers.get(update.router_id)
+                if not update.router:
+                    update.action = DELETE_ROUTER
+        return True
+
+    def _get_external_network(self, refresh=False):
+        """Return whether the external bridge exists, and the network id.
+
+        They are checked again when refresh is True: once per resync and
+        per batch of routers fetched, rather than for every router.
+        """
+        if refresh or self._external_network is None:
+            bridge_exists = self._external_bridge_exists()
+            ex_net_id = bridge_exists and self._fetch_external_net_id()
+            self._external_network = (bridge_exists, ex_net_id)
+        return self._external_network
+
+    def _process_router_update(self, update, external_network):
+        router_id = update.router_id
+        if update.action == DELETE_ROUTER:
+            if router_id in self.router_info:
+                self._router_removed(router_id)
+            return
+        bridge_exists, target_ex_net_id = external_network
+        if bridge_exists:
+            self._process_routers([update.router], target_ex_net_id)
+
+    def _process_router_batch(self, updates):
+        """Process a batch of router updates.
+
+        The router of each update is released as soon as it is processed.
+        """
+        pending = list(updates)
+
+        def done(update, timestamp=None):
+            pending.remove(update)
+            self.router_queue.done(update, timestamp)
+
+        try:
+            current = []
+            for update in updates:
+                if self.router_queue.is_stale(update):
+                    LOG.debug(_("Ignoring outdated %(action)s of router "
+                                "%(router_id)s"),
+                              {'action': update.action,
+                               'router_id': update.router_id})
+                    done(update)
+                else:
+                    current.append(update)
+            fetched = self._fetch_routers(current)
+            external_network = None
+            if any(update.action != DELETE_ROUTER for update in current):
+                external_network = self._get_external_network(fetched)
+            for update in current:
+                timestamp = None
+                try:
+                    self._process_router_update(update, external_network)
+                    timestamp = update.timestamp
+                except Exception:
+                    LOG.exception(_("Failed processing router %s"),
+                                  update.router_id)
+                    self.fullsync = True
+                finally:
+                    done(update, timestamp)
+        finally:
+            for update in list(pending):
+                done(update)
+
+    def _process_router_updates(self):
+        """Process the router updates of the queue, forever.
+
+        The routers notified by the server without their data are fetched
+        in batches: a worker takes the ones ready together, up to
+        router_update_batch_size. The other updates, e.g. the ones of a
+        resync, are taken one at a time, so that they are processed by all
+        the workers concurrently.
+        """
+        while True:
+            updates = self.router_queue.get_batch(
+                self.conf.router_update_batch_size, _needs_fetch)
+            try:
+                self._process_router_batch(updates)
+            except Exception:
+                LOG.exception(_("Failed processing routers %s"),
+                              [update.router_id for update in updates])
+                self.fullsync = True
 
     def _router_ids(self):
         if not self.conf.use_namespaces:
             return [self.conf.router_id]
 
     @periodic_task.periodic_task
-    @lockutils.synchronized('l3-agent', 'neutron-')
     def _sync_routers_task(self, context):
         if not self.fullsync:
             return
         try:
+            timestamp = time.time()
             router_ids = self._router_ids()
-            self.updated_routers.clear()
-            self.removed_routers.clear()
             routers = self.plugin_rpc.get_routers(
-                context, router_ids)
+                context, router_ids, self._router_revisions())
+            self._get_external_network(refresh=True)
 
             LOG.debug(_('Processing :%r'), routers)
-            self._process_routers(routers, all_routers=True)
+            # The updates of the resync are queued after the ones notified
+            # by the server, and the routers updated since they were
+            # fetched are left as they are
+            for r in routers:
+                if not r.get(l3_constants.ROUTER_UNCHANGED_KEY):
+                    self.router_queue.add(RouterUpdate(
+                        r['id'], PRIORITY_SYNC_ROUTERS, router=r,
+                        timestamp=timestamp))
+            removed_ids = set(self.router_info) - set(r['id'] for r in routers)
+            for router_id in removed_ids:
+                self.router_queue.add(RouterUpdate(
+                    router_id, PRIORITY_SYNC_ROUTERS, action=DELETE_ROUTER,
+                    timestamp=timestamp))
+            self.router_queue.forget(timestamp)
             self.fullsync = False
         except Exception:
             LOG.exception(_("Failed synchronizing routers"))
             self.fullsync = True
 
     def after_start(self):
+        for i in range(self.conf.router_update_workers):
+            eventlet.spawn_n(self._process_router_updates)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -795,6 +1082,7 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        configurations['router_updates'] = self.router_queue.get_stats()
         try:
             self.state_rpc.report_state(self.context, self.agent_state,
                                         self.use_call)
@@ -159,6 +159,21 @@ class DhcpLocalProcess(DhcpBase):
 
         return os.path.join(conf_dir, kind)
 
+    def _replace_conf_file(self, kind, data):
+        """Write a config file unless it already holds data.
+
+        Returns whether the file was written.
+        """
+        file_name = self.get_conf_file_name(kind)
+        try:
+            with open(file_name, 'r') as f:
+                if f.read() == data:
+                    return False
+        except IOError:
+            pass
+        utils.replace_file(file_name, data)
+        return True
+
     def _get_value_from_conf_file(self, kind, converter=None):
         """A helper function to read a value from one of the state files."""
         file_name = self.get_conf_file_name(kind)
@@ -328,8 +343,13 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
-        self._output_hosts_file()
-        self._output_opts_file()
+        # dnsmasq only needs to reread its files when they change
+        changed = [self._replace_conf_file('host', self._make_hosts_file()),
+                   self._replace_conf_file('opts', self._make_opts_file())]
+        if not any(changed):
+            LOG.debug(_('Allocations unchanged for network: %s'),
+                      self.network.id)
+            return
         if self.active:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
@@ -339,6 +359,10 @@ class Dnsmasq(DhcpLocalProcess):
 
     def _output_hosts_file(self):
         """Writes a dnsmasq compatible hosts file."""
+        self._replace_conf_file('host', self._make_hosts_file())
+        return self.get_conf_file_name('host')
+
+    def _make_hosts_file(self):
         r = re.compile('[:.]')
         buf = StringIO.StringIO()
 
@@ -348,14 +372,14 @@ class Dnsmasq(DhcpLocalProcess):
                                        self.conf.dhcp_domain)
                 buf.write('%s,%s,%s\n' %
                           (port.mac_address, name, alloc.ip_address))
-
-        name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
-        return name
+        return buf.getvalue()
 
     def _output_opts_file(self):
         """Write a dnsmasq compatible options file."""
+        self._replace_conf_file('opts', self._make_opts_file())
+        return self.get_conf_file_name('opts')
 
+    def _make_opts_file(self):
         if self.conf.enable_isolated_metadata:
             subnet_to_interface_ip = self._make_subnet_interface_ip_map()
 
@@ -401,10 +425,7 @@ class Dnsmasq(DhcpLocalProcess):
                     options.append(self._format_option(i, 'router', gateway))
                 else:
                     options.append(self._format_option(i, 'router'))
-
-        name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
-        return name
+        return '\n'.join(options)
 
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
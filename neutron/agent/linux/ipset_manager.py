@@ -0,0 +1,94 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Implements ipsets of IP addresses using linux utilities."""
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.common import constants
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# ipset names are limited to 31 characters
+MAX_SET_NAME_LEN = 31
+IPSET_FAMILIES = {constants.IPv4: 'inet',
+                  constants.IPv6: 'inet6'}
+
+
+def get_set_name(name):
+    return name[:MAX_SET_NAME_LEN]
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    The members of the sets created by the manager are kept in memory, so
+    that updating a set only adds and removes the addresses which changed,
+    in a single ipset restore call whatever the number of addresses.
+    """
+
+    def __init__(self, _execute=None, root_helper=None, namespace=None):
+        if _execute:
+            self.execute = _execute
+        else:
+            self.execute = linux_utils.execute
+
+        self.root_helper = root_helper
+        self.namespace = namespace
+        # Members of each set, by set name
+        self.ipsets = {}
+
+    def _ipset(self, args, process_input=None):
+        args = ['ipset'] + args
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        return self.execute(args, process_input=process_input,
+                            root_helper=self.root_helper)
+
+    def set_exists(self, name):
+        return get_set_name(name) in self.ipsets
+
+    def set_members(self, name, ethertype, member_ips):
+        """Create the set if needed and make member_ips its members."""
+        name = get_set_name(name)
+        members = set(member_ips)
+        lines = []
+        old_members = self.ipsets.get(name)
+        if old_members is None:
+            # The set may be left over by a previous run of the agent
+            lines.append('create %s hash:ip family %s' %
+                         (name, IPSET_FAMILIES[ethertype]))
+            lines.append('flush %s' % name)
+            old_members = set()
+        lines += ['add %s %s' % (name, ip)
+                  for ip in sorted(members - old_members)]
+        lines += ['del %s %s' % (name, ip)
+                  for ip in sorted(old_members - members)]
+        if lines:
+            LOG.debug(_("Updating ipset %(name)s: %(count)s change(s)"),
+                      {'name': name, 'count': len(lines)})
+            self._ipset(['restore', '-exist'],
+                        process_input='\n'.join(lines) + '\n')
+        self.ipsets[name] = members
+
+    def destroy_set(self, name):
+        """Destroy a set, which must not be referenced by any rule."""
+        name = get_set_name(name)
+        if name not in self.ipsets:
+            return
+        self._ipset(['destroy', name])
+        del self.ipsets[name]
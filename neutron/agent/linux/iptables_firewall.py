@@ -19,12 +19,15 @@ import netaddr
 from oslo.config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
+cfg.CONF.import_opt('enable_ipset', 'neutron.agent.securitygroups_rpc',
+                    'SECURITYGROUP')
 SG_CHAIN = 'sg-chain'
 INGRESS_DIRECTION = 'ingress'
 EGRESS_DIRECTION = 'egress'
@@ -33,12 +36,20 @@ CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      IP_SPOOF_FILTER: 's'}
 LINUX_DEV_LEN = 14
+IPSET_NAME_PREFIX = 'N'
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
+DIRECTION_IP_PREFIX = {INGRESS_DIRECTION: 'source_ip_prefix',
+                       EGRESS_DIRECTION: 'dest_ip_prefix'}
+IP_MASK = {constants.IPv4: 32,
+           constants.IPv6: 128}
 
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
     """Driver which enforces security groups through iptables rules."""
     IPTABLES_DIRECTION = {INGRESS_DIRECTION: 'physdev-out',
                           EGRESS_DIRECTION: 'physdev-in'}
+    supports_security_group_info = True
 
     def __init__(self):
         self.iptables = iptables_manager.IptablesManager(
@@ -47,6 +58,13 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         # list of port which has security group
         self.filtered_ports = {}
         self._add_fallback_chain_v4v6()
+        self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+        self.ipset = ipset_manager.IpsetManager(
+            root_helper=cfg.CONF.AGENT.root_helper)
+        # rules of each security group and member IPs of each remote
+        # group, when they are not expanded in the rules of the ports
+        self.sg_rules = {}
+        self.sg_members = {}
 
     @property
     def ports(self):
@@ -82,6 +100,58 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._setup_chains()
         self.iptables.apply()
 
+    def update_security_group_rules(self, sg_id, sg_rules):
+        LOG.debug(_("Updating rules of security group %s"), sg_id)
+        self.sg_rules[sg_id] = sg_rules
+
+    def update_security_group_members(self, sg_id, sg_members):
+        LOG.debug(_("Updating members of security group %s"), sg_id)
+        self.sg_members[sg_id] = sg_members
+        if not self.enable_ipset:
+            return
+        # Only the sets rules match on exist, the others are created with
+        # the members of the group by _remote_group_arg when needed
+        for ethertype, member_ips in sg_members.iteritems():
+            name = self._ipset_name(sg_id, ethertype)
+            if self.ipset.set_exists(name):
+                self.ipset.set_members(name, ethertype, member_ips)
+
+    def _ipset_name(self, sg_id, ethertype):
+        return ipset_manager.get_set_name(
+            '%s%s%s' % (IPSET_NAME_PREFIX, ethertype, sg_id))
+
+    def _get_port_sg_rules(self, port):
+        """Return the rules of the security groups of the port."""
+        rules = []
+        for sg_id in port.get('security_groups', []):
+            rules += self.sg_rules.get(sg_id, [])
+        return rules
+
+    def _remove_unused_ipsets(self):
+        """Destroy the ipsets of the groups no rule refers to anymore."""
+        used = set()
+        for port in self.filtered_ports.values():
+            for rule in self._get_port_sg_rules(port):
+                if rule.get('remote_group_id'):
+                    used.add(self._ipset_name(rule['remote_group_id'],
+                                              rule['ethertype']))
+        for name in set(self.ipset.ipsets) - used:
+            self.ipset.destroy_set(name)
+
+    def _remove_unused_security_groups(self):
+        """Forget the groups no filtered port refers to anymore."""
+        sg_ids = set()
+        remote_group_ids = set()
+        for port in self.filtered_ports.values():
+            sg_ids.update(port.get('security_groups', []))
+            for rule in self._get_port_sg_rules(port):
+                if rule.get('remote_group_id'):
+                    remote_group_ids.add(rule['remote_group_id'])
+        for sg_id in set(self.sg_rules) - sg_ids:
+            del self.sg_rules[sg_id]
+        for sg_id in set(self.sg_members) - remote_group_ids:
+            del self.sg_members[sg_id]
+
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
         self._add_chain_by_name_v4v6(SG_CHAIN)
@@ -171,9 +241,34 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         return ipv4_sg_rules, ipv6_sg_rules
 
     def _select_sgr_by_direction(self, port, direction):
-        return [rule
-                for rule in port.get('security_group_rules', [])
-                if rule['direction'] == direction]
+        rules = [rule
+                 for rule in port.get('security_group_rules', [])
+                 if rule['direction'] == direction]
+        for rule in self._get_port_sg_rules(port):
+            if rule['direction'] == direction:
+                rules += self._expand_remote_group_rule(port, rule)
+        return rules
+
+    def _expand_remote_group_rule(self, port, rule):
+        """Convert a remote group rule to one rule per member IP.
+
+        The rule is kept as is when the members are matched with an ipset.
+        """
+        remote_group_id = rule.get('remote_group_id')
+        if not remote_group_id or self.enable_ipset:
+            return [rule.copy()]
+        ethertype = rule['ethertype']
+        direction_ip_prefix = DIRECTION_IP_PREFIX[rule['direction']]
+        members = self.sg_members.get(remote_group_id, {})
+        ip_rules = []
+        for ip in members.get(ethertype, []):
+            if ip in port.get('fixed_ips', []):
+                continue
+            ip_rule = rule.copy()
+            del ip_rule['remote_group_id']
+            ip_rule[direction_ip_prefix] = '%s/%s' % (ip, IP_MASK[ethertype])
+            ip_rules.append(ip_rule)
+        return ip_rules
 
     def _arp_spoofing_rule(self, port):
         return ['-m mac ! --mac-source %s -j DROP' % port['mac_address']]
@@ -257,6 +352,10 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                    rule.get('protocol'),
                                    rule.get('port_range_min'),
                                    rule.get('port_range_max'))
+            # Rules expanded by the server already match a single member
+            if (self.enable_ipset and rule.get('remote_group_id') and
+                    not rule.get(DIRECTION_IP_PREFIX[rule['direction']])):
+                args += self._remote_group_arg(rule)
             args += ['-j RETURN']
             iptables_rules += [' '.join(args)]
 
@@ -295,6 +394,19 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                     '--%ss' % direction,
                     '%s:%s' % (port_range_min, port_range_max)]
 
+    def _remote_group_arg(self, rule):
+        # The members of the remote group are matched with an ipset
+        # instead of one rule per member.
+        name = self._ipset_name(rule['remote_group_id'], rule['ethertype'])
+        if not self.ipset.set_exists(name):
+            # Members not known yet are added by
+            # update_security_group_members
+            members = self.sg_members.get(rule['remote_group_id'], {})
+            self.ipset.set_members(name, rule['ethertype'],
+                                   members.get(rule['ethertype'], []))
+        return ['-m set --match-set %s %s' %
+                (name, IPSET_DIRECTION[rule['direction']])]
+
     def _ip_prefix_arg(self, direction, ip_prefix):
         #NOTE (nati) : source_group_id is converted to list of source_
         # ip_prefix in server side
@@ -311,6 +423,10 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
 
     def filter_defer_apply_off(self):
         self.iptables.defer_apply_off()
+        if self.enable_ipset:
+            # Sets can only be destroyed once no rule matches on them
+            self._remove_unused_ipsets()
+        self._remove_unused_security_groups()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
@@ -261,6 +261,9 @@ class IptablesManager(object):
         self.root_helper = root_helper
         self.namespace = namespace
         self.iptables_apply_deferred = False
+        # Snapshot of the tables as last written by iptables-restore, per
+        # command, used to only rewrite the chains which changed since.
+        self._applied = {}
 
         self.ipv4 = {'filter': IptablesTable()}
         self.ipv6 = {'filter': IptablesTable()}
@@ -338,9 +341,11 @@ class IptablesManager(object):
     def _apply(self):
         """Apply the current in-memory set of iptables rules.
 
-        This will blow away any rules left over from previous runs of the
-        same component of Nova, and replace them with our current set of
-        rules. This happens atomically, thanks to iptables-restore.
+        The first apply rewrites the tables with _apply_full. After that,
+        only the wrapped chains whose rules changed since the previous
+        apply are rewritten, with iptables-restore --noflush. The full
+        rewrite is used again when the unwrapped chains or rules change,
+        and to recover when the incremental update fails.
 
         """
         s = [('iptables', self.ipv4)]
@@ -348,23 +353,123 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            self.execute(args, process_input='\n'.join(all_lines),
-                         root_helper=self.root_helper)
+            snapshot = dict((table_name, self._get_table_snapshot(table))
+                            for table_name, table in tables.iteritems())
+            # Forget the previous state until this apply succeeds
+            applied = self._applied.pop(cmd, None)
+            if self._can_apply_incremental(applied, snapshot):
+                try:
+                    self._apply_incremental(cmd, tables, applied, snapshot)
+                except RuntimeError:
+                    LOG.exception(_("Incremental %s-restore failed, "
+                                    "rewriting all the tables"), cmd)
+                    self._apply_full(cmd, tables)
+            else:
+                self._apply_full(cmd, tables)
+            self._applied[cmd] = snapshot
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _get_table_snapshot(self, table):
+        """Return the rules of a table as applied by iptables-restore.
+
+        The snapshot is a dict mapping the name of each wrapped chain to
+        its list of rules, in the order used by _modify_rules, along with
+        the unwrapped chains and rules of the table.
+        """
+        chains = dict(('%s-%s' % (binary_name, name), [])
+                      for name in table.chains)
+        unwrapped_rules = []
+        rules = ([rule for rule in table.rules if rule.top] +
+                 [rule for rule in table.rules if not rule.top])
+        for rule in rules:
+            if not rule.wrap:
+                unwrapped_rules.append(str(rule))
+                continue
+            chain_rules = chains['%s-%s' % (binary_name, rule.chain)]
+            rule_str = str(rule)
+            # Like _modify_rules, keep the last occurrence of duplicates
+            if rule_str in chain_rules:
+                chain_rules.remove(rule_str)
+            chain_rules.append(rule_str)
+        return chains, (frozenset(table.unwrapped_chains), unwrapped_rules)
+
+    def _can_apply_incremental(self, applied, snapshot):
+        if applied is None or set(applied) != set(snapshot):
+            return False
+        for table_name, (_chains, unwrapped) in snapshot.iteritems():
+            # The unwrapped chains are shared with other components, they
+            # can't be flushed and are only updated by _modify_rules.
+            if unwrapped != applied[table_name][1]:
+                return False
+        return True
+
+    def _get_incremental_lines(self, table_name, old_chains, new_chains):
+        """Return the iptables-restore --noflush input for a table.
+
+        With --noflush, declaring an existing chain flushes it, so the
+        changed chains are declared and their rules appended again. The
+        removed chains are flushed before being deleted, once the rules
+        jumping to them are gone.
+        """
+        dirty = [name for name, rules in new_chains.iteritems()
+                 if old_chains.get(name) != rules]
+        removed = [name for name in old_chains if name not in new_chains]
+        if not dirty and not removed:
+            return []
+
+        lines = ['# Generated by iptables_manager', '*' + table_name]
+        lines += [':%s - [0:0]' % name for name in sorted(dirty + removed)]
+        for name in sorted(dirty):
+            lines += new_chains[name]
+        lines += ['-X %s' % name for name in sorted(removed)]
+        lines += ['COMMIT', '# Completed by iptables_manager']
+        return lines
+
+    def _apply_incremental(self, cmd, tables, applied, snapshot):
+        for table in tables.itervalues():
+            # The unwrapped chains and rules to remove were added and
+            # removed since the last apply, they were never written.
+            table.remove_chains.clear()
+            del table.remove_rules[:]
+
+        all_lines = []
+        for table_name in sorted(snapshot):
+            all_lines += self._get_incremental_lines(
+                table_name, applied[table_name][0], snapshot[table_name][0])
+        if not all_lines:
+            LOG.debug(_("No chain changed, skipping %s-restore"), cmd)
+            return
+
+        args = ['%s-restore' % (cmd,), '-n']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        self.execute(args, process_input='\n'.join(all_lines) + '\n',
+                     root_helper=self.root_helper)
+
+    def _apply_full(self, cmd, tables):
+        """Rewrite all the tables of an iptables command.
+
+        This will blow away any rules left over from previous runs of the
+        same component of Nova, and replace them with our current set of
+        rules. This happens atomically, thanks to iptables-restore.
+
+        """
+        args = ['%s-save' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        all_tables = self.execute(args, root_helper=self.root_helper)
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+
+        args = ['%s-restore' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        self.execute(args, process_input='\n'.join(all_lines),
+                     root_helper=self.root_helper)
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
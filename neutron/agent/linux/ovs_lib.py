@@ -18,6 +18,8 @@
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
+import contextlib
+import itertools
 import re
 
 from neutron.agent.linux import ip_lib
@@ -49,6 +51,8 @@ class OVSBridge:
         self.br_name = br_name
         self.root_helper = root_helper
         self.re_id = self.re_compile_id()
+        self.defer_apply_flows = False
+        self.deferred_flows = []
 
     def re_compile_id(self):
         external = 'external_ids\s*'
@@ -92,13 +96,16 @@ class OVSBridge:
         args = ["clear", table_name, record, column]
         self.run_vsctl(args)
 
-    def run_ofctl(self, cmd, args):
+    def run_ofctl(self, cmd, args, process_input=None, check_error=False):
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
         try:
-            return utils.execute(full_args, root_helper=self.root_helper)
+            return utils.execute(full_args, root_helper=self.root_helper,
+                                 process_input=process_input)
         except Exception as e:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': full_args, 'exception': e})
+            if check_error:
+                raise
 
     def count_flows(self):
         flow_list = self.run_ofctl("dump-flows", []).split("\n")[1:]
@@ -146,7 +153,7 @@ class OVSBridge:
             flow_expr_arr.append(match)
         return flow_expr_arr
 
-    def add_flow(self, **kwargs):
+    def add_or_mod_flow_str(self, **kwargs):
         if "actions" not in kwargs:
             raise Exception(_("Must specify one or more actions"))
         if "priority" not in kwargs:
@@ -154,8 +161,21 @@ class OVSBridge:
 
         flow_expr_arr = self._build_flow_expr_arr(**kwargs)
         flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
-        flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("add-flow", [flow_str])
+        return ",".join(flow_expr_arr)
+
+    def add_flow(self, **kwargs):
+        flow_str = self.add_or_mod_flow_str(**kwargs)
+        if self.defer_apply_flows:
+            self.deferred_flows.append(('add', flow_str))
+        else:
+            self.run_ofctl("add-flow", [flow_str])
+
+    def mod_flow(self, **kwargs):
+        flow_str = self.add_or_mod_flow_str(**kwargs)
+        if self.defer_apply_flows:
+            self.deferred_flows.append(('mod', flow_str))
+        else:
+            self.run_ofctl("mod-flows", [flow_str])
 
     def delete_flows(self, **kwargs):
         kwargs['delete'] = True
@@ -163,7 +183,53 @@ class OVSBridge:
         if "actions" in kwargs:
             flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("del-flows", [flow_str])
+        if self.defer_apply_flows and flow_str:
+            self.deferred_flows.append(('del', flow_str))
+        else:
+            if self.defer_apply_flows:
+                # Deleting every flow supersedes all the pending changes
+                self.deferred_flows = []
+            self.run_ofctl("del-flows", [flow_str])
+
+    def defer_apply_on(self):
+        LOG.debug(_('defer_apply_on'))
+        self.defer_apply_flows = True
+
+    def defer_apply_off(self):
+        """Apply the deferred flows, return whether all of them were."""
+        LOG.debug(_('defer_apply_off'))
+        deferred_flows = self.deferred_flows
+        self.defer_apply_flows = False
+        self.deferred_flows = []
+        applied = True
+        # Consecutive flows of the same kind are fed to a single ovs-ofctl
+        # invocation through stdin, preserving the order in which the
+        # adds, mods and deletes were requested.
+        for action, flows in itertools.groupby(deferred_flows,
+                                               lambda flow: flow[0]):
+            flow_strs = [flow_str for action, flow_str in flows]
+            LOG.debug(_('Applying %(count)s deferred %(action)s flows to '
+                        'bridge %(bridge)s'),
+                      {'count': len(flow_strs), 'action': action,
+                       'bridge': self.br_name})
+            try:
+                self.run_ofctl('%s-flows' % action, ['-'],
+                               '\n'.join(flow_strs) + '\n',
+                               check_error=True)
+            except Exception:
+                # A single bad flow fails the whole batch, the next
+                # batches are still applied
+                applied = False
+        return applied
+
+    @contextlib.contextmanager
+    def deferred_apply(self):
+        """Batch the flow changes made within the context."""
+        self.defer_apply_on()
+        try:
+            yield
+        finally:
+            self.defer_apply_off()
 
     def add_tunnel_port(self, port_name, remote_ip, local_ip,
                         tunnel_type=constants.TYPE_GRE,
@@ -0,0 +1,175 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Red Hat, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+
+from neutron.agent.linux import async_process
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class OvsdbMonitor(async_process.AsyncProcess):
+    """Manages an invocation of 'ovsdb-client monitor'."""
+
+    def __init__(self, table_name, columns=None, format=None,
+                 root_helper=None, respawn_interval=None):
+
+        cmd = ['ovsdb-client', 'monitor', table_name]
+        if columns:
+            cmd.append(','.join(columns))
+        if format:
+            cmd.append('--format=%s' % format)
+        super(OvsdbMonitor, self).__init__(cmd,
+                                           root_helper=root_helper,
+                                           respawn_interval=respawn_interval)
+
+    def _read_stdout(self):
+        data = super(OvsdbMonitor, self)._read_stdout()
+        if data:
+            LOG.debug(_('Output received from ovsdb monitor: %s'), data)
+        return data
+
+    def _read_stderr(self):
+        data = super(OvsdbMonitor, self)._read_stderr()
+        if data:
+            LOG.error(_('Error received from ovsdb monitor: %s'), data)
+            # Do not return value to ensure that stderr output will
+            # stop the monitor.
+
+
+class SimpleInterfaceMonitor(OvsdbMonitor):
+    """Monitors the Interface table of the local host's ovsdb for changes.
+
+    The row-change stream is parsed incrementally so that the VIF
+    ports (interfaces with both an 'iface-id' and an 'attached-mac'
+    external id) added or removed since the last check can be
+    retrieved via get_events() without forking ovs-vsctl.
+    """
+
+    def __init__(self, root_helper=None, respawn_interval=None):
+        super(SimpleInterfaceMonitor, self).__init__(
+            'Interface',
+            columns=['name', 'external_ids'],
+            format='json',
+            root_helper=root_helper,
+            respawn_interval=respawn_interval,
+        )
+        self.data_received = False
+        self._reset_vifs()
+
+    def _reset_vifs(self):
+        # Maps ovsdb row uuids to (port_name, iface_id) of VIF ports
+        self._vifs = {}
+        self._reported_vifs = set()
+        self._resync_required = False
+
+    @property
+    def is_active(self):
+        return (self.data_received and
+                self._kill_event and
+                not self._kill_event.ready())
+
+    def start(self, block=False, timeout=5):
+        super(SimpleInterfaceMonitor, self).start()
+        if block:
+            with eventlet.timeout.Timeout(timeout):
+                while not self.is_active:
+                    eventlet.sleep()
+
+    def _spawn(self):
+        # Output left over from a previous invocation must not be
+        # applied on top of the state rebuilt from the initial rows
+        # of the new one.
+        self._reset_queues()
+        self._reset_vifs()
+        super(SimpleInterfaceMonitor, self)._spawn()
+
+    def _kill(self, *args, **kwargs):
+        self.data_received = False
+        super(SimpleInterfaceMonitor, self)._kill(*args, **kwargs)
+
+    def _read_stdout(self):
+        data = super(SimpleInterfaceMonitor, self)._read_stdout()
+        if data and not self.data_received:
+            self.data_received = True
+        return data
+
+    def _process_output(self):
+        for line in self.iter_stdout():
+            try:
+                self._process_update(jsonutils.loads(line))
+            except (ValueError, KeyError, IndexError, TypeError):
+                LOG.exception(_('Unable to parse ovsdb monitor output: %s'),
+                              line)
+                self._resync_required = True
+
+    def _process_update(self, update):
+        headings = update['headings']
+        row_idx = headings.index('row')
+        action_idx = headings.index('action')
+        name_idx = headings.index('name')
+        ids_idx = headings.index('external_ids')
+        for row in update['data']:
+            row_uuid = row[row_idx]
+            action = row[action_idx]
+            if action == 'delete':
+                self._vifs.pop(row_uuid, None)
+            elif action in ('initial', 'insert', 'new'):
+                external_ids = dict(row[ids_idx][1])
+                if ('iface-id' in external_ids and
+                        'attached-mac' in external_ids):
+                    self._vifs[row_uuid] = (row[name_idx],
+                                            external_ids['iface-id'])
+                else:
+                    self._vifs.pop(row_uuid, None)
+                    if ('xs-vif-uuid' in external_ids and
+                            'attached-mac' in external_ids):
+                        # The iface-id has to be retrieved from XAPI,
+                        # which only a full poll knows how to do.
+                        self._resync_required = True
+            # 'old' rows only carry the previous value of the modified
+            # columns and are superseded by the following 'new' row.
+
+    def pop_resync_required(self):
+        """Indicate whether changes were seen that require a full poll.
+
+        The indication is reset once it has been retrieved.
+        """
+        self._process_output()
+        resync_required = self._resync_required
+        self._resync_required = False
+        return resync_required
+
+    def get_events(self):
+        """Retrieve the VIF port changes seen since the last call.
+
+        :returns: a dict with the 'added' and 'removed' sets of
+                  iface-ids, and a 'port_names' map of the iface-id of
+                  every known VIF port to its port name.
+        """
+        self._process_output()
+        port_names = dict((iface_id, name)
+                          for name, iface_id in self._vifs.itervalues())
+        current = set(port_names)
+        added = current - self._reported_vifs
+        removed = self._reported_vifs - current
+        self._reported_vifs = current
+        return {'added': added,
+                'removed': removed,
+                'port_names': port_names}
@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo.config import cfg
+
 from neutron.common import topics
 
 from neutron.openstack.common import log as logging
@@ -25,6 +27,14 @@ from neutron.openstack.common import timeutils
 
 LOG = logging.getLogger(__name__)
 
+DEVICE_RPC_OPTS = [
+    cfg.IntOpt('devices_details_batch_size', default=100,
+               help=_("Maximum number of devices whose details are "
+                      "requested to, or whose status is reported to, the "
+                      "plugin in a single RPC call")),
+]
+cfg.CONF.register_opts(DEVICE_RPC_OPTS, 'AGENT')
+
 
 def create_consumers(dispatcher, prefix, topic_details):
     """Create agent RPC consumers.
@@ -68,6 +78,8 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.2 - get_devices_details_list
+        1.3 - update_devices_down
 
     '''
 
@@ -83,6 +95,29 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def _call_by_batch(self, context, method, devices, agent_id, version):
+        """Call method for the devices, by batches of devices.
+
+        The batches hold at most devices_details_batch_size devices, the
+        lists returned by the calls are concatenated.
+        """
+        devices = list(devices)
+        batch_size = max(cfg.CONF.AGENT.devices_details_batch_size, 1)
+        result = []
+        for i in xrange(0, len(devices), batch_size):
+            result += self.call(
+                context,
+                self.make_msg(method,
+                              devices=devices[i:i + batch_size],
+                              agent_id=agent_id),
+                topic=self.topic, version=version)
+        return result
+
+    def get_devices_details_list(self, context, devices, agent_id):
+        """Return the details of the devices."""
+        return self._call_by_batch(context, 'get_devices_details_list',
+                                   devices, agent_id, '1.2')
+
     def update_device_down(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_down', device=device,
@@ -95,6 +130,15 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def update_devices_down(self, context, devices, agent_id):
+        """Set the devices down, returns whether each of them exists.
+
+        The result is a list of dicts with the device and exists keys, in
+        the order of devices.
+        """
+        return self._call_by_batch(context, 'update_devices_down',
+                                   devices, agent_id, '1.3')
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None):
         return self.call(context,
                          self.make_msg('tunnel_sync', tunnel_ip=tunnel_ip,
@@ -21,15 +21,26 @@ from oslo.config import cfg
 from neutron.common import topics
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common.rpc import common as rpc_common
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
+# security_group_info_for_devices is dispatched to the plugin RPC callbacks
+# the server mixins are part of, its version follows theirs
+SG_INFO_RPC_VERSION = "1.4"
 
 security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
         default='neutron.agent.firewall.NoopFirewallDriver',
-        help=_('Driver for Security Groups Firewall'))
+        help=_('Driver for Security Groups Firewall')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Match the members of remote security groups with one '
+               'ipset per group instead of one rule per member. Requires '
+               'the security_group_info_for_devices RPC call on the '
+               'server'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -47,7 +58,13 @@ def disable_security_group_extension_if_noop_driver(
 
 
 class SecurityGroupServerRpcApiMixin(object):
-    """A mix-in that enable SecurityGroup support in plugin rpc."""
+    """A mix-in that enable SecurityGroup support in plugin rpc.
+
+    API version history:
+        1.1 - Initial version.
+        1.4 - security_group_info_for_devices
+
+    """
     def security_group_rules_for_devices(self, context, devices):
         LOG.debug(_("Get security group rules "
                     "for devices via rpc %r"), devices)
@@ -57,6 +74,15 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
+                                       devices=devices),
+                         version=SG_INFO_RPC_VERSION,
+                         topic=self.topic)
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -96,21 +122,65 @@ class SecurityGroupAgentRpcMixin(object):
     support in agent implementations.
     """
 
+    # Whether both the firewall driver and the server support
+    # security_group_info_for_devices, checked on first use
+    _use_enhanced_rpc = None
+
     def init_firewall(self):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
         LOG.debug(_("Init firewall settings (driver=%s)"), firewall_driver)
         self.firewall = importutils.import_object(firewall_driver)
 
+    @property
+    def use_enhanced_rpc(self):
+        if self._use_enhanced_rpc is None:
+            self._use_enhanced_rpc = (
+                self.firewall.supports_security_group_info and
+                self._check_enhanced_rpc_is_supported_by_server())
+        return self._use_enhanced_rpc
+
+    def _check_enhanced_rpc_is_supported_by_server(self):
+        try:
+            self.plugin_rpc.security_group_info_for_devices(self.context,
+                                                            [])
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.warning(_("security_group_info_for_devices is not "
+                          "supported by the server, falling back to "
+                          "security_group_rules_for_devices"))
+            return False
+        return True
+
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._get_devices_info(list(device_ids))
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
 
+    def _get_devices_info(self, device_ids):
+        """Return the ports of the devices.
+
+        When the firewall driver and the server support it, the rules of
+        the security groups and the member IPs of the remote groups are
+        received once each and given to the firewall, which keeps them,
+        instead of being expanded in the security_group_rules of every
+        port.
+        """
+        if not self.use_enhanced_rpc:
+            return self.plugin_rpc.security_group_rules_for_devices(
+                self.context, device_ids)
+        sg_info = self.plugin_rpc.security_group_info_for_devices(
+            self.context, device_ids)
+        for sg_id, sg_rules in sg_info['security_groups'].iteritems():
+            self.firewall.update_security_group_rules(sg_id, sg_rules)
+        for sg_id, sg_members in sg_info['sg_member_ips'].iteritems():
+            self.firewall.update_security_group_members(sg_id, sg_members)
+        return sg_info['devices']
+
     def security_groups_rule_updated(self, security_groups):
         LOG.info(_("Security group "
                    "rule updated %r"), security_groups)
@@ -132,7 +202,14 @@ class SecurityGroupAgentRpcMixin(object):
             if sec_grp_set & set(device.get(attribute, [])):
                 devices.append(device)
 
-        if devices:
+        if not devices:
+            return
+        if (attribute == 'security_group_source_groups' and
+                cfg.CONF.SECURITYGROUP.enable_ipset and
+                self.use_enhanced_rpc):
+            # Only the ipsets of the groups change, not the port rules
+            self._get_devices_info([d['device'] for d in devices])
+        else:
             self.refresh_firewall(devices)
 
     def security_groups_provider_updated(self):
@@ -160,8 +237,7 @@ class SecurityGroupAgentRpcMixin(object):
         if not device_ids:
             LOG.info(_("No ports here to refresh firewall"))
             return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        devices = self._get_devices_info(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 LOG.debug(_("Update port filter for %s"), device['device'])
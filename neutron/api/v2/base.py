@@ -25,6 +25,7 @@ from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
 from neutron.api.v2 import attributes
 from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import exceptions
+from neutron.openstack.common import excutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common.notifier import api as notifier_api
 from neutron import policy
@@ -230,6 +231,10 @@ class Controller(object):
         if do_authz:
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
+            # Load the parent resources needed by the policy checks at once
+            policy.prefetch_parents(request.context,
+                                    self._plugin_handlers[self.SHOW],
+                                    obj_list)
             # Omit items from list that should not be visible
             obj_list = [obj for obj in obj_list
                         if policy.check(request.context,
@@ -342,35 +347,18 @@ class Controller(object):
         if self._collection in body:
             # Have to account for bulk create
             items = body[self._collection]
-            deltas = {}
-            bulk = True
         else:
             items = [body]
-            bulk = False
+        deltas = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
             policy.enforce(request.context,
                            action,
                            item[self._resource])
-            try:
-                tenant_id = item[self._resource]['tenant_id']
-                count = quota.QUOTAS.count(request.context, self._resource,
-                                           self._plugin, self._collection,
-                                           tenant_id)
-                if bulk:
-                    delta = deltas.get(tenant_id, 0) + 1
-                    deltas[tenant_id] = delta
-                else:
-                    delta = 1
-                kwargs = {self._resource: count + delta}
-            except exceptions.QuotaResourceUnknown as e:
-                # We don't want to quota this resource
-                LOG.debug(e)
-            else:
-                quota.QUOTAS.limit_check(request.context,
-                                         item[self._resource]['tenant_id'],
-                                         **kwargs)
+            tenant_id = item[self._resource]['tenant_id']
+            deltas[tenant_id] = deltas.get(tenant_id, 0) + 1
+        reservations = self._make_reservations(request.context, deltas)
 
         def notify(create_result):
             notifier_method = self._resource + '.create.end'
@@ -385,24 +373,50 @@ class Controller(object):
             return create_result
 
         kwargs = {self._parent_id_name: parent_id} if parent_id else {}
-        if self._collection in body and self._native_bulk:
-            # plugin does atomic bulk create operations
-            obj_creator = getattr(self._plugin, "%s_bulk" % action)
-            objs = obj_creator(request.context, body, **kwargs)
-            return notify({self._collection: [self._view(request.context, obj)
-                                              for obj in objs]})
-        else:
-            obj_creator = getattr(self._plugin, action)
-            if self._collection in body:
-                # Emulate atomic bulk behavior
-                objs = self._emulate_bulk_create(obj_creator, request,
-                                                 body, parent_id)
-                return notify({self._collection: objs})
+        try:
+            if self._collection in body and self._native_bulk:
+                # plugin does atomic bulk create operations
+                obj_creator = getattr(self._plugin, "%s_bulk" % action)
+                objs = obj_creator(request.context, body, **kwargs)
+                result = {self._collection: [self._view(request.context, obj)
+                                             for obj in objs]}
             else:
-                kwargs.update({self._resource: body})
-                obj = obj_creator(request.context, **kwargs)
-                return notify({self._resource: self._view(request.context,
-                                                          obj)})
+                obj_creator = getattr(self._plugin, action)
+                if self._collection in body:
+                    # Emulate atomic bulk behavior
+                    objs = self._emulate_bulk_create(obj_creator, request,
+                                                     body, parent_id)
+                    result = {self._collection: objs}
+                else:
+                    kwargs.update({self._resource: body})
+                    obj = obj_creator(request.context, **kwargs)
+                    result = {self._resource: self._view(request.context,
+                                                         obj)}
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for reservation in reservations:
+                    quota.QUOTAS.cancel_reservation(request.context,
+                                                    reservation)
+        for reservation in reservations:
+            quota.QUOTAS.commit_reservation(request.context, reservation)
+        return notify(result)
+
+    def _make_reservations(self, context, deltas):
+        """Reserve the resources to be created, by tenant."""
+        reservations = []
+        try:
+            for tenant_id, delta in deltas.items():
+                reservations.append(quota.QUOTAS.make_reservation(
+                    context, tenant_id, self._resource, delta, self._plugin,
+                    self._collection))
+        except exceptions.QuotaResourceUnknown as e:
+            # We don't want to quota this resource
+            LOG.debug(e)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for reservation in reservations:
+                    quota.QUOTAS.cancel_reservation(context, reservation)
+        return reservations
 
     def delete(self, request, id, **kwargs):
         """Deletes the specified entity."""
@@ -74,6 +74,11 @@ core_opts = [
     cfg.IntOpt('dhcp_lease_duration', default=120,
                deprecated_name='dhcp_lease_time',
                help=_("DHCP lease duration")),
+    cfg.IntOpt('ip_allocation_reap_interval', default=60,
+               help=_("Seconds between two runs of the task returning IP "
+                      "addresses with expired DHCP leases to their "
+                      "allocation pools. Set to 0 to recycle them when "
+                      "ports are created or updated instead")),
     cfg.BoolOpt('dhcp_agent_notification', default=True,
                 help=_("Allow sending resource operation"
                        " notification to DHCP agent")),
@@ -30,6 +30,9 @@ DEVICE_OWNER_DHCP = "network:dhcp"
 
 FLOATINGIP_KEY = '_floatingips'
 INTERFACE_KEY = '_interfaces'
+# Keys of the routers synchronized by the l3 agents
+ROUTER_REVISION_KEY = '_revision'
+ROUTER_UNCHANGED_KEY = '_unchanged'
 
 IPv4 = 'IPv4'
 IPv6 = 'IPv6'
@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 from neutron import context
 from neutron.openstack.common import log as logging
 from neutron.openstack.common.rpc import dispatcher
@@ -22,6 +24,29 @@ from neutron.openstack.common.rpc import dispatcher
 
 LOG = logging.getLogger(__name__)
 
+# Latency of the messages dispatched by this process, by method name
+_dispatch_stats = {}
+
+
+def _record_latency(method, latency):
+    stats = _dispatch_stats.setdefault(
+        method, {'count': 0, 'total': 0.0, 'max': 0.0})
+    stats['count'] += 1
+    stats['total'] += latency
+    stats['max'] = max(stats['max'], latency)
+
+
+def get_dispatch_stats():
+    """Return the statistics of the messages dispatched by this process.
+
+    The result is a dict of the count, average and maximum dispatch time in
+    seconds of the messages, by method name.
+    """
+    return dict((method, {'count': stats['count'],
+                          'average': stats['total'] / stats['count'],
+                          'max': stats['max']})
+                for method, stats in _dispatch_stats.iteritems())
+
 
 class PluginRpcDispatcher(dispatcher.RpcDispatcher):
     """This class is used to convert RPC common context into
@@ -40,5 +65,9 @@ class PluginRpcDispatcher(dispatcher.RpcDispatcher):
         if not tenant_id:
             tenant_id = rpc_ctxt_dict.pop('project_id', None)
         neutron_ctxt = context.Context(user_id, tenant_id, **rpc_ctxt_dict)
-        return super(PluginRpcDispatcher, self).dispatch(
-            neutron_ctxt, version, method, namespace, **kwargs)
+        start = time.time()
+        try:
+            return super(PluginRpcDispatcher, self).dispatch(
+                neutron_ctxt, version, method, namespace, **kwargs)
+        finally:
+            _record_latency(method, time.time() - start)
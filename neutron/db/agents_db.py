@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+
 from oslo.config import cfg
 import sqlalchemy as sa
 from sqlalchemy.orm import exc
@@ -31,6 +33,11 @@ LOG = logging.getLogger(__name__)
 cfg.CONF.register_opt(
     cfg.IntOpt('agent_down_time', default=5,
                help=_("Seconds to regard the agent is down.")))
+cfg.CONF.register_opt(
+    cfg.IntOpt('agent_heartbeat_flush_interval', default=1,
+               help=_("Seconds between the batched writes of the agent "
+                      "heartbeats to the database, 0 writing each "
+                      "heartbeat when it is reported.")))
 
 
 class Agent(model_base.BASEV2, models_v2.HasId):
@@ -57,6 +64,81 @@ class Agent(model_base.BASEV2, models_v2.HasId):
     configurations = sa.Column(sa.String(4095), nullable=False)
 
 
+class AgentHeartbeats(object):
+    """In-memory table of the latest heartbeats of the agents.
+
+    The heartbeats reported to this server are recorded in memory and
+    written to the database in batches by flush, so the liveness of an
+    agent is its latest heartbeat, either recorded here or in the database
+    by another server.
+    """
+
+    def __init__(self):
+        # Latest heartbeat by agent id
+        self.heartbeats = {}
+        # Heartbeats not written to the database yet, by agent id
+        self.pending = {}
+        self.last_flush = timeutils.utcnow()
+
+    def report(self, agent_id, timestamp):
+        self.heartbeats[agent_id] = timestamp
+        self.pending[agent_id] = timestamp
+
+    def written(self, agent_id, timestamp):
+        self.heartbeats[agent_id] = timestamp
+        self.pending.pop(agent_id, None)
+
+    def forget(self, agent_id):
+        self.heartbeats.pop(agent_id, None)
+        self.pending.pop(agent_id, None)
+
+    def get(self, agent):
+        heartbeat = self.heartbeats.get(agent['id'])
+        if heartbeat and heartbeat > agent['heartbeat_timestamp']:
+            return heartbeat
+        return agent['heartbeat_timestamp']
+
+    def flush_needed(self):
+        return (self.pending and
+                timeutils.is_older_than(
+                    self.last_flush,
+                    cfg.CONF.agent_heartbeat_flush_interval))
+
+    def flush(self, session):
+        """Write the pending heartbeats with a single UPDATE statement.
+
+        Returns the ids of the agents missing from the database, which
+        were deleted since they were last written.
+        """
+        pending, self.pending = self.pending, {}
+        self.last_flush = timeutils.utcnow()
+        if not pending:
+            return set()
+        table = Agent.__table__
+        update = table.update().where(
+            table.c.id == sa.bindparam('agent_id')).values(
+                heartbeat_timestamp=sa.bindparam('heartbeat'))
+        with session.begin(subtransactions=True):
+            session.execute(update,
+                            [{'agent_id': agent_id, 'heartbeat': heartbeat}
+                             for agent_id, heartbeat in pending.iteritems()])
+            found = set(row[0] for row in session.query(Agent.id).filter(
+                Agent.id.in_(pending.keys())))
+        LOG.debug(_("Wrote the heartbeats of %d agent(s)"), len(pending))
+        missing = set(pending) - found
+        for agent_id in missing:
+            self.forget(agent_id)
+        return missing
+
+
+_heartbeats = AgentHeartbeats()
+
+
+def get_heartbeat_timestamp(agent):
+    """Return the latest heartbeat of agent, even if not written yet."""
+    return _heartbeats.get(agent)
+
+
 class AgentDbMixin(ext_agent.AgentPluginBase):
     """Mixin class to add agent extension to db_plugin_base_v2."""
 
@@ -88,6 +170,7 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
             ext_agent.RESOURCE_NAME + 's')
         res = dict((k, agent[k]) for k in attr
                    if k not in ['alive', 'configurations'])
+        res['heartbeat_timestamp'] = get_heartbeat_timestamp(agent)
         res['alive'] = not AgentDbMixin.is_agent_down(
             res['heartbeat_timestamp'])
         res['configurations'] = self.get_configuration_dict(agent)
@@ -97,6 +180,7 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         with context.session.begin(subtransactions=True):
             agent = self._get_agent(context, id)
             context.session.delete(agent)
+        self._forget_reported_agent(id)
 
     def update_agent(self, context, id, agent):
         agent_data = agent['agent']
@@ -131,20 +215,29 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         agent = self._get_agent(context, id)
         return self._make_agent_dict(agent, fields)
 
-    def create_or_update_agent(self, context, agent):
-        """Create or update agent according to report."""
-        with context.session.begin(subtransactions=True):
-            res_keys = ['agent_type', 'binary', 'host', 'topic']
-            res = dict((k, agent[k]) for k in res_keys)
+    def _get_reported_agents(self):
+        # The id and the reported attributes of the agents which reported
+        # their state to this server, by agent type and host
+        if not hasattr(self, '_reported_agents'):
+            self._reported_agents = {}
+        return self._reported_agents
 
-            configurations_dict = agent.get('configurations', {})
-            res['configurations'] = jsonutils.dumps(configurations_dict)
-            current_time = timeutils.utcnow()
+    def _forget_reported_agent(self, agent_id):
+        reported_agents = self._get_reported_agents()
+        for key, (reported_id, res) in reported_agents.items():
+            if reported_id == agent_id:
+                del reported_agents[key]
+        _heartbeats.forget(agent_id)
+
+    def _write_agent(self, context, res, start_flag, current_time):
+        with context.session.begin(subtransactions=True):
+            res = dict(res)
+            res['configurations'] = jsonutils.dumps(res['configurations'])
             try:
                 agent_db = self._get_agent_by_type_and_host(
-                    context, agent['agent_type'], agent['host'])
+                    context, res['agent_type'], res['host'])
                 res['heartbeat_timestamp'] = current_time
-                if agent.get('start_flag'):
+                if start_flag:
                     res['started_at'] = current_time
                 agent_db.update(res)
             except ext_agent.AgentNotFoundByTypeHost:
@@ -154,6 +247,38 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                 res['admin_state_up'] = True
                 agent_db = Agent(**res)
                 context.session.add(agent_db)
+        return agent_db.id
+
+    def create_or_update_agent(self, context, agent):
+        """Create or update agent according to report.
+
+        The heartbeat of an agent reporting the same attributes as in its
+        previous report is only recorded in memory, and written to the
+        database with the other pending heartbeats every
+        agent_heartbeat_flush_interval seconds.
+        """
+        res_keys = ['agent_type', 'binary', 'host', 'topic']
+        res = dict((k, agent[k]) for k in res_keys)
+        res['configurations'] = agent.get('configurations', {})
+        current_time = timeutils.utcnow()
+        reported_agents = self._get_reported_agents()
+        key = (agent['agent_type'], agent['host'])
+        reported = reported_agents.get(key)
+        if (cfg.CONF.agent_heartbeat_flush_interval and reported and
+            reported[1] == res and not agent.get('start_flag')):
+            _heartbeats.report(reported[0], current_time)
+        else:
+            agent_id = self._write_agent(context, res,
+                                         agent.get('start_flag'),
+                                         current_time)
+            reported_agents[key] = (agent_id, copy.deepcopy(res))
+            _heartbeats.written(agent_id, current_time)
+        if _heartbeats.flush_needed():
+            self._flush_heartbeats(context)
+
+    def _flush_heartbeats(self, context):
+        for agent_id in _heartbeats.flush(context.session):
+            self._forget_reported_agent(agent_id)
 
 
 class AgentExtRpcCallback(object):
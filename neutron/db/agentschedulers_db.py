@@ -98,7 +98,7 @@ class AgentSchedulerDbMixin(agents_db.AgentDbMixin):
             #                   (i.e. have a recent heartbeat timestamp)
             #                   are eligible, even if active is False
             return not agents_db.AgentDbMixin.is_agent_down(
-                agent['heartbeat_timestamp'])
+                agents_db.get_heartbeat_timestamp(agent))
 
     def update_agent(self, context, id, agent):
         original_agent = self.get_agent(context, id)
@@ -229,7 +229,7 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
             l3_agents = [l3_agent for l3_agent in
                          l3_agents if not
                          agents_db.AgentDbMixin.is_agent_down(
-                         l3_agent['heartbeat_timestamp'])]
+                         agents_db.get_heartbeat_timestamp(l3_agent))]
         return l3_agents
 
     def _get_l3_bindings_hosting_routers(self, context, router_ids):
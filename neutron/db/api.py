@@ -48,6 +48,15 @@ def clear_db(base=BASE):
     _DB_ENGINE = None
 
 
+def dispose():
+    """Close the pooled connections, new ones being opened on demand.
+
+    A process forked from a process which used the database must call it
+    before using the database, so that they do not share connections.
+    """
+    session.get_engine(sqlite_fk=True).pool.dispose()
+
+
 def get_session(autocommit=True, expire_on_commit=False):
     """Helper method to grab session."""
     return session.get_session(autocommit=autocommit,
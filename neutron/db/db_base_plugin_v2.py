@@ -17,6 +17,7 @@
 
 import datetime
 import random
+import time
 
 import netaddr
 from oslo.config import cfg
@@ -27,6 +28,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as q_exc
 from neutron.db import api as db
+from neutron.db import ipam_backend
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron import neutron_plugin_base_v2
@@ -59,6 +61,18 @@ class CommonDbMixin(object):
     # from this class should be invoked
     _model_query_hooks = {}
 
+    # Relationships loaded together with the collections of each model, by
+    # the attribute of the resources built from them, so that listing
+    # resources does not issue a query per resource. A relationship is only
+    # loaded if its attribute is requested.
+    _collection_eager_loads = {}
+
+    # Attributes of the resources of each model which are the value of the
+    # model column of the same name. The collections for which only such
+    # attributes are requested are read with a query of these columns,
+    # without building the model objects nor the full resources.
+    _collection_column_fields = {}
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -158,6 +172,31 @@ class CommonDbMixin(object):
                                                     marker_obj=marker_obj)
         return collection
 
+    def _apply_eager_loads(self, query, model, fields=None):
+        loads = self._collection_eager_loads.get(model, {})
+        for field, relationship in loads.iteritems():
+            if not fields or field in fields:
+                query = query.options(orm.subqueryload(relationship))
+        return query
+
+    def _get_query_items(self, query, model, dict_func, fields=None):
+        column_fields = self._collection_column_fields.get(model)
+        if not (fields and column_fields and column_fields.issuperset(fields)):
+            query = self._apply_eager_loads(query, model, fields)
+            return [dict_func(c, fields) for c in query]
+        # Unlike the model objects, the rows of a query joining another
+        # table are not unique, so the ids are read to skip duplicates
+        column_fields = list(set(fields) | set(['id']))
+        columns = [getattr(model, field) for field in column_fields]
+        items = []
+        ids = set()
+        for row in query.with_entities(*columns):
+            item = dict(zip(column_fields, row))
+            if item['id'] not in ids:
+                ids.add(item['id'])
+                items.append(self._fields(item, fields))
+        return items
+
     def _get_collection(self, context, model, dict_func, filters=None,
                         fields=None, sorts=None, limit=None, marker_obj=None,
                         page_reverse=False):
@@ -166,7 +205,7 @@ class CommonDbMixin(object):
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
-        items = [dict_func(c, fields) for c in query]
+        items = self._get_query_items(query, model, dict_func, fields)
         if limit and page_reverse:
             items.reverse()
         return items
@@ -197,6 +236,23 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    _collection_eager_loads = {
+        models_v2.Network: {'subnets': 'subnets'},
+        models_v2.Subnet: {'dns_nameservers': 'dns_nameservers',
+                           'host_routes': 'routes'},
+    }
+
+    _collection_column_fields = {
+        models_v2.Network: frozenset(['id', 'name', 'tenant_id',
+                                      'admin_state_up', 'status', 'shared']),
+        models_v2.Subnet: frozenset(['id', 'name', 'tenant_id', 'network_id',
+                                     'ip_version', 'cidr', 'gateway_ip',
+                                     'enable_dhcp', 'shared']),
+        models_v2.Port: frozenset(['id', 'name', 'network_id', 'tenant_id',
+                                   'mac_address', 'admin_state_up', 'status',
+                                   'device_id', 'device_owner']),
+    }
+
     def __init__(self):
         # NOTE(jkoelker) This is an incomlete implementation. Subclasses
         #                must override __init__ and setup the database
@@ -332,99 +388,74 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         expired_qry = expired_qry.filter(
             models_v2.IPAllocation.expiration <= timeutils.utcnow())
 
+        expired_ips = {}
         for expired in expired_qry:
-            NeutronDbPluginV2._recycle_ip(context,
-                                          network_id,
-                                          expired['subnet_id'],
-                                          expired['ip_address'])
+            expired_ips.setdefault(expired['subnet_id'], []).append(
+                expired['ip_address'])
+        for subnet_id, ip_addresses in expired_ips.iteritems():
+            NeutronDbPluginV2._recycle_ips(context,
+                                           network_id,
+                                           subnet_id,
+                                           ip_addresses)
 
         if hasattr(context, '_recycled_networks'):
             context._recycled_networks.add(network_id)
         else:
             context._recycled_networks = set([network_id])
 
+    def reap_expired_ip_allocations(self, context):
+        """Return held ip allocations with expired leases back to the pool.
+
+        This is run periodically by the server for all the networks, one
+        transaction per subnet. Returns the number of reclaimed allocations.
+        """
+        start = time.time()
+        now = timeutils.utcnow()
+        expired_qry = context.session.query(models_v2.IPAllocation)
+        expired_qry = expired_qry.filter_by(port_id=None).filter(
+            models_v2.IPAllocation.expiration <= now)
+        subnet_ids = [row[0] for row in expired_qry.with_entities(
+            models_v2.IPAllocation.subnet_id).distinct()]
+
+        backend = ipam_backend.get_backend()
+        reclaimed = 0
+        for subnet_id in subnet_ids:
+            with context.session.begin(subtransactions=True):
+                subnet_qry = expired_qry.filter_by(subnet_id=subnet_id)
+                ip_addresses = [row[0] for row in subnet_qry.with_entities(
+                    models_v2.IPAllocation.ip_address).with_lockmode(
+                        'update')]
+                if not ip_addresses:
+                    continue
+                backend.release(context, subnet_id, ip_addresses)
+                subnet_qry.filter(
+                    models_v2.IPAllocation.ip_address.in_(ip_addresses)
+                ).delete(synchronize_session=False)
+                reclaimed += len(ip_addresses)
+
+        if reclaimed:
+            LOG.info(_("Reclaimed %(count)d expired IP allocations on "
+                       "%(subnets)d subnets in %(duration).3f seconds"),
+                     {'count': reclaimed, 'subnets': len(subnet_ids),
+                      'duration': time.time() - start})
+        return reclaimed
+
     @staticmethod
     def _recycle_ip(context, network_id, subnet_id, ip_address):
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        pool_qry = context.session.query(
-            models_v2.IPAllocationPool).with_lockmode('update')
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            NeutronDbPluginV2._delete_ip_allocation(
-                context, network_id, subnet_id, ip_address)
-            return
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
-        NeutronDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
-                                                ip_address)
+        NeutronDbPluginV2._recycle_ips(context, network_id, subnet_id,
+                                       [ip_address])
+
+    @staticmethod
+    def _recycle_ips(context, network_id, subnet_id, ip_addresses):
+        """Return IP addresses of a subnet to its pool of free IP's."""
+        LOG.debug(_("Recycle %s"), ip_addresses)
+        ipam_backend.get_backend().release(context, subnet_id, ip_addresses)
+        for ip_address in ip_addresses:
+            NeutronDbPluginV2._delete_ip_allocation(context, network_id,
+                                                    subnet_id, ip_address)
 
     @staticmethod
     def _default_allocation_expiration():
@@ -470,67 +501,90 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         """Generate an IP address.
 
         The IP address will be generated from one of the subnets defined on
-        the network.
+        the network. Addresses reserved for a bulk request are used first.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
+        reserved_ips = getattr(context, '_reserved_ips', {})
         for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
+            if reserved_ips.get(subnet['id']):
+                ip_address = reserved_ips[subnet['id']].pop(0)
             else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+                ips = ipam_backend.get_backend().allocate(context,
+                                                          subnet['id'])
+                if not ips:
+                    LOG.debug(_("All IP's from subnet %(subnet_id)s "
+                                "(%(cidr)s) allocated"),
+                              {'subnet_id': subnet['id'],
+                               'cidr': subnet['cidr']})
+                    continue
+                ip_address = ips[0]
+            LOG.debug(_("Allocated IP - %(ip_address)s from subnet "
+                        "%(subnet_id)s"),
+                      {'ip_address': ip_address, 'subnet_id': subnet['id']})
             return {'ip_address': ip_address, 'subnet_id': subnet['id']}
         raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id)
-        for range in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=range['allocation_pool_id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        reserved_ips = getattr(context, '_reserved_ips', {})
+        if ip_address in reserved_ips.get(subnet_id, []):
+            # Already taken out of the pool by the bulk request
+            reserved_ips[subnet_id].remove(ip_address)
+            return
+        ipam_backend.get_backend().allocate_specific(context, subnet_id,
+                                                     ip_address)
+
+    def _reserve_ips_for_ports(self, context, ports):
+        """Allocate at once the IP addresses needed by a bulk request.
+
+        The addresses are stored on the context and consumed by
+        _generate_ip as the ports are created.
+        """
+        network_demand = {}
+        subnet_demand = {}
+        for item in ports:
+            p = item['port']
+            if not cfg.CONF.ip_allocation_reap_interval:
+                self._recycle_expired_ip_allocations(context,
+                                                     p['network_id'])
+            fixed_ips = p.get('fixed_ips', attributes.ATTR_NOT_SPECIFIED)
+            if fixed_ips is attributes.ATTR_NOT_SPECIFIED:
+                network_demand[p['network_id']] = (
+                    network_demand.get(p['network_id'], 0) + 1)
+                continue
+            for fixed in fixed_ips:
+                if 'subnet_id' in fixed and 'ip_address' not in fixed:
+                    subnet_demand[fixed['subnet_id']] = (
+                        subnet_demand.get(fixed['subnet_id'], 0) + 1)
+
+        backend = ipam_backend.get_backend()
+        reserved_ips = {}
+        for network_id, count in network_demand.iteritems():
+            filter = {'network_id': [network_id]}
+            subnets = self.get_subnets(context, filters=filter)
+            for ip_version in (4, 6):
+                needed = count
+                for subnet in subnets:
+                    if not needed:
+                        break
+                    if subnet['ip_version'] != ip_version:
+                        continue
+                    ips = backend.allocate(context, subnet['id'], needed)
+                    reserved_ips.setdefault(subnet['id'], []).extend(ips)
+                    needed -= len(ips)
+        for subnet_id, count in subnet_demand.iteritems():
+            reserved_ips.setdefault(subnet_id, []).extend(
+                backend.allocate(context, subnet_id, count))
+        context._reserved_ips = reserved_ips
+
+    def _release_reserved_ips(self, context):
+        """Return the reserved IP addresses left unused to their pools."""
+        reserved_ips = context._reserved_ips
+        del context._reserved_ips
+        backend = ipam_backend.get_backend()
+        for subnet_id, ip_addresses in reserved_ips.iteritems():
+            if ip_addresses:
+                backend.release(context, subnet_id, ip_addresses)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -901,9 +955,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'tenant_id': network['tenant_id'],
                'admin_state_up': network['admin_state_up'],
                'status': network['status'],
-               'shared': network['shared'],
-               'subnets': [subnet['id']
-                           for subnet in network['subnets']]}
+               'shared': network['shared']}
+        # Only load the subnets if they are requested
+        if not fields or 'subnets' in fields:
+            res['subnets'] = [subnet['id'] for subnet in network['subnets']]
         # Call auxiliary extend functions, if any
         if process_extensions:
             for func in self._dict_extend_functions.get(attributes.NETWORKS,
@@ -923,13 +978,16 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     for pool in subnet['allocation_pools']],
                'gateway_ip': subnet['gateway_ip'],
                'enable_dhcp': subnet['enable_dhcp'],
-               'dns_nameservers': [dns['address']
-                                   for dns in subnet['dns_nameservers']],
-               'host_routes': [{'destination': route['destination'],
-                                'nexthop': route['nexthop']}
-                               for route in subnet['routes']],
                'shared': subnet['shared']
                }
+        # Only load the nameservers and routes if they are requested
+        if not fields or 'dns_nameservers' in fields:
+            res['dns_nameservers'] = [dns['address']
+                                      for dns in subnet['dns_nameservers']]
+        if not fields or 'host_routes' in fields:
+            res['host_routes'] = [{'destination': route['destination'],
+                                   'nexthop': route['nexthop']}
+                                  for route in subnet['routes']]
         return self._fields(res, fields)
 
     def _make_port_dict(self, port, fields=None,
@@ -1179,11 +1237,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+                ipam_backend.get_backend().create_pool(context, ip_pool)
 
         return self._make_subnet_dict(subnet)
 
@@ -1311,7 +1365,16 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                           filters=filters)
 
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        with context.session.begin(subtransactions=True):
+            self._reserve_ips_for_ports(context, ports['ports'])
+            try:
+                objects = self._create_bulk('port', context, ports)
+            except Exception:
+                # The reservations are rolled back with the transaction
+                with excutils.save_and_reraise_exception():
+                    del context._reserved_ips
+            self._release_reserved_ips(context)
+        return objects
 
     def create_port(self, context, port):
         p = port['port']
@@ -1323,7 +1386,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         tenant_id = self._get_tenant_id_for_create(context, p)
 
         with context.session.begin(subtransactions=True):
-            self._recycle_expired_ip_allocations(context, network_id)
+            if not cfg.CONF.ip_allocation_reap_interval:
+                self._recycle_expired_ip_allocations(context, network_id)
             network = self._get_network(context, network_id)
 
             # Ensure that a MAC address is defined and it is unique on the
@@ -1389,8 +1453,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             # Check if the IPs need to be updated
             if 'fixed_ips' in p:
                 changed_ips = True
-                self._recycle_expired_ip_allocations(context,
-                                                     port['network_id'])
+                if not cfg.CONF.ip_allocation_reap_interval:
+                    self._recycle_expired_ip_allocations(context,
+                                                         port['network_id'])
                 original = self._make_port_dict(port, process_extensions=False)
                 added_ips, prev_ips = self._update_ips_for_port(
                     context, port["network_id"], id, original["fixed_ips"],
@@ -1488,7 +1553,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
-        items = [self._make_port_dict(c, fields) for c in query]
+        items = self._get_query_items(query, models_v2.Port,
+                                      self._make_port_dict, fields)
         if limit and page_reverse:
             items.reverse()
         return items
@@ -0,0 +1,243 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from abc import ABCMeta, abstractmethod
+
+import netaddr
+from oslo.config import cfg
+from sqlalchemy import orm
+
+from neutron.db import models_v2
+from neutron.openstack.common import importutils
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+ipam_opts = [
+    cfg.StrOpt('ipam_driver',
+               default='neutron.db.ipam_backend.IpAvailabilityRangeBackend',
+               help=_("The backend used to allocate fixed IPs from the "
+                      "allocation pools of a subnet")),
+]
+cfg.CONF.register_opts(ipam_opts)
+
+_backends = {}
+
+
+def get_backend():
+    """Return the configured IPAM backend, loading it on first use."""
+    driver = cfg.CONF.ipam_driver
+    if driver not in _backends:
+        _backends[driver] = importutils.import_object(driver)
+    return _backends[driver]
+
+
+class IpamBackendBase(object):
+    """Keeps track of the free addresses of subnet allocation pools.
+
+    All methods are called within the transaction of the request and must
+    only use context.session for database access.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def create_pool(self, context, ip_pool):
+        """Make all the addresses of a new allocation pool available."""
+        pass
+
+    @abstractmethod
+    def allocate(self, context, subnet_id, count=1):
+        """Allocate up to count free addresses from the subnet.
+
+        Returns the list of allocated addresses, which is shorter than
+        count when the subnet does not have enough free addresses.
+        """
+        pass
+
+    @abstractmethod
+    def allocate_specific(self, context, subnet_id, ip_address):
+        """Remove ip_address from the free addresses of the subnet."""
+        pass
+
+    @abstractmethod
+    def release(self, context, subnet_id, ip_addresses):
+        """Return addresses to the allocation pools of the subnet.
+
+        Addresses outside of the allocation pools are ignored. Returns the
+        list of addresses that were returned to a pool.
+        """
+        pass
+
+
+class IpAvailabilityRangeBackend(IpamBackendBase):
+    """Track free addresses as a sorted interval set per allocation pool.
+
+    The intervals are stored as IPAvailabilityRange rows. Every operation
+    first locks the allocation pools of the subnet, always in the same
+    order, so that concurrent requests on a subnet queue on the pool rows
+    instead of deadlocking on the range rows. Allocations read the ranges
+    of each pool one at a time, until enough addresses are found. Specific
+    allocations and releases load the ranges once and update them in
+    memory, whatever the number of addresses involved.
+    """
+
+    def create_pool(self, context, ip_pool):
+        ip_range = models_v2.IPAvailabilityRange(
+            ipallocationpool=ip_pool,
+            first_ip=ip_pool['first_ip'],
+            last_ip=ip_pool['last_ip'])
+        context.session.add(ip_range)
+
+    def _lock_pools(self, context, subnet_id):
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).with_lockmode('update')
+        # The ranges are loaded separately by _get_ranges
+        pool_qry = pool_qry.options(orm.lazyload('available_ranges'))
+        pool_qry = pool_qry.filter_by(subnet_id=subnet_id)
+        return pool_qry.order_by(models_v2.IPAllocationPool.id).all()
+
+    def _get_ranges(self, context, pools):
+        """Return the free ranges of the pools sorted by first address."""
+        if not pools:
+            return []
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        ranges = range_qry.filter(
+            models_v2.IPAvailabilityRange.allocation_pool_id.in_(
+                [pool['id'] for pool in pools]))
+        return sorted(ranges,
+                      key=lambda r: int(netaddr.IPAddress(r['first_ip'])))
+
+    def allocate(self, context, subnet_id, count=1):
+        ips = []
+        pools = self._lock_pools(context, subnet_id)
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        pools = sorted(pools,
+                       key=lambda p: int(netaddr.IPAddress(p['first_ip'])))
+        for pool in pools:
+            while len(ips) < count:
+                # A range is either used up and deleted, or has enough free
+                # addresses left, so the next one is read only if needed
+                ip_range = range_qry.filter_by(
+                    allocation_pool_id=pool['id']).first()
+                if not ip_range:
+                    break
+                first = netaddr.IPAddress(ip_range['first_ip'])
+                last = netaddr.IPAddress(ip_range['last_ip'])
+                size = min(count - len(ips), int(last) - int(first) + 1)
+                ips.extend(str(first + i) for i in xrange(size))
+                LOG.debug(_("Allocated %(count)s IP(s) from %(first_ip)s to "
+                            "%(last_ip)s"),
+                          {'count': size,
+                           'first_ip': ip_range['first_ip'],
+                           'last_ip': ip_range['last_ip']})
+                if first + (size - 1) == last:
+                    context.session.delete(ip_range)
+                    context.session.flush()
+                else:
+                    ip_range['first_ip'] = str(first + size)
+        return ips
+
+    def allocate_specific(self, context, subnet_id, ip_address):
+        ip = netaddr.IPAddress(ip_address)
+        pools = self._lock_pools(context, subnet_id)
+        for ip_range in self._get_ranges(context, pools):
+            first = netaddr.IPAddress(ip_range['first_ip'])
+            last = netaddr.IPAddress(ip_range['last_ip'])
+            if not first <= ip <= last:
+                continue
+            if first == last:
+                context.session.delete(ip_range)
+            elif first == ip:
+                ip_range['first_ip'] = str(ip + 1)
+            elif last == ip:
+                ip_range['last_ip'] = str(ip - 1)
+            else:
+                # Split into two ranges
+                ip_range['last_ip'] = str(ip - 1)
+                context.session.add(models_v2.IPAvailabilityRange(
+                    allocation_pool_id=ip_range['allocation_pool_id'],
+                    first_ip=str(ip + 1),
+                    last_ip=str(last)))
+            return
+
+    def release(self, context, subnet_id, ip_addresses):
+        pools = self._lock_pools(context, subnet_id)
+        released = {}
+        for ip_address in ip_addresses:
+            ip = int(netaddr.IPAddress(ip_address))
+            for pool in pools:
+                if (int(netaddr.IPAddress(pool['first_ip'])) <= ip <=
+                        int(netaddr.IPAddress(pool['last_ip']))):
+                    released.setdefault(pool['id'], set()).add(ip)
+                    break
+        if not released:
+            return []
+
+        ranges = self._get_ranges(
+            context, [pool for pool in pools if pool['id'] in released])
+        version = netaddr.IPAddress(ip_addresses[0]).version
+        for pool_id, ips in released.iteritems():
+            pool_ranges = [r for r in ranges
+                           if r['allocation_pool_id'] == pool_id]
+            self._merge(context, pool_id, pool_ranges, ips, version)
+        return [str(netaddr.IPAddress(ip, version))
+                for ips in released.itervalues() for ip in sorted(ips)]
+
+    def _merge(self, context, pool_id, ranges, ips, version):
+        """Merge ips into the free ranges of a pool.
+
+        The merge is done in memory and only the rows whose bounds change
+        are written back.
+        """
+        intervals = [(int(netaddr.IPAddress(r['first_ip'])),
+                      int(netaddr.IPAddress(r['last_ip'])), r)
+                     for r in ranges]
+        intervals.extend((ip, ip, None) for ip in ips)
+        intervals.sort(key=lambda i: i[0])
+
+        merged = []
+        for first, last, ip_range in intervals:
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+                if ip_range is not None:
+                    merged[-1][2].append(ip_range)
+            else:
+                merged.append([first, last,
+                               [ip_range] if ip_range is not None else []])
+
+        for first, last, old_ranges in merged:
+            first_ip = str(netaddr.IPAddress(first, version))
+            last_ip = str(netaddr.IPAddress(last, version))
+            if not old_ranges:
+                context.session.add(models_v2.IPAvailabilityRange(
+                    allocation_pool_id=pool_id,
+                    first_ip=first_ip,
+                    last_ip=last_ip))
+            else:
+                ip_range = old_ranges[0]
+                if (ip_range['first_ip'] == first_ip and
+                        ip_range['last_ip'] == last_ip):
+                    continue
+                for old_range in old_ranges[1:]:
+                    context.session.delete(old_range)
+                ip_range['first_ip'] = first_ip
+                ip_range['last_ip'] = last_ip
+            LOG.debug(_("Recycle: free range %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': first_ip, 'last_ip': last_ip})
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+
 from oslo.config import cfg
 
 from neutron.common import constants
@@ -26,6 +28,16 @@ from neutron.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 
 
+def get_router_revision(router):
+    """Return the revision of the sync data of a router.
+
+    The revision is a digest of the data, so that it changes whenever
+    anything the l3 agent uses changes, whatever the database update.
+    """
+    data = jsonutils.dumps(router, sort_keys=True)
+    return hashlib.md5(data).hexdigest()
+
+
 class L3RpcCallbackMixin(object):
     """A mix-in that enable L3 agent rpc support in plugin implementations."""
 
@@ -33,12 +45,18 @@ class L3RpcCallbackMixin(object):
         """Sync routers according to filters to a specific agent.
 
         @param context: contain user information
-        @param kwargs: host, router_ids
+        @param kwargs: host, router_ids, revisions
         @return: a list of routers
                  with their interfaces and floating_ips
+
+        Each router is returned with its revision. The routers whose
+        revision is the one given in revisions, a dict of the revisions
+        known by the agent by router id, are only returned as their id and
+        revision, flagged as unchanged.
         """
         router_ids = kwargs.get('router_ids')
         host = kwargs.get('host')
+        revisions = kwargs.get('revisions') or {}
         context = neutron_context.get_admin_context()
         plugin = manager.NeutronManager.get_plugin()
         if utils.is_extension_supported(
@@ -49,10 +67,21 @@ class L3RpcCallbackMixin(object):
                 context, host, router_ids)
         else:
             routers = plugin.get_sync_data(context, router_ids)
+        routers = [self._router_for_revisions(router, revisions)
+                   for router in routers]
         LOG.debug(_("Routers returned to l3 agent:\n %s"),
                   jsonutils.dumps(routers, indent=5))
         return routers
 
+    def _router_for_revisions(self, router, revisions):
+        revision = get_router_revision(router)
+        if revisions.get(router['id']) == revision:
+            return {'id': router['id'],
+                    constants.ROUTER_REVISION_KEY: revision,
+                    constants.ROUTER_UNCHANGED_KEY: True}
+        router[constants.ROUTER_REVISION_KEY] = revision
+        return router
+
     def get_external_network_id(self, context, **kwargs):
         """Get one external network id for l3 agent.
 
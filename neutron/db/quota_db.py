@@ -15,11 +15,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy import orm
 
 from neutron.common import exceptions
+from neutron.db import api as db
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import timeutils
+from neutron.openstack.common import uuidutils
+
+LOG = logging.getLogger(__name__)
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -179,3 +190,235 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+
+class QuotaUsage(model_base.BASEV2):
+    """Represent the usage of a resource by a tenant.
+
+    in_use is the number of resources of the tenant, and reserved the
+    number of resources reserved for the requests being processed.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+    reserved = sa.Column(sa.Integer, nullable=False, default=0)
+    # The usage must be counted again, e.g. after a bulk deletion
+    dirty = sa.Column(sa.Boolean, nullable=False, default=False)
+    synced_at = sa.Column(sa.DateTime)
+
+
+class Reservation(model_base.BASEV2, models_v2.HasId):
+    """Represent resources reserved for the creation of a request."""
+    tenant_id = sa.Column(sa.String(255))
+    resource = sa.Column(sa.String(255))
+    delta = sa.Column(sa.Integer, nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False)
+
+
+# Models of the resources whose usage is tracked, by resource
+_TRACKED_MODELS = {'network': models_v2.Network,
+                   'subnet': models_v2.Subnet,
+                   'port': models_v2.Port}
+_listened_models = set()
+_tracking_enabled = False
+
+
+def track_resource(resource, model):
+    """Track the usage of a resource by the inserts and deletes of model."""
+    _TRACKED_MODELS[resource] = model
+    if _tracking_enabled:
+        _listen(resource, model)
+
+
+def _update_usage(connection, resource, tenant_id, delta):
+    table = QuotaUsage.__table__
+    connection.execute(table.update().
+                       where(sa.and_(table.c.tenant_id == tenant_id,
+                                     table.c.resource == resource)).
+                       values(in_use=table.c.in_use + delta))
+
+
+def _listen(resource, model):
+    if model in _listened_models:
+        return
+
+    def after_insert(mapper, connection, target):
+        _update_usage(connection, resource, target.tenant_id, 1)
+
+    def after_delete(mapper, connection, target):
+        _update_usage(connection, resource, target.tenant_id, -1)
+
+    sa.event.listen(model, 'after_insert', after_insert)
+    sa.event.listen(model, 'after_delete', after_delete)
+    _listened_models.add(model)
+
+
+def _after_bulk_delete(session, query, query_context, result):
+    # The tenants of the rows deleted are unknown, so all the usages of
+    # the resource are counted again when checked
+    model = query.column_descriptions[0]['type']
+    table = QuotaUsage.__table__
+    for resource, tracked_model in _TRACKED_MODELS.items():
+        if model is tracked_model:
+            session.execute(table.update().
+                            where(table.c.resource == resource).
+                            values(dirty=True))
+
+
+def _enable_tracking():
+    global _tracking_enabled
+    if _tracking_enabled:
+        return
+    for resource, model in _TRACKED_MODELS.items():
+        _listen(resource, model)
+    sa.event.listen(orm.Session, 'after_bulk_delete', _after_bulk_delete)
+    _tracking_enabled = True
+
+
+class TrackedQuotaDriver(DbQuotaDriver):
+    """Quota driver keeping track of the usage of the resources.
+
+    The number of resources of each tenant is kept in the quotausages
+    table, updated in the transaction inserting or deleting a resource,
+    so that checking a quota only reads a row instead of counting the
+    resources. The resources being created are reserved until they are
+    created or their creation fails. The usages are counted again when
+    first checked, after bulk deletions, and every
+    quota_usage_resync_interval seconds.
+
+    The usage of the resources whose model is unknown (see
+    track_resource) is counted for each check.
+    """
+
+    def __init__(self):
+        _enable_tracking()
+
+    def _sync_usage(self, context, usage, count):
+        now = timeutils.utcnow()
+        usage.in_use = count()
+        reservations = context.session.query(Reservation).filter_by(
+            tenant_id=usage.tenant_id, resource=usage.resource)
+        reservations.filter(Reservation.expiration < now).delete(
+            synchronize_session=False)
+        usage.reserved = sum(r.delta for r in reservations)
+        usage.dirty = False
+        usage.synced_at = now
+        LOG.debug(_("Synchronized usage of %(resource)s for tenant "
+                    "%(tenant_id)s: %(in_use)s in use, %(reserved)s "
+                    "reserved"),
+                  {'resource': usage.resource, 'tenant_id': usage.tenant_id,
+                   'in_use': usage.in_use, 'reserved': usage.reserved})
+
+    def _lock_usage(self, context, tenant_id, resource):
+        return (context.session.query(QuotaUsage).
+                filter_by(tenant_id=tenant_id, resource=resource).
+                with_lockmode('update').populate_existing().first())
+
+    def _create_usage(self, tenant_id, resource):
+        """Insert the usage of a resource, unless inserted concurrently.
+
+        The usage is inserted in its own transaction, so that a duplicate
+        entry does not fail the transaction of the caller.
+        """
+        session = db.get_session()
+        try:
+            with session.begin():
+                session.add(QuotaUsage(tenant_id=tenant_id, resource=resource,
+                                       in_use=0, reserved=0))
+        except db_exc.DBDuplicateEntry:
+            LOG.debug(_("Usage of %(resource)s for tenant %(tenant_id)s "
+                        "inserted by a concurrent request"),
+                      {'resource': resource, 'tenant_id': tenant_id})
+
+    def _purge_expired_reservations(self, context, usage):
+        expired = context.session.query(Reservation).filter_by(
+            tenant_id=usage.tenant_id, resource=usage.resource).filter(
+                Reservation.expiration < timeutils.utcnow())
+        delta = sum(reservation.delta for reservation in expired)
+        if expired.delete(synchronize_session=False):
+            usage.reserved -= delta
+
+    def _get_usage(self, context, tenant_id, resource, count):
+        """Return the usage of a resource, locked until the commit."""
+        usage = self._lock_usage(context, tenant_id, resource)
+        resync_interval = cfg.CONF.QUOTAS.quota_usage_resync_interval
+        if (usage and not usage.dirty and
+            (resync_interval <= 0 or usage.synced_at >
+             timeutils.utcnow() - datetime.timedelta(
+                 seconds=resync_interval))):
+            self._purge_expired_reservations(context, usage)
+            return usage
+        if not usage:
+            self._create_usage(tenant_id, resource)
+            usage = self._lock_usage(context, tenant_id, resource)
+        self._sync_usage(context, usage, count)
+        return usage
+
+    def make_reservation(self, context, tenant_id, resources, resource,
+                         delta, count):
+        """Reserve delta more resources for a tenant.
+
+        An OverQuota exception is raised if the resources in use and
+        reserved, with the new ones, are over the quota of the tenant.
+        Returns the id of the reservation, or None if the quota is
+        unlimited.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resources: A dictionary of the registered resources.
+        :param resource: The name of the resource to reserve.
+        :param delta: The number of resources to reserve.
+        :param count: A callable returning the number of resources of the
+                      tenant, to synchronize the usage.
+        """
+        if delta < 0:
+            raise exceptions.InvalidQuotaValue(unders=[resource])
+        limit = self._get_quotas(context, tenant_id, resources,
+                                 [resource])[resource]
+        if limit < 0:
+            return
+        if resource not in _TRACKED_MODELS:
+            if count() + delta > limit:
+                raise exceptions.OverQuota(overs=[resource])
+            return
+        with context.session.begin(subtransactions=True):
+            usage = self._get_usage(context, tenant_id, resource, count)
+            if usage.in_use + usage.reserved + delta > limit:
+                raise exceptions.OverQuota(overs=[resource])
+            expiration = timeutils.utcnow() + datetime.timedelta(
+                seconds=cfg.CONF.QUOTAS.quota_reservation_expiration)
+            reservation = Reservation(id=uuidutils.generate_uuid(),
+                                      tenant_id=tenant_id,
+                                      resource=resource, delta=delta,
+                                      expiration=expiration)
+            context.session.add(reservation)
+            usage.reserved += delta
+        return reservation.id
+
+    def _release_reservation(self, context, reservation_id):
+        with context.session.begin(subtransactions=True):
+            reservation = context.session.query(Reservation).filter_by(
+                id=reservation_id).first()
+            if not reservation:
+                # The reservation expired, and was purged
+                return
+            # The usage is locked before the reservation is deleted, as when
+            # the expired reservations are purged, so that a reservation is
+            # only subtracted once from the usage
+            usage = self._lock_usage(context, reservation.tenant_id,
+                                     reservation.resource)
+            deleted = context.session.query(Reservation).filter_by(
+                id=reservation_id).delete(synchronize_session=False)
+            if usage and deleted:
+                usage.reserved -= reservation.delta
+
+    def commit_reservation(self, context, reservation_id):
+        """Release a reservation once its resources are created.
+
+        The created resources were counted in the usage when inserted.
+        """
+        self._release_reservation(context, reservation_id)
+
+    def cancel_reservation(self, context, reservation_id):
+        """Release a reservation whose resources were not created."""
+        self._release_reservation(context, reservation_id)
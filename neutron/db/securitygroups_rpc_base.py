@@ -136,7 +136,60 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :returns: port correspond to the devices with security group rules
         """
         devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        return self._security_group_rules_for_ports(context, ports)
+
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return security group information for each port.
+
+        Unlike security_group_rules_for_devices, the rules of each
+        security group are returned once, whatever the number of ports
+        in the group, and remote_group_id rules are not converted to
+        one rule per member IP. The member IPs of each remote group are
+        returned once too, by ethertype. The ports only carry the ids
+        of their security groups and the provider rules.
+
+        :params devices: list of devices
+        :returns: dict with the ports corresponding to the devices in
+                  'devices', the rules of their security groups in
+                  'security_groups' and the member IPs of the remote
+                  groups in 'sg_member_ips'
+        """
+        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        sg_ids = set()
+        for port in ports.values():
+            sg_ids.update(port.get('security_groups', []))
+        security_groups = self._select_rules_for_security_groups(context,
+                                                                 sg_ids)
+        remote_group_ids = set()
+        for port in ports.values():
+            for sg_id in port.get('security_groups', []):
+                for rule in security_groups.get(sg_id, []):
+                    remote_group_id = rule.get('remote_group_id')
+                    if not remote_group_id:
+                        continue
+                    remote_group_ids.add(remote_group_id)
+                    if (remote_group_id not in
+                            port['security_group_source_groups']):
+                        port['security_group_source_groups'].append(
+                            remote_group_id)
+        self._apply_provider_rule(context, ports)
 
+        ips = self._select_ips_for_remote_group(context,
+                                                list(remote_group_ids))
+        sg_member_ips = {}
+        for remote_group_id, member_ips in ips.iteritems():
+            members = sg_member_ips[remote_group_id] = {q_const.IPv4: [],
+                                                        q_const.IPv6: []}
+            for ip in member_ips:
+                ethertype = 'IPv%s' % netaddr.IPAddress(ip).version
+                members[ethertype].append(ip)
+        return {'devices': ports,
+                'security_groups': security_groups,
+                'sg_member_ips': sg_member_ips}
+
+    def _get_ports_for_devices(self, devices):
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
@@ -145,7 +198,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
 
     def _select_rules_for_ports(self, context, ports):
         if not ports:
@@ -162,6 +215,18 @@ class SecurityGroupServerRpcCallbackMixin(object):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _select_rules_for_security_groups(self, context, sg_ids):
+        rules_by_group = dict((sg_id, []) for sg_id in sg_ids)
+        if not sg_ids:
+            return rules_by_group
+        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(list(sg_ids)))
+        for rule_in_db in query:
+            rules_by_group[rule_in_db['security_group_id']].append(
+                self._make_rule_dict(rule_in_db))
+        return rules_by_group
+
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
         if not remote_group_ids:
@@ -279,24 +344,31 @@ class SecurityGroupServerRpcCallbackMixin(object):
             self._add_ingress_dhcp_rule(port, ips)
 
     def _security_group_rules_for_ports(self, context, ports):
+        self._add_security_group_rules(context, ports)
+        return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _add_security_group_rules(self, context, ports):
         rules_in_db = self._select_rules_for_ports(context, ports)
         for (binding, rule_in_db) in rules_in_db:
             port_id = binding['port_id']
             port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
+            port['security_group_rules'].append(
+                self._make_rule_dict(rule_in_db))
         self._apply_provider_rule(context, ports)
-        return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _make_rule_dict(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'security_group_id': rule_in_db['security_group_id'],
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype'],
+        }
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key):
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
@@ -51,6 +51,11 @@ rpc_opts = [
     cfg.IntOpt('rpc_response_timeout',
                default=60,
                help='Seconds to wait for a response from call or multicall'),
+    cfg.IntOpt('rpc_compression_threshold',
+               default=65536,
+               help='Size in bytes of the JSON encoded messages above which '
+                    'they are compressed, when their receivers support it. '
+                    '0 disables the compression'),
     cfg.IntOpt('rpc_cast_timeout',
                default=30,
                help='Seconds to wait before a cast expires (TTL). '
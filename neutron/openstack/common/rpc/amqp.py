@@ -208,10 +208,11 @@ class ReplyProxy(ConnectionContext):
 
 
 def msg_reply(conf, msg_id, reply_q, connection_pool, reply=None,
-              failure=None, ending=False, log_failure=True):
+              failure=None, ending=False, log_failure=True, compress=False):
     """Sends a reply or an error on the channel signified by msg_id.
 
-    Failure should be a sys.exc_info() tuple.
+    Failure should be a sys.exc_info() tuple.  With compress, a large reply
+    is compressed, the caller having announced that it supports it.
 
     """
     with ConnectionContext(conf, connection_pool) as conn:
@@ -233,9 +234,9 @@ def msg_reply(conf, msg_id, reply_q, connection_pool, reply=None,
         # Otherwise use the msg_id for backward compatibilty.
         if reply_q:
             msg['_msg_id'] = msg_id
-            conn.direct_send(reply_q, rpc_common.serialize_msg(msg))
+            conn.direct_send(reply_q, rpc_common.serialize_msg(msg, compress))
         else:
-            conn.direct_send(msg_id, rpc_common.serialize_msg(msg))
+            conn.direct_send(msg_id, rpc_common.serialize_msg(msg, compress))
 
 
 class RpcContext(rpc_common.CommonRpcContext):
@@ -243,6 +244,7 @@ class RpcContext(rpc_common.CommonRpcContext):
     def __init__(self, **kwargs):
         self.msg_id = kwargs.pop('msg_id', None)
         self.reply_q = kwargs.pop('reply_q', None)
+        self.reply_compression = kwargs.pop('reply_compression', None)
         self.conf = kwargs.pop('conf')
         super(RpcContext, self).__init__(**kwargs)
 
@@ -251,13 +253,15 @@ class RpcContext(rpc_common.CommonRpcContext):
         values['conf'] = self.conf
         values['msg_id'] = self.msg_id
         values['reply_q'] = self.reply_q
+        values['reply_compression'] = self.reply_compression
         return self.__class__(**values)
 
     def reply(self, reply=None, failure=None, ending=False,
               connection_pool=None, log_failure=True):
         if self.msg_id:
             msg_reply(self.conf, self.msg_id, self.reply_q, connection_pool,
-                      reply, failure, ending, log_failure)
+                      reply, failure, ending, log_failure,
+                      self.reply_compression == rpc_common._COMPRESSION)
             if ending:
                 self.msg_id = None
 
@@ -274,6 +278,7 @@ def unpack_context(conf, msg):
             context_dict[key[9:]] = value
     context_dict['msg_id'] = msg.pop('_msg_id', None)
     context_dict['reply_q'] = msg.pop('_reply_q', None)
+    context_dict['reply_compression'] = msg.pop('_reply_compression', None)
     context_dict['conf'] = conf
     ctx = RpcContext.from_dict(context_dict)
     rpc_common._safe_log(LOG.debug, _('unpacked context: %s'), ctx.to_dict())
@@ -396,18 +401,21 @@ class ProxyCallback(_ThreadPoolWithWait):
             del local.store.context
         rpc_common._safe_log(LOG.debug, _('received %s'), message_data)
         self.msg_id_cache.check_duplicate_message(message_data)
+        # The messages of a batch share the context of the batch
+        batch = rpc_common.get_batch(message_data)
         ctxt = unpack_context(self.conf, message_data)
-        method = message_data.get('method')
-        args = message_data.get('args', {})
-        version = message_data.get('version')
-        namespace = message_data.get('namespace')
-        if not method:
-            LOG.warn(_('no method for message: %s') % message_data)
-            ctxt.reply(_('No method for message: %s') % message_data,
-                       connection_pool=self.connection_pool)
-            return
-        self.pool.spawn_n(self._process_data, ctxt, version, method,
-                          namespace, args)
+        for msg in batch or [message_data]:
+            method = msg.get('method')
+            args = msg.get('args', {})
+            version = msg.get('version')
+            namespace = msg.get('namespace')
+            if not method:
+                LOG.warn(_('no method for message: %s') % msg)
+                ctxt.reply(_('No method for message: %s') % msg,
+                           connection_pool=self.connection_pool)
+                continue
+            self.pool.spawn_n(self._process_data, ctxt, version, method,
+                              namespace, args)
 
     def _process_data(self, ctxt, version, method, namespace, args):
         """Process a message in a new thread.
@@ -524,6 +532,8 @@ def multicall(conf, context, topic, msg, timeout, connection_pool):
         if not connection_pool.reply_proxy:
             connection_pool.reply_proxy = ReplyProxy(conf, connection_pool)
     msg.update({'_reply_q': connection_pool.reply_proxy.get_reply_q()})
+    # Large replies may be compressed, older servers ignore this key
+    msg.update({'_reply_compression': rpc_common._COMPRESSION})
     wait_msg = MulticallProxyWaiter(conf, msg_id, timeout, connection_pool)
     with ConnectionContext(conf, connection_pool) as conn:
         conn.topic_send(topic, rpc_common.serialize_msg(msg), timeout)
@@ -17,9 +17,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import copy
 import sys
 import traceback
+import zlib
 
 from oslo.config import cfg
 import six
@@ -61,14 +63,39 @@ So, the current message envelope just includes the envelope version.  It may
 eventually contain additional information, such as a signature for the message
 payload.
 
+Message format version '2.1' adds two features, only used when the receivers
+are known to support them:
+
+    {
+        'oslo.version': '2.1',
+        'oslo.message': <Application Message Payload, JSON encoded, zlib
+                         compressed and base64 encoded>,
+        'oslo.compression': 'zlib'
+    }
+
+is a compressed message, sent for a large payload when the receiver announced
+that it accepts compressed messages.  And a payload with an 'oslo.batch' key
+is a batch of messages, dispatched as separate casts by the receiver.  The
+messages without these features keep the version '2.0', so that older
+receivers still accept them.
+
 We will JSON encode the application message payload.  The message envelope,
 which includes the JSON encoded application message body, will be passed down
 to the messaging libraries as a dict.
 '''
-_RPC_ENVELOPE_VERSION = '2.0'
+_RPC_ENVELOPE_VERSION = '2.1'
+_RPC_PLAIN_ENVELOPE_VERSION = '2.0'
 
 _VERSION_KEY = 'oslo.version'
 _MESSAGE_KEY = 'oslo.message'
+_COMPRESSION_KEY = 'oslo.compression'
+_BATCH_KEY = 'oslo.batch'
+
+_COMPRESSION = 'zlib'
+
+# Sizes in bytes of the serialized message payloads
+_message_stats = {'count': 0, 'total': 0, 'max': 0,
+                  'compressed': 0, 'compressed_total': 0}
 
 _REMOTE_POSTFIX = '_Remote'
 
@@ -477,11 +504,60 @@ def version_is_compatible(imp_version, version):
     return True
 
 
-def serialize_msg(raw_msg):
+def _record_size(size, compressed_size=None):
+    _message_stats['count'] += 1
+    _message_stats['total'] += size
+    _message_stats['max'] = max(_message_stats['max'], size)
+    if compressed_size is not None:
+        _message_stats['compressed'] += 1
+        _message_stats['compressed_total'] += compressed_size
+
+
+def get_message_stats():
+    """Return the statistics of the messages serialized by this process.
+
+    The result is a dict of the count, total and maximum size in bytes of
+    the JSON encoded payloads, and of the count and total size of the
+    compressed ones.
+    """
+    return dict(_message_stats)
+
+
+def make_batch_msg(msgs):
+    """Return a message carrying msgs, dispatched as separate casts."""
+    return {_BATCH_KEY: msgs}
+
+
+def get_batch(msg):
+    """Return the messages of a batch, or None if msg is not a batch."""
+    return msg.pop(_BATCH_KEY, None)
+
+
+def serialize_msg(raw_msg, compress=False):
+    """Wrap raw_msg in an envelope.
+
+    With compress, the payload is compressed if larger than
+    rpc_compression_threshold, the receiver having to support it.
+    """
     # NOTE(russellb) See the docstring for _RPC_ENVELOPE_VERSION for more
     # information about this format.
-    msg = {_VERSION_KEY: _RPC_ENVELOPE_VERSION,
-           _MESSAGE_KEY: jsonutils.dumps(raw_msg)}
+    payload = jsonutils.dumps(raw_msg)
+    version = _RPC_PLAIN_ENVELOPE_VERSION
+    if isinstance(raw_msg, dict) and _BATCH_KEY in raw_msg:
+        version = _RPC_ENVELOPE_VERSION
+    threshold = CONF.rpc_compression_threshold
+    if compress and threshold and len(payload) >= threshold:
+        compressed = base64.b64encode(zlib.compress(payload))
+        _record_size(len(payload), len(compressed))
+        LOG.debug(_('Compressed a message of %(size)d bytes to %(compressed)d '
+                    'bytes'),
+                  {'size': len(payload), 'compressed': len(compressed)})
+        return {_VERSION_KEY: _RPC_ENVELOPE_VERSION,
+                _MESSAGE_KEY: compressed,
+                _COMPRESSION_KEY: _COMPRESSION}
+    _record_size(len(payload))
+    msg = {_VERSION_KEY: version,
+           _MESSAGE_KEY: payload}
 
     return msg
 
@@ -525,6 +601,12 @@ def deserialize_msg(msg):
     if not version_is_compatible(_RPC_ENVELOPE_VERSION, msg[_VERSION_KEY]):
         raise UnsupportedRpcEnvelopeVersion(version=msg[_VERSION_KEY])
 
-    raw_msg = jsonutils.loads(msg[_MESSAGE_KEY])
+    payload = msg[_MESSAGE_KEY]
+    compression = msg.get(_COMPRESSION_KEY)
+    if compression == _COMPRESSION:
+        payload = zlib.decompress(base64.b64decode(payload))
+    elif compression:
+        raise UnsupportedRpcEnvelopeVersion(version=msg[_VERSION_KEY])
+    raw_msg = jsonutils.loads(payload)
 
     return raw_msg
@@ -164,10 +164,11 @@ def call(conf, context, topic, msg, timeout=None):
 
 def cast(conf, context, topic, msg):
     check_serialize(msg)
-    try:
-        call(conf, context, topic, msg)
-    except Exception:
-        pass
+    for cast_msg in rpc_common.get_batch(msg) or [msg]:
+        try:
+            call(conf, context, topic, cast_msg)
+        except Exception:
+            pass
 
 
 def notify(conf, context, topic, msg, envelope):
@@ -181,15 +182,17 @@ def cleanup():
 def fanout_cast(conf, context, topic, msg):
     """Cast to all consumers of a topic."""
     check_serialize(msg)
-    method = msg.get('method')
-    if not method:
-        return
-    args = msg.get('args', {})
-    version = msg.get('version', None)
-    namespace = msg.get('namespace', None)
-
-    for consumer in CONSUMERS.get(topic, []):
-        try:
-            consumer.call(context, version, method, namespace, args, None)
-        except Exception:
-            pass
+    for cast_msg in rpc_common.get_batch(msg) or [msg]:
+        method = cast_msg.get('method')
+        if not method:
+            continue
+        args = cast_msg.get('args', {})
+        version = cast_msg.get('version', None)
+        namespace = cast_msg.get('namespace', None)
+
+        for consumer in CONSUMERS.get(topic, []):
+            try:
+                consumer.call(context, version, method, namespace, args,
+                              None)
+            except Exception:
+                pass
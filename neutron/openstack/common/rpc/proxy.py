@@ -170,6 +170,36 @@ class RpcProxy(object):
         msg['args'] = self._serialize_msg_args(context, msg['args'])
         rpc.cast(context, self._get_topic(topic), msg)
 
+    def cast_batch(self, context, msgs, topic=None, version=None,
+                   fanout=False):
+        """rpc.cast() several remote methods with a single message.
+
+        The receivers dispatch the messages as separate casts, they must
+        implement the version 2.1 of the message envelope. Only the
+        consumers of the amqp based drivers (ProxyCallback) and of the fake
+        driver unpack batches, impl_zmq receivers reject them as messages
+        without a method: do not use this method with the zmq driver.
+
+        :param context: The request context
+        :param msgs: The messages to send, each including the method and
+               args.
+        :param topic: Override the topic for these messages.
+        :param version: (Optional) Override the requested API version in these
+               messages.
+        :param fanout: Whether the batch is cast on the fanout exchange.
+
+        :returns: None.  rpc.cast() does not wait on any return value from the
+                  remote methods.
+        """
+        for msg in msgs:
+            self._set_version(msg, version)
+            msg['args'] = self._serialize_msg_args(context, msg['args'])
+        batch = rpc_common.make_batch_msg(msgs)
+        if fanout:
+            rpc.fanout_cast(context, self._get_topic(topic), batch)
+        else:
+            rpc.cast(context, self._get_topic(topic), batch)
+
     def fanout_cast(self, context, msg, topic=None, version=None):
         """rpc.fanout_cast() a remote method.
 
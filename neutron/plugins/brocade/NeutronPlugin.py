@@ -76,10 +76,13 @@ class BridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                          sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
     """Agent callback."""
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.4'
     # Device names start with "tap"
     # history
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list
+    #   1.3 Support update_devices_down
+    #   1.4 Support security_group_info_for_devices
     TAP_PREFIX_LEN = 3
 
     def create_rpc_dispatcher(self):
@@ -138,6 +141,12 @@ class BridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices."""
+        devices = kwargs.pop('devices', [])
+        return [self.get_device_details(rpc_context, device=device, **kwargs)
+                for device in devices]
+
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
 
@@ -155,6 +164,12 @@ class BridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
+        devices = kwargs.pop('devices', [])
+        return [self.update_device_down(rpc_context, device=device, **kwargs)
+                for device in devices]
+
 
 class AgentNotifierApi(proxy.RpcProxy,
                        sg_rpc.SecurityGroupAgentRpcApiMixin):
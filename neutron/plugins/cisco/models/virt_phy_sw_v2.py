@@ -74,6 +74,12 @@ class VirtualPhysicalSwitchModelV2(neutron_plugin_base_v2.NeutronPluginBaseV2):
             self._plugins[key] = importutils.import_object(plugin_obj)
             LOG.debug(_("Loaded device plugin %s\n"),
                       conf.CISCO_PLUGINS[key])
+            # The device plugins consume their RPC topics in the server
+            # process
+            if (isinstance(self._plugins[key],
+                           neutron_plugin_base_v2.NeutronPluginBaseV2) and
+                self._plugins[key].rpc_workers_supported()):
+                self._plugins[key].start_rpc_listener()
 
         if ((const.VSWITCH_PLUGIN in self._plugins) and
             hasattr(self._plugins[const.VSWITCH_PLUGIN],
@@ -32,7 +32,10 @@ class HyperVRpcCallbacks(
         l3_rpc_base.L3RpcCallbackMixin):
 
     # Set RPC API version to 1.0 by default.
-    RPC_API_VERSION = '1.1'
+    # history
+    #   1.2 Support get_devices_details_list
+    #   1.3 Support update_devices_down
+    RPC_API_VERSION = '1.3'
 
     def __init__(self, notifier):
         self.notifier = notifier
@@ -69,6 +72,12 @@ class HyperVRpcCallbacks(
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices."""
+        devices = kwargs.pop('devices', [])
+        return [self.get_device_details(rpc_context, device=device, **kwargs)
+                for device in devices]
+
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
         # TODO(garyk) - live migration and port status
@@ -88,6 +97,12 @@ class HyperVRpcCallbacks(
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
+        devices = kwargs.pop('devices', [])
+        return [self.update_device_down(rpc_context, device=device, **kwargs)
+                for device in devices]
+
     def tunnel_sync(self, rpc_context, **kwargs):
         """Tunnel sync.
 
@@ -113,7 +113,16 @@ class MetaPluginV2(db_base_plugin_v2.NeutronDbPluginV2,
     def _load_plugin(self, plugin_provider):
         LOG.debug(_("Plugin location: %s"), plugin_provider)
         plugin_klass = importutils.import_class(plugin_provider)
-        return plugin_klass()
+        plugin = plugin_klass()
+        # The plugins consume their RPC topics in the server process
+        if plugin.rpc_workers_supported():
+            plugin.start_rpc_listener()
+        return plugin
+
+    def start_periodic_tasks(self):
+        plugins = set(self.plugins.values()) | set(self.l3_plugins.values())
+        for plugin in plugins:
+            plugin.start_periodic_tasks()
 
     def _get_plugin(self, flavor):
         if flavor not in self.plugins:
@@ -30,6 +30,22 @@ ml2_opts = [
                 help=_("An ordered list of networking mechanism driver "
                        "entrypoints to be loaded from the "
                        "neutron.ml2.mechanism_drivers namespace.")),
+    cfg.IntOpt('mechanism_driver_concurrency',
+               default=1,
+               help=_("Maximum number of mechanism drivers whose postcommit "
+                      "methods are called concurrently. With the default "
+                      "of 1, the drivers are called one after another.")),
+    cfg.IntOpt('mechanism_driver_timeout',
+               default=0,
+               help=_("Number of seconds after which a postcommit call to "
+                      "a mechanism driver is considered failed, when the "
+                      "drivers are called concurrently. 0 means no "
+                      "timeout.")),
+    cfg.IntOpt('mechanism_driver_stats_interval',
+               default=300,
+               help=_("Minimum number of seconds between two logs of the "
+                      "latency statistics of the mechanism driver calls. "
+                      "0 disables the logs.")),
 ]
 
 
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from neutron.db import api as db_api
@@ -26,6 +27,10 @@ from neutron.plugins.ml2 import models
 
 LOG = log.getLogger(__name__)
 
+# The length of the full port ids, as opposed to the truncated port ids
+# used in the device names
+UUID_LEN = 36
+
 
 def initialize():
     db_api.configure_db()
@@ -58,6 +63,23 @@ def get_network_segments(session, network_id):
                 for record in records]
 
 
+def get_networks_segments(session, network_ids):
+    """Return the segments of each network, in a single query."""
+    segments = dict((network_id, []) for network_id in network_ids)
+    if not network_ids:
+        return segments
+    with session.begin(subtransactions=True):
+        records = (session.query(models.NetworkSegment).
+                   filter(models.NetworkSegment.network_id.in_(
+                       list(network_ids))))
+        for record in records:
+            segments[record.network_id].append(
+                {api.NETWORK_TYPE: record.network_type,
+                 api.PHYSICAL_NETWORK: record.physical_network,
+                 api.SEGMENTATION_ID: record.segmentation_id})
+    return segments
+
+
 def get_port(session, port_id):
     """Get port record for update within transcation."""
 
@@ -75,6 +97,59 @@ def get_port(session, port_id):
             return
 
 
+def get_ports(session, port_ids):
+    """Get port records for update within transaction, in a single query.
+
+    As with get_port, port_ids may be prefixes of the port ids. Returns a
+    dict of the records by requested port_id, the port_ids matching no
+    port or several ports are left out.
+    """
+    ports = {}
+    if not port_ids:
+        return ports
+    port_ids = set(port_ids)
+    lengths = set(len(port_id) for port_id in port_ids)
+    # Only the prefixes are matched with LIKE, which cannot always use the
+    # primary key index
+    full_ids = [port_id for port_id in port_ids if len(port_id) == UUID_LEN]
+    criteria = [models_v2.Port.id.startswith(port_id)
+                for port_id in port_ids if len(port_id) != UUID_LEN]
+    if full_ids:
+        criteria.append(models_v2.Port.id.in_(full_ids))
+    with session.begin(subtransactions=True):
+        records = (session.query(models_v2.Port).
+                   filter(sa.or_(*criteria)))
+        ambiguous = set()
+        for record in records:
+            for length in lengths:
+                port_id = record.id[:length]
+                if port_id not in port_ids:
+                    continue
+                if port_id in ports:
+                    ambiguous.add(port_id)
+                ports[port_id] = record
+    for port_id in ambiguous:
+        LOG.error(_("Multiple ports have port_id starting with %s"),
+                  port_id)
+        del ports[port_id]
+    return ports
+
+
+def set_ports_status(session, port_ids, status):
+    """Set the status of the ports with a single UPDATE statement.
+
+    Only the rows whose status differs are written. Returns the number of
+    ports whose status changed.
+    """
+    if not port_ids:
+        return 0
+    with session.begin(subtransactions=True):
+        return (session.query(models_v2.Port).
+                filter(models_v2.Port.id.in_(list(port_ids)),
+                       models_v2.Port.status != status).
+                update({'status': status}, synchronize_session=False))
+
+
 def get_port_and_sgs(port_id):
     """Get port from database with security group info."""
 
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+
 from neutron.plugins.ml2 import driver_api as api
 
 
@@ -25,6 +27,17 @@ class MechanismDriverContext(object):
         # method call of the plugin.
         self._plugin_context = plugin_context
 
+    def _with_own_session(self):
+        """Return a copy of the context using its own database session.
+
+        A session must not be used by several green threads at once, so
+        the mechanism drivers called concurrently each get such a copy.
+        """
+        context = copy.copy(self)
+        context._plugin_context = copy.copy(self._plugin_context)
+        context._plugin_context._session = None
+        return context
+
 
 class NetworkContext(MechanismDriverContext, api.NetworkContext):
 
@@ -57,6 +70,14 @@ class PortContext(MechanismDriverContext, api.PortContext):
         self._original_port = original_port
         self._network_context = None
 
+    def _with_own_session(self):
+        context = super(PortContext, self)._with_own_session()
+        if self._network_context:
+            network_context = copy.copy(self._network_context)
+            network_context._plugin_context = context._plugin_context
+            context._network_context = network_context
+        return context
+
     def current(self):
         return self._port
 
@@ -0,0 +1,119 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sqlalchemy as sa
+
+from neutron.openstack.common import log
+
+LOG = log.getLogger(__name__)
+
+# The allocatable ids are synchronized by chunks of SYNC_CHUNK_SIZE ids,
+# each chunk being inserted with a single INSERT statement
+SYNC_CHUNK_SIZE = 5000
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def _in_ranges(column, ranges):
+    return sa.or_(*[column.between(lo, hi) for lo, hi in ranges])
+
+
+def _chunks(ranges):
+    """Split the ranges along the multiples of SYNC_CHUNK_SIZE.
+
+    Returns a dict of the (first, last) parts of the ranges by the first
+    id of their chunk.
+    """
+    chunks = {}
+    for lo, hi in ranges:
+        first = lo
+        while first <= hi:
+            chunk = first - first % SYNC_CHUNK_SIZE
+            last = min(hi, chunk + SYNC_CHUNK_SIZE - 1)
+            chunks.setdefault(chunk, []).append((first, last))
+            first = last + 1
+    return chunks
+
+
+def _add_missing(session, model, id_column, ranges, filters):
+    """Insert the rows missing for the ids of ranges."""
+    column = getattr(model, id_column)
+    table = model.__table__
+    added = 0
+    chunks = _chunks(ranges)
+    chunk_expr = column - column % SYNC_CHUNK_SIZE
+    counts = dict(session.query(chunk_expr, sa.func.count()).
+                  filter_by(**filters).
+                  filter(_in_ranges(column, ranges)).
+                  group_by(chunk_expr))
+    for chunk in sorted(chunks):
+        parts = chunks[chunk]
+        size = sum(last - first + 1 for first, last in parts)
+        count = counts.get(chunk, 0)
+        if count == size:
+            continue
+        existing = set()
+        if count:
+            existing = set(
+                row[0] for row in session.query(column).
+                filter_by(**filters).
+                filter(_in_ranges(column, parts)))
+        rows = []
+        for first, last in parts:
+            for id_value in xrange(first, last + 1):
+                if id_value not in existing:
+                    row = dict(filters, allocated=False)
+                    row[id_column] = id_value
+                    rows.append(row)
+        session.execute(table.insert(), rows)
+        added += len(rows)
+    return added
+
+
+def sync_allocations(session, model, id_column, ranges, **filters):
+    """Make the allocation table match the allocatable id ranges.
+
+    The rows of model matching filters (e.g. a physical network) are
+    synchronized: the unallocated rows outside of ranges are removed with
+    a single DELETE and rows are added for the missing ids of the ranges,
+    with one INSERT per chunk of ids. The number of rows per chunk is
+    counted with a single query, so the ids of a chunk are only loaded
+    when some of them are missing, and no ORM object is ever built.
+    Returns the numbers of removed and added rows.
+    """
+    ranges = _merge_ranges(ranges)
+    column = getattr(model, id_column)
+    table = model.__table__
+    added = 0
+    with session.begin(subtransactions=True):
+        query = session.query(model).filter_by(allocated=False, **filters)
+        if ranges:
+            query = query.filter(sa.not_(_in_ranges(column, ranges)))
+        removed = query.delete(synchronize_session=False)
+        if ranges:
+            added = _add_missing(session, model, id_column, ranges, filters)
+    LOG.debug(_("Synchronized %(table)s %(filters)s: %(removed)s row(s) "
+                "removed, %(added)s row(s) added"),
+              {'table': table.name, 'filters': filters,
+               'removed': removed, 'added': added})
+    return removed, added
@@ -26,6 +26,7 @@ from neutron.db import model_base
 from neutron.openstack.common import log
 from neutron.plugins.common import utils as plugin_utils
 from neutron.plugins.ml2 import driver_api as api
+from neutron.plugins.ml2.drivers import helpers
 
 LOG = log.getLogger(__name__)
 
@@ -96,62 +97,24 @@ class VlanTypeDriver(api.TypeDriver):
     def _sync_vlan_allocations(self):
         session = db_api.get_session()
         with session.begin(subtransactions=True):
-            # get existing allocations for all physical networks
-            allocations = dict()
-            allocs = (session.query(VlanAllocation).
-                      with_lockmode('update'))
-            for alloc in allocs:
-                if alloc.physical_network not in allocations:
-                    allocations[alloc.physical_network] = set()
-                allocations[alloc.physical_network].add(alloc)
-
-            # process vlan ranges for each configured physical network
+            # sync the allocatable vlans of each configured physical network
             for (physical_network,
                  vlan_ranges) in self.network_vlan_ranges.items():
-                # determine current configured allocatable vlans for
-                # this physical network
-                vlan_ids = set()
-                for vlan_min, vlan_max in vlan_ranges:
-                    vlan_ids |= set(xrange(vlan_min, vlan_max + 1))
-
-                # remove from table unallocated vlans not currently
-                # allocatable
-                if physical_network in allocations:
-                    for alloc in allocations[physical_network]:
-                        try:
-                            # see if vlan is allocatable
-                            vlan_ids.remove(alloc.vlan_id)
-                        except KeyError:
-                            # it's not allocatable, so check if its allocated
-                            if not alloc.allocated:
-                                # it's not, so remove it from table
-                                LOG.debug(_("Removing vlan %(vlan_id)s on "
-                                            "physical network "
-                                            "%(physical_network)s from pool"),
-                                          {'vlan_id': alloc.vlan_id,
-                                           'physical_network':
-                                           physical_network})
-                                session.delete(alloc)
-                    del allocations[physical_network]
-
-                # add missing allocatable vlans to table
-                for vlan_id in sorted(vlan_ids):
-                    alloc = VlanAllocation(physical_network=physical_network,
-                                           vlan_id=vlan_id,
-                                           allocated=False)
-                    session.add(alloc)
+                helpers.sync_allocations(session, VlanAllocation, 'vlan_id',
+                                         vlan_ranges,
+                                         physical_network=physical_network)
 
             # remove from table unallocated vlans for any unconfigured
             # physical networks
-            for allocs in allocations.itervalues():
-                for alloc in allocs:
-                    if not alloc.allocated:
-                        LOG.debug(_("Removing vlan %(vlan_id)s on physical "
-                                    "network %(physical_network)s from pool"),
-                                  {'vlan_id': alloc.vlan_id,
-                                   'physical_network':
-                                   alloc.physical_network})
-                        session.delete(alloc)
+            query = session.query(VlanAllocation).filter_by(allocated=False)
+            if self.network_vlan_ranges:
+                query = query.filter(
+                    ~VlanAllocation.physical_network.in_(
+                        self.network_vlan_ranges.keys()))
+            removed = query.delete(synchronize_session=False)
+            if removed:
+                LOG.debug(_("Removed %s vlan(s) of unconfigured physical "
+                            "networks from pool"), removed)
 
     def get_type(self):
         return TYPE_VLAN
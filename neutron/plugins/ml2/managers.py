@@ -14,7 +14,9 @@
 #    under the License.
 
 import sys
+import time
 
+import eventlet
 from oslo.config import cfg
 import stevedore
 
@@ -133,6 +135,9 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
                                                invoke_on_load=True)
         LOG.info(_("Loaded mechanism driver names: %s"), self.names())
         self._register_mechanisms()
+        # Latency of the calls to the drivers, by driver and method name
+        self.driver_stats = {}
+        self._driver_stats_logged_at = time.time()
 
     def _register_mechanisms(self):
         """Register all mechanism drivers.
@@ -156,29 +161,101 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
             LOG.info(_("Initializing mechanism driver '%s'"), driver.name)
             driver.obj.initialize()
 
+    def _record_latency(self, driver_name, method_name, latency):
+        stats = self.driver_stats.setdefault(driver_name, {}).setdefault(
+            method_name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        stats['count'] += 1
+        stats['total'] += latency
+        stats['max'] = max(stats['max'], latency)
+
+    def get_driver_stats(self):
+        """Return the latency statistics of the mechanism driver calls.
+
+        The result is a dict of dicts of the count, average and maximum
+        latency in seconds of the calls, by driver and method name.
+        """
+        return dict(
+            (driver_name,
+             dict((method_name, {'count': stats['count'],
+                                 'average': stats['total'] / stats['count'],
+                                 'max': stats['max']})
+                  for method_name, stats in methods.iteritems()))
+            for driver_name, methods in self.driver_stats.iteritems())
+
+    def _log_driver_stats(self):
+        """Log the statistics once per mechanism_driver_stats_interval."""
+        interval = cfg.CONF.ml2.mechanism_driver_stats_interval
+        if not interval:
+            return
+        now = time.time()
+        if now - self._driver_stats_logged_at < interval:
+            return
+        self._driver_stats_logged_at = now
+        LOG.info(_("Mechanism driver call latencies: %s"),
+                 self.get_driver_stats())
+
+    def _call_on_driver(self, driver, method_name, context):
+        """Call a method of a driver, returns whether the call succeeded."""
+        start = time.time()
+        try:
+            getattr(driver.obj, method_name)(context)
+            return True
+        except Exception:
+            LOG.exception(
+                _("Mechanism driver '%(name)s' failed in %(method)s"),
+                {'name': driver.name, 'method': method_name}
+            )
+            return False
+        finally:
+            self._record_latency(driver.name, method_name,
+                                 time.time() - start)
+
+    def _call_on_driver_with_timeout(self, driver, method_name, context):
+        timeout = cfg.CONF.ml2.mechanism_driver_timeout
+        succeeded = None
+        with eventlet.Timeout(timeout or None, False):
+            succeeded = self._call_on_driver(driver, method_name, context)
+        if succeeded is None:
+            LOG.error(_("Mechanism driver '%(name)s' timed out in "
+                        "%(method)s after %(timeout)s seconds"),
+                      {'name': driver.name, 'method': method_name,
+                       'timeout': timeout})
+            return False
+        return succeeded
+
     def _call_on_drivers(self, method_name, context,
-                         continue_on_failure=False):
+                         continue_on_failure=False, concurrent=False):
         """Helper method for calling a method across all mechanism drivers.
 
         :param method_name: name of the method to call
         :param context: context parameter to pass to each method call
         :param continue_on_failure: whether or not to continue to call
         all mechanism drivers once one has raised an exception
+        :param concurrent: whether the drivers may be called concurrently,
+        up to mechanism_driver_concurrency at a time. All the drivers are
+        then called whatever continue_on_failure, and each call is subject
+        to mechanism_driver_timeout. Each driver gets a copy of the context
+        with a database session of its own.
         :raises: neutron.plugins.ml2.common.MechanismDriverError
         if any mechanism driver call fails.
         """
-        error = False
-        for driver in self.ordered_mech_drivers:
-            try:
-                getattr(driver.obj, method_name)(context)
-            except Exception:
-                LOG.exception(
-                    _("Mechanism driver '%(name)s' failed in %(method)s"),
-                    {'name': driver.name, 'method': method_name}
-                )
-                error = True
-                if not continue_on_failure:
-                    break
+        concurrency = cfg.CONF.ml2.mechanism_driver_concurrency
+        if (concurrent and concurrency > 1 and
+                len(self.ordered_mech_drivers) > 1):
+            pool = eventlet.GreenPool(concurrency)
+            results = pool.imap(
+                lambda driver: self._call_on_driver_with_timeout(
+                    driver, method_name, context._with_own_session()),
+                self.ordered_mech_drivers)
+            error = not all(list(results))
+        else:
+            error = False
+            for driver in self.ordered_mech_drivers:
+                if not self._call_on_driver(driver, method_name, context):
+                    error = True
+                    if not continue_on_failure:
+                        break
+        self._log_driver_stats()
         if error:
             raise ml2_exc.MechanismDriverError(
                 method=method_name
@@ -209,7 +286,8 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         any required cleanup. There is no guarantee that all mechanism
         drivers are called in this case.
         """
-        self._call_on_drivers("create_network_postcommit", context)
+        self._call_on_drivers("create_network_postcommit", context,
+                              concurrent=True)
 
     def update_network_precommit(self, context):
         """Notify all mechanism drivers of a network update.
@@ -237,7 +315,8 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         retrying the call or deleting the network. There is no
         guarantee that all mechanism drivers are called in this case.
         """
-        self._call_on_drivers("update_network_postcommit", context)
+        self._call_on_drivers("update_network_postcommit", context,
+                              concurrent=True)
 
     def delete_network_precommit(self, context):
         """Notify all mechanism drivers of a network deletion.
@@ -268,7 +347,7 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         network.
         """
         self._call_on_drivers("delete_network_postcommit", context,
-                              continue_on_failure=True)
+                              continue_on_failure=True, concurrent=True)
 
     def create_port_precommit(self, context):
         """Notify all mechanism drivers of a port creation.
@@ -295,7 +374,8 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         cleanup. There is no guarantee that all mechanism drivers are
         called in this case.
         """
-        self._call_on_drivers("create_port_postcommit", context)
+        self._call_on_drivers("create_port_postcommit", context,
+                              concurrent=True)
 
     def update_port_precommit(self, context):
         """Notify all mechanism drivers of a port update.
@@ -323,7 +403,8 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         retrying the call or deleting the port. There is no
         guarantee that all mechanism drivers are called in this case.
         """
-        self._call_on_drivers("update_port_postcommit", context)
+        self._call_on_drivers("update_port_postcommit", context,
+                              concurrent=True)
 
     def delete_port_precommit(self, context):
         """Notify all mechanism drivers of a port deletion.
@@ -354,4 +435,4 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         port.
         """
         self._call_on_drivers("delete_port_postcommit", context,
-                              continue_on_failure=True)
+                              continue_on_failure=True, concurrent=True)
@@ -41,10 +41,13 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                    sg_db_rpc.SecurityGroupServerRpcCallbackMixin,
                    type_tunnel.TunnelRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.4'
     # history
     #   1.0 Initial version (from openvswitch/linuxbridge)
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list
+    #   1.3 Support update_devices_down
+    #   1.4 Support security_group_info_for_devices
 
     def __init__(self, notifier, type_manager):
         # REVISIT(kmestery): This depends on the first three super classes
@@ -92,35 +95,67 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         session = db_api.get_session()
         with session.begin(subtransactions=True):
             port = db.get_port(session, port_id)
-            if not port:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s not found in database"),
-                            {'device': device, 'agent_id': agent_id})
-                return {'device': device}
-            segments = db.get_network_segments(session, port.network_id)
-            if not segments:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s has network %(network_id) with "
-                              "no segments"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id})
-                return {'device': device}
-            #TODO(rkukura): Use/create port binding
-            segment = segments[0]
-            new_status = (q_const.PORT_STATUS_ACTIVE if port.admin_state_up
-                          else q_const.PORT_STATUS_DOWN)
-            if port.status != new_status:
-                port.status = new_status
-            entry = {'device': device,
-                     'network_id': port.network_id,
-                     'port_id': port.id,
-                     'admin_state_up': port.admin_state_up,
-                     'network_type': segment[api.NETWORK_TYPE],
-                     'segmentation_id': segment[api.SEGMENTATION_ID],
-                     'physical_network': segment[api.PHYSICAL_NETWORK]}
-            LOG.debug(_("Returning: %s"), entry)
-            return entry
+            segments = port and db.get_network_segments(session,
+                                                        port.network_id)
+            return self._get_device_details(device, agent_id, port,
+                                            segments)
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices.
+
+        The ports and the segments of their networks are loaded with one
+        query each, whatever the number of devices.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Details of %(count)d devices requested by agent "
+                    "%(agent_id)s"),
+                  {'count': len(devices), 'agent_id': agent_id})
+        port_ids = dict((device, self._device_to_port_id(device))
+                        for device in devices)
+
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = db.get_ports(session, port_ids.values())
+            segments = db.get_networks_segments(
+                session, set(port.network_id for port in ports.values()))
+            details = []
+            for device in devices:
+                port = ports.get(port_ids[device])
+                details.append(self._get_device_details(
+                    device, agent_id, port,
+                    port and segments[port.network_id]))
+            return details
+
+    def _get_device_details(self, device, agent_id, port, segments):
+        if not port:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s not found in database"),
+                        {'device': device, 'agent_id': agent_id})
+            return {'device': device}
+        if not segments:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s has network %(network_id)s with "
+                          "no segments"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id})
+            return {'device': device}
+        #TODO(rkukura): Use/create port binding
+        segment = segments[0]
+        new_status = (q_const.PORT_STATUS_ACTIVE if port.admin_state_up
+                      else q_const.PORT_STATUS_DOWN)
+        if port.status != new_status:
+            port.status = new_status
+        entry = {'device': device,
+                 'network_id': port.network_id,
+                 'port_id': port.id,
+                 'admin_state_up': port.admin_state_up,
+                 'network_type': segment[api.NETWORK_TYPE],
+                 'segmentation_id': segment[api.SEGMENTATION_ID],
+                 'physical_network': segment[api.PHYSICAL_NETWORK]}
+        LOG.debug(_("Returning: %s"), entry)
+        return entry
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
@@ -161,9 +196,44 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                 LOG.warning(_("Device %(device)s updated up by agent "
                               "%(agent_id)s not found in database"),
                             {'device': device, 'agent_id': agent_id})
+                return
             if port.status != q_const.PORT_STATUS_ACTIVE:
                 port.status = q_const.PORT_STATUS_ACTIVE
 
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
+        return self._update_devices_status(kwargs.get('agent_id'),
+                                           kwargs.get('devices', []),
+                                           q_const.PORT_STATUS_DOWN)
+
+    def _update_devices_status(self, agent_id, devices, status):
+        """Set the status of the ports of the devices.
+
+        The ports are looked up with one query and updated with one
+        statement, whatever the number of devices.
+        """
+        port_ids = dict((device, self._device_to_port_id(device))
+                        for device in devices)
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = db.get_ports(session, port_ids.values())
+            changed = db.set_ports_status(
+                session, [port.id for port in ports.values()], status)
+        LOG.debug(_("Status of %(changed)d of %(count)d devices set to "
+                    "%(status)s by agent %(agent_id)s"),
+                  {'changed': changed, 'count': len(devices),
+                   'status': status, 'agent_id': agent_id})
+        entries = []
+        for device in devices:
+            exists = port_ids[device] in ports
+            if not exists:
+                LOG.warning(_("Device %(device)s updated %(status)s by agent "
+                              "%(agent_id)s not found in database"),
+                            {'device': device, 'status': status,
+                             'agent_id': agent_id})
+            entries.append({'device': device, 'exists': exists})
+        return entries
+
 
 class AgentNotifierApi(proxy.RpcProxy,
                        sg_rpc.SecurityGroupAgentRpcApiMixin,
@@ -289,20 +289,21 @@ class MlnxEswitchNeutronAgent(object):
             LOG.debug(_("No port %s defined on agent."), port_id)
 
     def treat_devices_added(self, devices):
-        resync = False
-        for device in devices:
+        try:
+            devs_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context,
+                devices,
+                self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get device details for devices "
+                        "with MAC address %(devices)s: due to %(exc)s"),
+                      {'devices': devices, 'exc': e})
+            # resync is needed
+            return True
+
+        for dev_details in devs_details_list:
+            device = dev_details['device']
             LOG.info(_("Adding port with mac %s"), device)
-            try:
-                dev_details = self.plugin_rpc.get_device_details(
-                    self.context,
-                    device,
-                    self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get device dev_details for device "
-                          "with mac_address %(device)s: due to %(exc)s"),
-                          {'device': device, 'exc': e})
-                resync = True
-                continue
             if 'port_id' in dev_details:
                 LOG.info(_("Port %s updated"), device)
                 LOG.debug(_("Device details %s"), str(dev_details))
@@ -316,22 +317,36 @@ class MlnxEswitchNeutronAgent(object):
             else:
                 LOG.debug(_("Device with mac_address %s not defined "
                           "on Neutron Plugin"), device)
-        return resync
+        return False
 
     def treat_devices_removed(self, devices):
         resync = False
+        macs_by_port_id = {}
         for device in devices:
             LOG.info(_("Removing device with mac_address %s"), device)
             try:
                 port_id = self.eswitch.get_port_id_by_mac(device)
-                dev_details = self.plugin_rpc.update_device_down(self.context,
-                                                                 port_id,
-                                                                 self.agent_id)
             except Exception as e:
                 LOG.debug(_("Removing port failed for device %(device)s "
                           "due to %(exc)s"), {'device': device, 'exc': e})
                 resync = True
                 continue
+            macs_by_port_id[port_id] = device
+        if not macs_by_port_id:
+            return resync
+        try:
+            devs_details_list = self.plugin_rpc.update_devices_down(
+                self.context,
+                macs_by_port_id.keys(),
+                self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Removing ports failed for devices %(devices)s "
+                        "due to %(exc)s"),
+                      {'devices': macs_by_port_id.values(), 'exc': e})
+            # resync is needed
+            return True
+        for dev_details in devs_details_list:
+            device = macs_by_port_id[dev_details['device']]
             if dev_details['exists']:
                 LOG.info(_("Port %s updated."), device)
                 self.eswitch.port_release(device)
@@ -33,7 +33,10 @@ class MlnxRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                        sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
     # History
     #  1.1 Support Security Group RPC
-    RPC_API_VERSION = '1.1'
+    #  1.2 Support get_devices_details_list
+    #  1.3 Support update_devices_down
+    #  1.4 Support security_group_info_for_devices
+    RPC_API_VERSION = '1.4'
 
     #to be compatible with Linux Bridge Agent on Network Node
     TAP_PREFIX_LEN = 3
@@ -90,6 +93,12 @@ class MlnxRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug("%s can not be found in database", device)
         return entry
 
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices."""
+        devices = kwargs.pop('devices', [])
+        return [self.get_device_details(rpc_context, device=device, **kwargs)
+                for device in devices]
+
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
         agent_id = kwargs.get('agent_id')
@@ -108,6 +117,12 @@ class MlnxRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
+        devices = kwargs.pop('devices', [])
+        return [self.update_device_down(rpc_context, device=device, **kwargs)
+                for device in devices]
+
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent."""
         agent_id = kwargs.get('agent_id')
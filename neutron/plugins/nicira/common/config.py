@@ -44,6 +44,24 @@ nvp_opts = [
                       "bridge, ipsec_gre, or ipsec_stt)")),
 ]
 
+sync_opts = [
+    cfg.IntOpt('state_sync_interval', default=120,
+               help=_("Interval in seconds between runs of the state "
+                      "synchronization task, which stores the operational "
+                      "status of the NVP resources in the Neutron database. "
+                      "0 disables the task")),
+    cfg.IntOpt('chunk_size', default=500,
+               help=_("Maximum number of resources fetched from NVP by each "
+                      "request of the state synchronization task")),
+    cfg.FloatOpt('min_sync_req_delay', default=1,
+                 help=_("Minimum delay in seconds between two requests of "
+                        "the state synchronization task to NVP")),
+    cfg.BoolOpt('always_read_status', default=False,
+                help=_("Always read the operational status of a resource "
+                       "from NVP when it is shown, instead of only when the "
+                       "status field is requested")),
+]
+
 connection_opts = [
     cfg.StrOpt('nvp_user',
                default='admin',
@@ -95,6 +113,7 @@ cluster_opts = [
 cfg.CONF.register_opts(connection_opts)
 cfg.CONF.register_opts(cluster_opts)
 cfg.CONF.register_opts(nvp_opts, "NVP")
+cfg.CONF.register_opts(sync_opts, "NVP_SYNC")
 # NOTE(armando-migliaccio): keep the following code until we support
 # NVP configuration files in older format (Grizzly or older).
 # ### BEGIN
@@ -0,0 +1,258 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from eventlet import greenthread
+from oslo.config import cfg
+
+from neutron.common import constants
+from neutron.common import exceptions as q_exc
+from neutron import context as q_context
+from neutron.db import l3_db
+from neutron.db import models_v2
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
+from neutron.plugins.nicira.common import exceptions as nvp_exc
+from neutron.plugins.nicira import nvplib
+
+LOG = logging.getLogger(__name__)
+
+# The ports which have no logical switch port in NVP
+NO_LPORT_DEVICE_OWNERS = (l3_db.DEVICE_OWNER_FLOATINGIP,
+                          l3_db.DEVICE_OWNER_ROUTER_GW)
+
+
+def _get_tag(resource, scope):
+    for tag in resource.get('tags', []):
+        if tag['scope'] == scope:
+            return tag['tag']
+
+
+def get_lswitch_status(lswitch):
+    """Return the status of the network of a logical switch."""
+    status = lswitch.get('_relations', {}).get('LogicalSwitchStatus')
+    # FIXME(salvatore-orlando): Being unable to fetch the logical switch
+    # status should be an exception.
+    if status and not status.get('fabric_status'):
+        return constants.NET_STATUS_DOWN
+    return constants.NET_STATUS_ACTIVE
+
+
+def get_lport_status(lport):
+    """Return the status of the port of a logical switch port."""
+    if lport['_relations']['LogicalPortStatus']['fabric_status_up']:
+        return constants.PORT_STATUS_ACTIVE
+    return constants.PORT_STATUS_DOWN
+
+
+def get_lrouter_status(lrouter):
+    """Return the status of the router of a logical router."""
+    status = lrouter.get('_relations', {}).get('LogicalRouterStatus')
+    # FIXME(salvatore-orlando): Being unable to fetch the logical router
+    # status should be an exception.
+    if status and not status.get('fabric_status'):
+        return constants.NET_STATUS_DOWN
+    return constants.NET_STATUS_ACTIVE
+
+
+class NvpSynchronizer(object):
+    """Store the operational status of the NVP resources in the database.
+
+    Every state_sync_interval seconds, the logical switches, switch ports
+    and routers are fetched from NVP in chunks of chunk_size resources, and
+    the status of the corresponding networks, ports and routers is updated
+    in the database, chunk by chunk. The resources which are not found in
+    NVP are put in error.
+    """
+
+    LSWITCH_URI = nvplib._build_uri_path(
+        nvplib.LSWITCH_RESOURCE, fields='uuid,tags,fabric_status',
+        relations='LogicalSwitchStatus')
+    LPORT_URI = nvplib._build_uri_path(
+        nvplib.LSWITCHPORT_RESOURCE, parent_resource_id='*',
+        fields='uuid,tags,fabric_status_up',
+        relations='LogicalPortStatus', filters={'tag_scope': 'q_port_id'})
+    LROUTER_URI = nvplib._build_uri_path(
+        nvplib.LROUTER_RESOURCE, fields='uuid,tags,fabric_status',
+        relations='LogicalRouterStatus')
+
+    def __init__(self, cluster):
+        self._cluster = cluster
+        self._sync_loop = None
+
+    def start(self):
+        """Start the periodic state synchronization task, if enabled."""
+        interval = cfg.CONF.NVP_SYNC.state_sync_interval
+        if interval:
+            self._sync_loop = loopingcall.FixedIntervalLoopingCall(
+                self.synchronize_state)
+            self._sync_loop.start(interval=interval, initial_delay=interval)
+
+    def _set_status(self, context, resource, status):
+        with context.session.begin(subtransactions=True):
+            if resource.status != status:
+                LOG.debug(_("Updating the status of %(id)s from %(old)s to "
+                            "%(new)s"), {'id': resource.id,
+                                         'old': resource.status,
+                                         'new': status})
+                resource.status = status
+
+    def synchronize_network(self, context, network):
+        """Update the status of a network from its logical switches."""
+        try:
+            lswitches = nvplib.get_lswitches(self._cluster, network.id)
+            statuses = [get_lswitch_status(ls) for ls in lswitches]
+            status = (constants.NET_STATUS_DOWN
+                      if constants.NET_STATUS_DOWN in statuses
+                      else constants.NET_STATUS_ACTIVE)
+        except q_exc.NotFound:
+            status = constants.NET_STATUS_ERROR
+        except Exception:
+            err_msg = _("Unable to get logical switches")
+            LOG.exception(err_msg)
+            raise nvp_exc.NvpPluginException(err_msg=err_msg)
+        self._set_status(context, network, status)
+
+    def synchronize_port(self, context, port):
+        """Update the status of a port from its logical switch port."""
+        if port.device_owner in NO_LPORT_DEVICE_OWNERS:
+            return
+        # Do not query by nvp id as the port might be on an extended switch
+        # and we do not store the extended switch uuid
+        lports = nvplib.query_lswitch_lports(
+            self._cluster, '*', relations='LogicalPortStatus',
+            filters={'tag': port.id, 'tag_scope': 'q_port_id'})
+        status = (get_lport_status(lports[0]) if lports
+                  else constants.PORT_STATUS_ERROR)
+        self._set_status(context, port, status)
+
+    def synchronize_router(self, context, router):
+        """Update the status of a router from its logical router."""
+        try:
+            status = get_lrouter_status(
+                nvplib.get_lrouter(self._cluster, router.id))
+        except q_exc.NotFound:
+            status = constants.NET_STATUS_ERROR
+        self._set_status(context, router, status)
+
+    def synchronize_state(self):
+        """Update the status of all the resources from NVP."""
+        context = q_context.get_admin_context()
+        for synchronize in (self._synchronize_networks,
+                            self._synchronize_ports,
+                            self._synchronize_routers):
+            try:
+                synchronize(context)
+            except Exception:
+                LOG.exception(_("Unable to synchronize the state of the "
+                                "NVP resources"))
+
+    def _update_statuses(self, context, model, statuses):
+        ids_by_status = {}
+        for resource_id, status in statuses.iteritems():
+            ids_by_status.setdefault(status, []).append(resource_id)
+        with context.session.begin(subtransactions=True):
+            for status, ids in ids_by_status.iteritems():
+                (context.session.query(model).
+                 filter(model.id.in_(ids)).
+                 filter(model.status != status).
+                 update({'status': status}, synchronize_session=False))
+
+    def _synchronize_resources(self, context, model, ids, uri, get_statuses):
+        """Update the status of resources from NVP, chunk by chunk.
+
+        get_statuses returns the status of the resources of a chunk of NVP
+        resources, by resource id. The resources of ids which are not found
+        in NVP are put in error: they are read before fetching anything, so
+        that the resources created in the meantime are not.
+        """
+        missing = set(ids)
+        page_cursor = None
+        while True:
+            nvp_resources, page_cursor = nvplib.get_single_query_page(
+                uri, self._cluster, page_cursor,
+                cfg.CONF.NVP_SYNC.chunk_size)
+            statuses = get_statuses(nvp_resources)
+            self._update_statuses(context, model, statuses)
+            missing.difference_update(statuses)
+            if not page_cursor:
+                break
+            greenthread.sleep(cfg.CONF.NVP_SYNC.min_sync_req_delay)
+        if missing:
+            LOG.warning(_("Found %(count)d %(resources)s in the Neutron "
+                          "database but not in NVP"),
+                        {'count': len(missing),
+                         'resources': model.__tablename__})
+            self._update_statuses(
+                context, model,
+                dict.fromkeys(missing, constants.NET_STATUS_ERROR))
+
+    def _get_external_network_ids(self, context):
+        return set(ext_net.network_id for ext_net in
+                   context.session.query(l3_db.ExternalNetwork.network_id))
+
+    def _synchronize_networks(self, context):
+        # A network is down if any of its logical switches is down, and its
+        # switches can be in different chunks
+        down_ids = set()
+
+        def get_statuses(lswitches):
+            statuses = {}
+            for lswitch in lswitches:
+                network_id = (_get_tag(lswitch, 'quantum_net_id') or
+                              lswitch['uuid'])
+                if get_lswitch_status(lswitch) == constants.NET_STATUS_DOWN:
+                    down_ids.add(network_id)
+                statuses[network_id] = (constants.NET_STATUS_DOWN
+                                        if network_id in down_ids
+                                        else constants.NET_STATUS_ACTIVE)
+            return statuses
+
+        # The external networks do not exist in NVP
+        external_ids = self._get_external_network_ids(context)
+        ids = [network.id for network in
+               context.session.query(models_v2.Network.id)
+               if network.id not in external_ids]
+        self._synchronize_resources(context, models_v2.Network, ids,
+                                    self.LSWITCH_URI, get_statuses)
+
+    def _synchronize_ports(self, context):
+        def get_statuses(lports):
+            statuses = {}
+            for lport in lports:
+                port_id = _get_tag(lport, 'q_port_id')
+                if port_id:
+                    statuses[port_id] = get_lport_status(lport)
+            return statuses
+
+        external_ids = self._get_external_network_ids(context)
+        query = context.session.query(models_v2.Port.id,
+                                      models_v2.Port.network_id)
+        ids = [port.id for port in query.filter(
+            ~models_v2.Port.device_owner.in_(NO_LPORT_DEVICE_OWNERS))
+            if port.network_id not in external_ids]
+        self._synchronize_resources(context, models_v2.Port, ids,
+                                    self.LPORT_URI, get_statuses)
+
+    def _synchronize_routers(self, context):
+        def get_statuses(lrouters):
+            return dict((lrouter['uuid'], get_lrouter_status(lrouter))
+                        for lrouter in lrouters)
+
+        ids = [router.id for router in
+               context.session.query(l3_db.Router.id)]
+        self._synchronize_resources(context, l3_db.Router, ids,
+                                    self.LROUTER_URI, get_statuses)
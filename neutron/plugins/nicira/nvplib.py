@@ -169,21 +169,33 @@ def get_cluster_version(cluster):
     return version
 
 
+def get_single_query_page(path, cluster, page_cursor=None,
+                          page_length=None):
+    """Return the results of a page of a query, and the next page cursor.
+
+    The cursor is None for the last page.
+    """
+    params = []
+    if page_cursor:
+        params.append("_page_cursor=%s" % page_cursor)
+    if page_length:
+        params.append("_page_length=%s" % page_length)
+    query_marker = "&" if (path.find("?") != -1) else "?"
+    body = do_request(HTTP_GET,
+                      "%s%s%s" % (path, query_marker, '&'.join(params)),
+                      cluster=cluster)
+    return body['results'], body.get('page_cursor')
+
+
 def get_all_query_pages(path, c):
     need_more_results = True
     result_list = []
     page_cursor = None
-    query_marker = "&" if (path.find("?") != -1) else "?"
     while need_more_results:
-        page_cursor_str = (
-            "_page_cursor=%s" % page_cursor if page_cursor else "")
-        body = do_request(HTTP_GET,
-                          "%s%s%s" % (path, query_marker, page_cursor_str),
-                          cluster=c)
-        page_cursor = body.get('page_cursor')
+        results, page_cursor = get_single_query_page(path, c, page_cursor)
         if not page_cursor:
             need_more_results = False
-        result_list.extend(body['results'])
+        result_list.extend(results)
     return result_list
 
 
@@ -22,6 +22,7 @@
 # @author: Seetharama Ayyadevara, Freescale Semiconductor, Inc.
 # @author: Kyle Mestery, Cisco Systems, Inc.
 
+import contextlib
 import distutils.version as dist_version
 import sys
 import time
@@ -31,6 +32,7 @@ from oslo.config import cfg
 
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import polling
 from neutron.agent import rpc as agent_rpc
 from neutron.agent import securitygroups_rpc as sg_rpc
 from neutron.common import config as logging_config
@@ -151,7 +153,9 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
                  polling_interval, tunnel_types=None,
-                 veth_mtu=None):
+                 veth_mtu=None, minimize_polling=False,
+                 ovsdb_monitor_respawn_interval=(
+                     constants.DEFAULT_OVSDBMON_RESPAWN)):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -164,6 +168,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                the agent. If set, will automatically set enable_tunneling to
                True.
         :param veth_mtu: MTU size for veth interfaces.
+        :param minimize_polling: Optional, whether to minimize polling by
+               monitoring ovsdb for interface changes.
+        :param ovsdb_monitor_respawn_interval: Optional, when using polling
+               minimization, the number of seconds to wait before respawning
+               the ovsdb monitor.
         '''
         self.veth_mtu = veth_mtu
         self.root_helper = root_helper
@@ -174,6 +183,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         self.local_vlan_map = {}
 
         self.polling_interval = polling_interval
+        self.minimize_polling = minimize_polling
+        self.ovsdb_monitor_respawn_interval = ovsdb_monitor_respawn_interval
 
         if tunnel_types:
             self.enable_tunneling = True
@@ -661,6 +672,30 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 'added': added,
                 'removed': removed}
 
+    def update_ports_from_events(self, registered_ports, events):
+        '''Derive the integration bridge port changes from ovsdb events.
+
+        Only added ports need to be checked against ovs-vsctl, to filter
+        out the VIF ports that belong to other bridges. The removed ports
+        are the known ones the monitor no longer sees, rather than the
+        removals it reported: a port deleted right after a full poll was
+        never reported by the monitor, so it is not reported as removed.
+
+        :param registered_ports: the set of ports known to the agent.
+        :param events: the changes reported by the polling manager.
+        '''
+        removed = registered_ports - set(events['port_names'])
+        added = events['added'] - registered_ports
+        if added:
+            port_names = set(self.int_br.get_port_name_list())
+            added = set(port_id for port_id in added
+                        if events['port_names'].get(port_id) in port_names)
+        if not (added or removed):
+            return
+        return {'current': (registered_ports | added) - removed,
+                'added': added,
+                'removed': removed}
+
     def update_ancillary_ports(self, registered_ports):
         ports = set()
         for bridge in self.ancillary_brs:
@@ -686,20 +721,19 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             LOG.debug(_("No VIF port for port %s defined on agent."), port_id)
 
     def treat_devices_added(self, devices):
-        resync = False
         self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context, devices, self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
+            device = details['device']
             LOG.info(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
             port = self.int_br.get_vif_port_by_id(details['device'])
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
@@ -714,72 +748,96 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 if (port and int(port.ofport) != -1):
                     self.port_dead(port)
-        return resync
+        return False
 
     def treat_ancillary_devices_added(self, devices):
-        resync = False
         for device in devices:
             LOG.info(_("Ancillary Port %s added"), device)
-            try:
-                self.plugin_rpc.get_device_details(self.context, device,
-                                                   self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-        return resync
+        try:
+            self.plugin_rpc.get_devices_details_list(self.context, devices,
+                                                     self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        return False
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        LOG.info(_("Attachments %s removed"), devices)
+        try:
+            devices_details_list = self.plugin_rpc.update_devices_down(
+                self.context, devices, self.agent_id)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
+            device = details['device']
             if details['exists']:
                 LOG.info(_("Port %s updated."), device)
                 # Nothing to do regarding local networking
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 self.port_unbound(device)
-        return resync
+        return False
 
     def treat_ancillary_devices_removed(self, devices):
-        resync = False
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        LOG.info(_("Ancillary attachments %s removed"), devices)
+        try:
+            devices_details_list = self.plugin_rpc.update_devices_down(
+                self.context, devices, self.agent_id)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
+            device = details['device']
             if details['exists']:
                 LOG.info(_("Port %s updated."), device)
                 # Nothing to do regarding local networking
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
-        return resync
+        return False
+
+    @contextlib.contextmanager
+    def deferred_flows(self):
+        '''Batch the flow changes made to the agent's bridges.
+
+        Within the context, flow adds and deletes are queued on each bridge
+        and pushed with a single ovs-ofctl invocation per bridge and kind
+        of change on exit. The names of the bridges whose flows could not
+        all be applied are then added to the yielded list.
+        '''
+        bridges = [self.int_br] + self.phys_brs.values()
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        for bridge in bridges:
+            bridge.defer_apply_on()
+        failed_bridges = []
+        try:
+            yield failed_bridges
+        finally:
+            for bridge in bridges:
+                if not bridge.defer_apply_off():
+                    failed_bridges.append(bridge.br_name)
 
     def process_network_ports(self, port_info):
         resync_a = False
         resync_b = False
-        if 'added' in port_info:
-            resync_a = self.treat_devices_added(port_info['added'])
-        if 'removed' in port_info:
-            resync_b = self.treat_devices_removed(port_info['removed'])
+        with self.deferred_flows() as failed_bridges:
+            if 'added' in port_info:
+                resync_a = self.treat_devices_added(port_info['added'])
+            if 'removed' in port_info:
+                resync_b = self.treat_devices_removed(port_info['removed'])
+        if failed_bridges:
+            LOG.error(_("Unable to apply the flows to bridges %s"),
+                      failed_bridges)
+            resync_a = True
         # If one of the above opertaions fails => resync with plugin
         return (resync_a | resync_b)
 
@@ -817,7 +875,10 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             resync = True
         return resync
 
-    def rpc_loop(self):
+    def rpc_loop(self, polling_manager=None):
+        if not polling_manager:
+            polling_manager = polling.AlwaysPoll()
+
         sync = True
         ports = set()
         ancillary_ports = set()
@@ -831,13 +892,24 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                     ports.clear()
                     ancillary_ports.clear()
                     sync = False
+                    polling_manager.force_polling()
 
                 # Notify the plugin of tunnel IP
                 if self.enable_tunneling and tunnel_sync:
                     LOG.info(_("Agent tunnel out of sync with plugin!"))
                     tunnel_sync = self.tunnel_sync()
 
-                port_info = self.update_ports(ports)
+                if polling_manager.is_polling_required:
+                    port_info = self.update_ports(ports)
+                    ancillary_changed = True
+                else:
+                    events = polling_manager.get_events()
+                    port_info = self.update_ports_from_events(ports, events)
+                    # Ancillary bridge ports are reported by the same
+                    # monitor, so any event may concern them.
+                    ancillary_changed = bool(
+                        events['added'] or events['removed'] or
+                        ancillary_ports - set(events['port_names']))
 
                 # notify plugin about port deltas
                 if port_info:
@@ -847,13 +919,15 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                     ports = port_info['current']
 
                 # Treat ancillary devices if they exist
-                if self.ancillary_brs:
+                if self.ancillary_brs and ancillary_changed:
                     port_info = self.update_ancillary_ports(ancillary_ports)
                     if port_info:
                         rc = self.process_ancillary_network_ports(port_info)
                         ancillary_ports = port_info['current']
                         sync = sync | rc
 
+                polling_manager.polling_completed()
+
             except Exception:
                 LOG.exception(_("Error in agent event loop"))
                 sync = True
@@ -870,7 +944,12 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                            'elapsed': elapsed})
 
     def daemon_loop(self):
-        self.rpc_loop()
+        with polling.get_polling_manager(
+                self.minimize_polling,
+                self.root_helper,
+                self.ovsdb_monitor_respawn_interval) as pm:
+
+            self.rpc_loop(polling_manager=pm)
 
 
 def check_ovs_version(min_required_version, root_helper):
@@ -931,6 +1010,9 @@ def create_agent_config_map(config):
         polling_interval=config.AGENT.polling_interval,
         tunnel_types=config.AGENT.tunnel_types,
         veth_mtu=config.AGENT.veth_mtu,
+        minimize_polling=config.AGENT.minimize_polling,
+        ovsdb_monitor_respawn_interval=(
+            config.AGENT.ovsdb_monitor_respawn_interval),
     )
 
     # If enable_tunneling is TRUE, set tunnel_type to default to GRE
@@ -38,3 +38,6 @@ MINIMUM_OVS_VXLAN_VERSION = "1.10"
 
 # The different types of tunnels
 TUNNEL_NETWORK_TYPES = [TYPE_GRE, TYPE_VXLAN]
+
+# How long to wait before respawning a dead ovsdb monitor (in seconds)
+DEFAULT_OVSDBMON_RESPAWN = 30
@@ -35,7 +35,12 @@ from neutron.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_COMPILED_RULES = None
 ADMIN_CTX_POLICY = 'context_is_admin'
+# Key of the parent resource cache in the credentials passed to the checks
+PARENT_CACHE_KEY = '_parent_cache'
+# Key of the role set and admin flag in the credentials passed to the checks
+DECISION_KEY = '_decision_key'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
     'extension:provider_network':
@@ -59,8 +64,10 @@ cfg.CONF.import_opt('policy_file', 'neutron.common.config')
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _COMPILED_RULES
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _COMPILED_RULES = None
     policy.reset()
 
 
@@ -116,6 +123,7 @@ def _set_rules(data):
                             "deprecated policy %s. The policy will "
                             "not be enforced"), pol)
     policy.set_rules(policies)
+    _get_compiled_rules()
 
 
 def _is_attribute_explicitly_set(attribute_name, resource, target):
@@ -126,8 +134,8 @@ def _is_attribute_explicitly_set(attribute_name, resource, target):
             target[attribute_name] != resource[attribute_name]['default'])
 
 
-def _build_subattr_match_rule(attr_name, attr, action, target):
-    """Create the rule to match for sub-attribute policy checks."""
+def _get_subattr_rule_names(attr_name, attr, action, target):
+    """Return the names of the rules for sub-attribute policy checks."""
     # TODO(salv-orlando): Instead of relying on validator info, introduce
     # typing for API attributes
     # Expect a dict as type descriptor
@@ -143,18 +151,24 @@ def _build_subattr_match_rule(attr_name, attr, action, target):
                     "generate any sub-attr policy rule for %s."),
                   attr_name)
         return
-    sub_attr_rules = [policy.RuleCheck('rule', '%s:%s:%s' %
-                                       (action, attr_name,
-                                        sub_attr_name)) for
-                      sub_attr_name in data if sub_attr_name in
-                      target[attr_name]]
-    return policy.AndCheck(sub_attr_rules)
+    return ['%s:%s:%s' % (action, attr_name, sub_attr_name)
+            for sub_attr_name in data
+            if sub_attr_name in target[attr_name]]
 
 
-def _build_match_rule(action, target):
-    """Create the rule to match for a given action.
+def _build_subattr_match_rule(attr_name, attr, action, target):
+    """Create the rule to match for sub-attribute policy checks."""
+    rule_names = _get_subattr_rule_names(attr_name, attr, action, target)
+    if rule_names is None:
+        return
+    return policy.AndCheck([policy.RuleCheck('rule', rule_name)
+                            for rule_name in rule_names])
+
 
-    The policy rule to be matched is built in the following way:
+def _get_match_rule_names(action, target):
+    """Return the names of the rules to match for a given action.
+
+    The rules to be matched are the following:
     1) add entries for matching permission on objects
     2) add an entry for the specific action (e.g.: create_network)
     3) add an entry for attributes of a resource for which the action
@@ -164,7 +178,7 @@ def _build_match_rule(action, target):
        (e.g.: create_router:external_gateway_info:network_id)
     """
 
-    match_rule = policy.RuleCheck('rule', action)
+    rule_names = [action]
     resource, is_write = get_resource_and_action(action)
     # Attribute-based checks shall not be enforced on GETs
     if is_write:
@@ -177,19 +191,165 @@ def _build_match_rule(action, target):
                                                 target):
                     attribute = res_map[resource][attribute_name]
                     if 'enforce_policy' in attribute:
-                        attr_rule = policy.RuleCheck('rule', '%s:%s' %
-                                                     (action, attribute_name))
-                        # Build match entries for sub-attributes, if present
+                        rule_names.append('%s:%s' % (action, attribute_name))
+                        # Add entries for sub-attributes, if present
                         validate = attribute.get('validate')
                         if (validate and any([k.startswith('type:dict') and v
                                               for (k, v) in
                                               validate.iteritems()])):
-                            attr_rule = policy.AndCheck(
-                                [attr_rule, _build_subattr_match_rule(
-                                    attribute_name, attribute,
-                                    action, target)])
-                        match_rule = policy.AndCheck([match_rule, attr_rule])
-    return match_rule
+                            rule_names.extend(_get_subattr_rule_names(
+                                attribute_name, attribute,
+                                action, target) or [])
+    return rule_names
+
+
+def _build_match_rule(action, target):
+    """Create the rule to match for a given action.
+
+    The rule is the conjunction of the rules returned by
+    _get_match_rule_names.
+    """
+    match_rules = [policy.RuleCheck('rule', rule_name)
+                   for rule_name in _get_match_rule_names(action, target)]
+    if len(match_rules) == 1:
+        return match_rules[0]
+    return policy.AndCheck(match_rules)
+
+
+def _true(target, creds):
+    return True
+
+
+def _false(target, creds):
+    return False
+
+
+class CompiledRules(object):
+    """Policy rules compiled into flat callables.
+
+    Each rule is compiled once into a function of the target and the
+    credentials. Rules which only depend on the roles and admin status of
+    the credentials are static, and their decisions are cached per rule,
+    role set and admin status. A compiled rule records the rules it
+    references, directly or not, so that it is compiled again as soon as
+    any of them is replaced in place in the policy engine.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._compiled = {}
+        self._compiling = set()
+        self._decisions = {}
+        for name in rules.keys():
+            self._get(name)
+
+    def _lookup(self, name):
+        """Return the rule used for name, which may be the default rule."""
+        try:
+            return self.rules[name]
+        except KeyError:
+            return
+
+    def _is_current(self, entry):
+        rule, func, static, deps = entry
+        return all(self._lookup(name) is dep_rule
+                   for name, dep_rule in deps.iteritems())
+
+    def _get(self, name):
+        """Return the (rule, function, static, deps) entry for a rule name.
+
+        deps maps the names of the rules the entry depends on, including
+        its own, to the rules they resolved to when it was compiled.
+        """
+        entry = self._compiled.get(name)
+        if entry is not None and self._is_current(entry):
+            return entry
+        rule = self._lookup(name)
+        if rule is None:
+            return
+        if entry is not None:
+            # The decisions of the rules referencing it are dropped as well
+            self._decisions.clear()
+        deps = {name: rule}
+        self._compiling.add(name)
+        try:
+            entry = (rule,) + self._compile(rule, deps) + (deps,)
+        finally:
+            self._compiling.discard(name)
+        self._compiled[name] = entry
+        return entry
+
+    def _compile(self, rule, deps):
+        """Return the function and the static flag of a check tree.
+
+        The rules referenced by the tree are added to deps.
+        """
+        if isinstance(rule, policy.TrueCheck):
+            return _true, True
+        elif isinstance(rule, policy.FalseCheck):
+            return _false, True
+        elif isinstance(rule, policy.RoleCheck):
+            role = rule.match.lower()
+            return (lambda target, creds:
+                    role in [x.lower() for x in creds['roles']]), True
+        elif isinstance(rule, policy.RuleCheck):
+            name = rule.match
+            if name in self._compiling:
+                # Rules referencing themselves are never static
+                static = False
+                deps[name] = self._lookup(name)
+            else:
+                entry = self._get(name)
+                if entry is None:
+                    static = True
+                    deps[name] = None
+                else:
+                    static = entry[2]
+                    deps.update(entry[3])
+            return (lambda target, creds:
+                    self.check(name, target, creds)), static
+        elif isinstance(rule, policy.NotCheck):
+            func, static = self._compile(rule.rule, deps)
+            return (lambda target, creds: not func(target, creds)), static
+        elif isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+            compiled = [self._compile(r, deps) for r in rule.rules]
+            # Evaluate the cheap static checks first
+            funcs = ([func for func, static in compiled if static] +
+                     [func for func, static in compiled if not static])
+            static = all(static for func, static in compiled)
+            if isinstance(rule, policy.AndCheck):
+                return (lambda target, creds:
+                        all(func(target, creds) for func in funcs)), static
+            return (lambda target, creds:
+                    any(func(target, creds) for func in funcs)), static
+        # Checks on the target, e.g. OwnerCheck, are called as they are
+        return rule, False
+
+    def check(self, name, target, creds):
+        """Check the rule named name, as policy.check would do."""
+        entry = self._get(name)
+        if entry is None:
+            # We don't have any matching rule; fail closed
+            return False
+        rule, func, static, deps = entry
+        if not static:
+            return func(target, creds)
+        key = (name, creds[DECISION_KEY])
+        try:
+            return self._decisions[key]
+        except KeyError:
+            result = self._decisions[key] = func(target, creds)
+            return result
+
+
+def _get_compiled_rules():
+    """Return the compiled rules, compiling the loaded rules if needed."""
+    global _COMPILED_RULES
+    if policy._rules is None:
+        return
+    if _COMPILED_RULES is None or _COMPILED_RULES.rules is not policy._rules:
+        _COMPILED_RULES = CompiledRules(policy._rules)
+    return _COMPILED_RULES
 
 
 # This check is registered as 'tenant_id' so that it can override
@@ -222,60 +382,74 @@ class OwnerCheck(policy.Check):
                 reason=err_reason)
         super(OwnerCheck, self).__init__(kind, match)
 
+    def _get_parent_resource(self):
+        """Return the parent resource and field referenced by the check."""
+        # target field is in the form resource:field
+        # however if they're not separated by a colon, use an underscore
+        # as a separator for backward compatibility
+
+        def do_split(separator):
+            parent_res, parent_field = self.target_field.split(
+                separator, 1)
+            return parent_res, parent_field
+
+        for separator in (':', '_'):
+            try:
+                parent_res, parent_field = do_split(separator)
+                break
+            except ValueError:
+                LOG.debug(_("Unable to find ':' as separator in %s."),
+                          self.target_field)
+        else:
+            # If we are here split failed with both separators
+            err_reason = (_("Unable to find resource name in %s") %
+                          self.target_field)
+            LOG.exception(err_reason)
+            raise exceptions.PolicyCheckError(
+                policy="%s:%s" % (self.kind, self.match),
+                reason=err_reason)
+        parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+            "%ss" % parent_res, None)
+        if not parent_foreign_key:
+            err_reason = (_("Unable to verify match:%(match)s as the "
+                            "parent resource: %(res)s was not found") %
+                          {'match': self.match, 'res': parent_res})
+            LOG.exception(err_reason)
+            raise exceptions.PolicyCheckError(
+                policy="%s:%s" % (self.kind, self.match),
+                reason=err_reason)
+        return parent_res, parent_field, parent_foreign_key
+
     def __call__(self, target, creds):
         if self.target_field not in target:
             # policy needs a plugin check
-            # target field is in the form resource:field
-            # however if they're not separated by a colon, use an underscore
-            # as a separator for backward compatibility
-
-            def do_split(separator):
-                parent_res, parent_field = self.target_field.split(
-                    separator, 1)
-                return parent_res, parent_field
-
-            for separator in (':', '_'):
+            parent_res, parent_field, parent_foreign_key = (
+                self._get_parent_resource())
+            parent_id = target[parent_foreign_key]
+            # Parents already loaded while processing this request are
+            # kept in a cache stored on the request context
+            parents = creds.get(PARENT_CACHE_KEY, {})
+            data = parents.get((parent_res, parent_id), {})
+            if parent_field not in data:
+                # NOTE(salv-orlando): This check currently assumes the
+                # parent resource is handled by the core plugin. It might
+                # be worth having a way to map resources to plugins so to
+                # make this check more general
+                f = getattr(manager.NeutronManager.get_instance().plugin,
+                            'get_%s' % parent_res)
+                # f *must* exist, if not found it is better to let neutron
+                # explode. Check will be performed with admin context
+                context = importutils.import_module('neutron.context')
                 try:
-                    parent_res, parent_field = do_split(separator)
-                    break
-                except ValueError:
-                    LOG.debug(_("Unable to find ':' as separator in %s."),
-                              self.target_field)
-            else:
-                # If we are here split failed with both separators
-                err_reason = (_("Unable to find resource name in %s") %
-                              self.target_field)
-                LOG.exception(err_reason)
-                raise exceptions.PolicyCheckError(
-                    policy="%s:%s" % (self.kind, self.match),
-                    reason=err_reason)
-            parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
-                "%ss" % parent_res, None)
-            if not parent_foreign_key:
-                err_reason = (_("Unable to verify match:%(match)s as the "
-                                "parent resource: %(res)s was not found") %
-                              {'match': self.match, 'res': parent_res})
-                LOG.exception(err_reason)
-                raise exceptions.PolicyCheckError(
-                    policy="%s:%s" % (self.kind, self.match),
-                    reason=err_reason)
-            # NOTE(salv-orlando): This check currently assumes the parent
-            # resource is handled by the core plugin. It might be worth
-            # having a way to map resources to plugins so to make this
-            # check more general
-            f = getattr(manager.NeutronManager.get_instance().plugin,
-                        'get_%s' % parent_res)
-            # f *must* exist, if not found it is better to let neutron
-            # explode. Check will be performed with admin context
-            context = importutils.import_module('neutron.context')
-            try:
-                data = f(context.get_admin_context(),
-                         target[parent_foreign_key],
-                         fields=[parent_field])
-                target[self.target_field] = data[parent_field]
-            except Exception:
-                LOG.exception(_('Policy check error while calling %s!'), f)
-                raise
+                    data = f(context.get_admin_context(),
+                             parent_id,
+                             fields=[parent_field])
+                except Exception:
+                    LOG.exception(_('Policy check error while calling %s!'),
+                                  f)
+                    raise
+                parents.setdefault((parent_res, parent_id), {}).update(data)
+            target[self.target_field] = data[parent_field]
         match = self.match % target
         if self.kind in creds:
             return match == unicode(creds[self.kind])
@@ -314,15 +488,88 @@ class FieldCheck(policy.Check):
         return target_value == self.value
 
 
+def _get_parent_cache(context):
+    """Return the parent resources loaded by OwnerCheck for the request."""
+    try:
+        return context._policy_parents
+    except AttributeError:
+        context._policy_parents = {}
+        return context._policy_parents
+
+
+def _get_owner_check_parents(rule, parents):
+    """Collect the parent resources and fields needed by OwnerCheck."""
+    if isinstance(rule, OwnerCheck):
+        try:
+            parent_res, parent_field, parent_foreign_key = (
+                rule._get_parent_resource())
+        except exceptions.PolicyCheckError:
+            return
+        parents.setdefault(
+            (parent_res, parent_foreign_key), set()).add(parent_field)
+    elif isinstance(rule, policy.RuleCheck):
+        if rule.match in policy._rules:
+            _get_owner_check_parents(policy._rules[rule.match], parents)
+    elif hasattr(rule, 'rules'):
+        for rule in rule.rules:
+            _get_owner_check_parents(rule, parents)
+
+
+def prefetch_parents(context, action, targets):
+    """Load with a query per parent resource the parents of targets.
+
+    The parent resources referenced by the ownership checks of action
+    are cached on the context, so that checking the policy for each
+    target does not issue a query per target.
+    """
+    init()
+    if context.is_admin or not targets:
+        return
+    parents = {}
+    _get_owner_check_parents(_build_match_rule(action, targets[0]), parents)
+    cache = _get_parent_cache(context)
+    plugin = manager.NeutronManager.get_instance().plugin
+    admin_context = importutils.import_module(
+        'neutron.context').get_admin_context()
+    for (parent_res, parent_foreign_key), fields in parents.iteritems():
+        ids = set(target[parent_foreign_key] for target in targets
+                  if target.get(parent_foreign_key))
+        ids = [parent_id for parent_id in ids
+               if not fields.issubset(cache.get((parent_res, parent_id),
+                                                {}))]
+        f = getattr(plugin, 'get_%ss' % parent_res, None)
+        if not ids or not f:
+            continue
+        for data in f(admin_context, filters={'id': ids},
+                      fields=['id'] + list(fields)):
+            cache.setdefault((parent_res, data['id']), {}).update(data)
+
+
 def _prepare_check(context, action, target):
-    """Prepare rule, target, and credentials for the policy engine."""
+    """Prepare rule names, target, and credentials for the policy engine."""
     init()
     # Compare with None to distinguish case in which target is {}
     if target is None:
         target = {}
-    match_rule = _build_match_rule(action, target)
+    rule_names = _get_match_rule_names(action, target)
     credentials = context.to_dict()
-    return match_rule, target, credentials
+    credentials[PARENT_CACHE_KEY] = _get_parent_cache(context)
+    credentials[DECISION_KEY] = (
+        frozenset(x.lower() for x in credentials.get('roles', [])),
+        credentials.get('is_admin'))
+    return rule_names, target, credentials
+
+
+def _check(rule_names, target, credentials):
+    """Check that all the rules in rule_names accept the target."""
+    compiled_rules = _get_compiled_rules()
+    if not compiled_rules:
+        # No rules to reference means we're going to fail closed
+        return False
+    for rule_name in rule_names:
+        if not compiled_rules.check(rule_name, target, credentials):
+            return False
+    return True
 
 
 def check(context, action, target, plugin=None):
@@ -339,7 +586,7 @@ def check(context, action, target, plugin=None):
 
     :return: Returns True if access is permitted else False.
     """
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(*(_prepare_check(context, action, target)))
 
 
 def check_if_exists(context, action, target):
@@ -355,7 +602,7 @@ def check_if_exists(context, action, target):
     # Raise if there's no match for requested action in the policy engine
     if not policy._rules or action not in policy._rules:
         raise exceptions.PolicyRuleNotFound(rule=action)
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(*(_prepare_check(context, action, target)))
 
 
 def enforce(context, action, target, plugin=None):
@@ -374,9 +621,9 @@ def enforce(context, action, target, plugin=None):
     """
 
     init()
-    rule, target, credentials = _prepare_check(context, action, target)
-    return policy.check(rule, target, credentials,
-                        exc=exceptions.PolicyNotAuthorized, action=action)
+    if not _check(*(_prepare_check(context, action, target))):
+        raise exceptions.PolicyNotAuthorized(action=action)
+    return True
 
 
 def check_is_admin(context):
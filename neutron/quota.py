@@ -49,6 +49,16 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='neutron.quota.ConfDriver',
                help=_('Default driver to use for quota checks')),
+    cfg.IntOpt('quota_usage_resync_interval',
+               default=600,
+               help=_('Seconds after which the resource usages tracked by '
+                      'the TrackedQuotaDriver are counted again, 0 to '
+                      'only count them after bulk deletions')),
+    cfg.IntOpt('quota_reservation_expiration',
+               default=120,
+               help=_('Seconds after which the resources reserved for a '
+                      'request by the TrackedQuotaDriver are released, if '
+                      'the request did not release them')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -282,6 +292,49 @@ class QuotaEngine(object):
         return self._driver.limit_check(context, tenant_id,
                                         self._resources, values)
 
+    def make_reservation(self, context, tenant_id, resource, delta, plugin,
+                         collection):
+        """Check that delta more resources can be created for a tenant.
+
+        If the quota driver makes reservations, the resources are reserved
+        and the id of the reservation is returned, to be committed once
+        the resources are created or cancelled if their creation fails.
+        Otherwise the resources are counted and checked against the quota,
+        and None is returned.
+
+        This method will raise a QuotaResourceUnknown exception if the
+        resource is unknown, and an OverQuota exception if the resources
+        would be over the quota.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resource: The name of the resource, as a string.
+        :param delta: The number of resources to be created.
+        :param plugin: The plugin counting the resources.
+        :param collection: The name of the collection of the resources.
+        """
+        res = self._resources.get(resource)
+        if not res or not hasattr(res, 'count'):
+            raise exceptions.QuotaResourceUnknown(unknown=[resource])
+
+        def count():
+            return res.count(context, plugin, collection, tenant_id)
+
+        if hasattr(self._driver, 'make_reservation'):
+            return self._driver.make_reservation(
+                context, tenant_id, self._resources, resource, delta, count)
+        self.limit_check(context, tenant_id, **{resource: count() + delta})
+
+    def commit_reservation(self, context, reservation_id):
+        """Commit a reservation once its resources are created."""
+        if reservation_id:
+            self._driver.commit_reservation(context, reservation_id)
+
+    def cancel_reservation(self, context, reservation_id):
+        """Cancel a reservation whose resources were not created."""
+        if reservation_id:
+            self._driver.cancel_reservation(context, reservation_id)
+
     @property
     def resources(self):
         return self._resources
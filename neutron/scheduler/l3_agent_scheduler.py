@@ -58,7 +58,7 @@ class ChanceScheduler(object):
                           host)
                 return False
             if agents_db.AgentDbMixin.is_agent_down(
-                l3_agent.heartbeat_timestamp):
+                agents_db.get_heartbeat_timestamp(l3_agent)):
                 LOG.warn(_('L3 agent %s is not active'), l3_agent.id)
             # check if each of the specified routers is hosted
             if router_ids:
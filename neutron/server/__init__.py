@@ -25,8 +25,11 @@ import sys
 from oslo.config import cfg
 
 from neutron.common import config
+from neutron.openstack.common import log as logging
 from neutron import service
 
+LOG = logging.getLogger(__name__)
+
 
 def main():
     eventlet.monkey_patch()
@@ -38,8 +41,39 @@ def main():
                    " search paths (~/.neutron/, ~/, /etc/neutron/, /etc/) and"
                    " the '--config-file' option!"))
     try:
-        neutron_service = service.serve_wsgi(service.NeutronApiService)
-        neutron_service.wait()
+        pool = eventlet.GreenPool()
+        launcher = service.create_process_launcher()
+
+        neutron_api = service.serve_wsgi(service.NeutronApiService, launcher)
+        # The servers running in this process, and the launcher of the
+        # worker processes, are waited for
+        servers = [launcher]
+        if cfg.CONF.api_workers < 1:
+            servers.append(neutron_api)
+
+        try:
+            neutron_rpc = service.serve_rpc(launcher)
+        except NotImplementedError:
+            LOG.info(_("RPC was already started in parent process by "
+                       "plugin."))
+        else:
+            if neutron_rpc is not launcher:
+                servers.append(neutron_rpc)
+
+        service.start_plugin_periodic_tasks()
+
+        # api and rpc should die together.  When one dies, kill the others.
+        threads = [pool.spawn(server.wait) for server in servers if server]
+
+        def kill_others(dead_thread):
+            for thread in threads:
+                if thread is not dead_thread:
+                    thread.kill()
+
+        for thread in threads:
+            thread.link(kill_others)
+
+        pool.waitall()
     except RuntimeError as e:
         sys.exit(_("ERROR: %s") % e)
 
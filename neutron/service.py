@@ -24,11 +24,17 @@ from oslo.config import cfg
 
 from neutron.common import config
 from neutron.common import legacy
+from neutron.common import rpc as q_rpc
 from neutron import context
+from neutron.db import api as db_api
+from neutron import manager
+from neutron.openstack.common import excutils
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import service
+from neutron.openstack.common import service as common_service
 from neutron import wsgi
 
 
@@ -41,6 +47,16 @@ service_opts = [
                help=_('range of seconds to randomly delay when starting the'
                       ' periodic task scheduler to reduce stampeding.'
                       ' (Disable by setting to 0)')),
+    cfg.IntOpt('api_workers',
+               default=0,
+               help=_('Number of separate API worker processes sharing the '
+                      'listening socket, 0 serving the API in the server '
+                      'process')),
+    cfg.IntOpt('rpc_workers',
+               default=0,
+               help=_('Number of separate worker processes consuming the '
+                      'plugin RPC topics, 0 consuming them in the server '
+                      'process')),
 ]
 CONF = cfg.CONF
 CONF.register_opts(service_opts)
@@ -57,12 +73,13 @@ class WsgiService(object):
 
     """
 
-    def __init__(self, app_name):
+    def __init__(self, app_name, launcher=None):
         self.app_name = app_name
+        self.launcher = launcher
         self.wsgi_app = None
 
     def start(self):
-        self.wsgi_app = _run_wsgi(self.app_name)
+        self.wsgi_app = _run_wsgi(self.app_name, self.launcher)
 
     def wait(self):
         self.wsgi_app.wait()
@@ -72,7 +89,7 @@ class NeutronApiService(WsgiService):
     """Class for neutron-api service."""
 
     @classmethod
-    def create(cls, app_name='neutron'):
+    def create(cls, app_name='neutron', launcher=None):
 
         # Setup logging early, supplying both the CLI options and the
         # configuration mapping from the config file
@@ -84,19 +101,35 @@ class NeutronApiService(WsgiService):
         legacy.modernize_quantum_config(cfg.CONF)
         # Dump the initial option values
         cfg.CONF.log_opt_values(LOG, std_logging.DEBUG)
-        service = cls(app_name)
+        service = cls(app_name, launcher)
         return service
 
+    def start(self):
+        super(NeutronApiService, self).start()
+        if self.wsgi_app:
+            _start_ip_allocation_reaper()
+
+
+def create_process_launcher():
+    """Return the launcher of the API and RPC worker processes.
+
+    A single launcher supervises both kinds of workers, so that the dead
+    ones are restarted and all are stopped on SIGTERM. None is returned
+    when no worker process is configured.
+    """
+    if cfg.CONF.api_workers > 0 or cfg.CONF.rpc_workers > 0:
+        return common_service.ProcessLauncher()
+
 
-def serve_wsgi(cls):
+def serve_wsgi(cls, launcher=None):
 
     try:
         try:
-            service = cls.create()
+            service = cls.create(launcher=launcher)
             service.start()
         except RuntimeError:
             LOG.warn(_('Attempting fallback to old Quantum api-paste config'))
-            service = cls.create('quantum')
+            service = cls.create('quantum', launcher)
             service.start()
     except Exception:
         LOG.exception(_('In serve_wsgi()'))
@@ -105,13 +138,112 @@ def serve_wsgi(cls):
     return service
 
 
-def _run_wsgi(app_name):
+class RpcWorker(object):
+    """Wraps the plugin RPC listener to be handled by ProcessLauncher."""
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+        self._server = None
+        self._stats_reporter = None
+
+    def start(self):
+        # The worker may have just been forked from the parent process: the
+        # database connections it inherited are dropped to open its own
+        db_api.dispose()
+        self._server = self._plugin.start_rpc_listener()
+        interval = cfg.CONF.periodic_interval
+        if interval:
+            self._stats_reporter = loopingcall.FixedIntervalLoopingCall(
+                self.report_stats)
+            self._stats_reporter.start(interval=interval,
+                                       initial_delay=interval)
+
+    def report_stats(self):
+        LOG.info(_("RPC worker %(pid)d dispatched: %(stats)s"),
+                 {'pid': os.getpid(), 'stats': q_rpc.get_dispatch_stats()})
+        LOG.info(_("RPC worker %(pid)d serialized messages: %(stats)s"),
+                 {'pid': os.getpid(),
+                  'stats': rpc_common.get_message_stats()})
+
+    def wait(self):
+        if self._server:
+            self._server.wait()
+
+    def stop(self):
+        if self._stats_reporter:
+            self._stats_reporter.stop()
+            self._stats_reporter = None
+        if self._server:
+            self._server.kill()
+            self._server = None
+        self.report_stats()
+
+
+def serve_rpc(launcher=None):
+    """Start consuming the plugin RPC topics.
+
+    With rpc_workers greater than 0, the topics are consumed by as many
+    forked processes, supervised by launcher if given, and the launcher is
+    returned. Else they are consumed in the server process. NotImplementedError
+    is raised when the plugin starts its RPC listener when initialized.
+    """
+    plugin = manager.NeutronManager.get_plugin()
+    if not plugin.rpc_workers_supported():
+        LOG.debug(_("Active plugin doesn't implement start_rpc_listener"))
+        if cfg.CONF.rpc_workers > 0:
+            LOG.error(_("'rpc_workers = %d' ignored because "
+                        "start_rpc_listener is not implemented."),
+                      cfg.CONF.rpc_workers)
+        raise NotImplementedError()
+
+    try:
+        rpc = RpcWorker(plugin)
+        if cfg.CONF.rpc_workers < 1:
+            rpc.start()
+            return rpc
+        launcher = launcher or common_service.ProcessLauncher()
+        launcher.launch_service(rpc, workers=cfg.CONF.rpc_workers)
+        return launcher
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            LOG.exception(_('Unrecoverable error: please check log '
+                            'for details.'))
+
+
+def start_plugin_periodic_tasks():
+    """Start the periodic tasks of the plugin in the server process.
+
+    To be called once the API and RPC workers are forked.
+    """
+    manager.NeutronManager.get_plugin().start_periodic_tasks()
+
+
+def _reap_expired_ip_allocations(plugin):
+    try:
+        plugin.reap_expired_ip_allocations(context.get_admin_context())
+    except Exception:
+        LOG.exception(_("Failed to reclaim expired IP allocations"))
+
+
+def _start_ip_allocation_reaper():
+    interval = cfg.CONF.ip_allocation_reap_interval
+    plugin = manager.NeutronManager.get_plugin()
+    if interval <= 0 or not hasattr(plugin, 'reap_expired_ip_allocations'):
+        return
+    reaper = loopingcall.FixedIntervalLoopingCall(
+        _reap_expired_ip_allocations, plugin)
+    reaper.start(interval=interval)
+    return reaper
+
+
+def _run_wsgi(app_name, launcher=None):
     app = config.load_paste_app(app_name)
     if not app:
         LOG.error(_('No known API applications configured.'))
         return
     server = wsgi.Server("Neutron")
-    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host)
+    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host,
+                 workers=cfg.CONF.api_workers, launcher=launcher)
     # Dump all option values here after all options are parsed
     cfg.CONF.log_opt_values(LOG, std_logging.DEBUG)
     LOG.info(_("Neutron service started, listening on %(host)s:%(port)s"),
@@ -0,0 +1,153 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import eventlet
+import mock
+from oslo.config import cfg
+
+from neutron import context
+from neutron.plugins.ml2.common import exceptions as ml2_exc
+from neutron.plugins.ml2 import config  # noqa
+from neutron.plugins.ml2 import driver_context
+from neutron.plugins.ml2 import managers
+from neutron.tests import base
+
+
+class MechanismManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(MechanismManagerTestCase, self).setUp()
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('mechanism_drivers', [], 'ml2')
+        self.manager = managers.MechanismManager()
+        self.calls = []
+        self.drivers = [self._driver('driver%d' % i) for i in range(3)]
+        self.manager.ordered_mech_drivers = self.drivers
+
+    def _driver(self, name, sleep=0, fail=False):
+        def postcommit(context):
+            self.calls.append((name, 'start'))
+            eventlet.sleep(sleep)
+            if fail:
+                raise Exception()
+            self.calls.append((name, 'end'))
+        driver = mock.Mock()
+        driver.name = name
+        driver.obj.create_port_postcommit.side_effect = postcommit
+        driver.obj.create_port_precommit.side_effect = postcommit
+        return driver
+
+    def test_sequential_calls_by_default(self):
+        self.manager.create_port_postcommit(mock.Mock())
+        self.assertEqual([('driver0', 'start'), ('driver0', 'end'),
+                          ('driver1', 'start'), ('driver1', 'end'),
+                          ('driver2', 'start'), ('driver2', 'end')],
+                         self.calls)
+
+    def test_concurrent_postcommit(self):
+        cfg.CONF.set_override('mechanism_driver_concurrency', 3, 'ml2')
+        self.drivers[0] = self._driver('driver0', sleep=0.01)
+        self.manager.create_port_postcommit(mock.Mock())
+        self.assertEqual(set(('driver%d' % i, 'start') for i in range(3)),
+                         set(self.calls[:3]))
+        self.assertEqual(('driver0', 'end'), self.calls[-1])
+
+    def test_precommit_stays_sequential(self):
+        cfg.CONF.set_override('mechanism_driver_concurrency', 3, 'ml2')
+        self.manager.create_port_precommit(mock.Mock())
+        self.assertEqual(('driver0', 'end'), self.calls[1])
+
+    def test_concurrent_postcommit_failure_calls_all_drivers(self):
+        cfg.CONF.set_override('mechanism_driver_concurrency', 3, 'ml2')
+        self.drivers[0] = self._driver('driver0', fail=True)
+        self.assertRaises(ml2_exc.MechanismDriverError,
+                          self.manager.create_port_postcommit, mock.Mock())
+        self.assertIn(('driver2', 'end'), self.calls)
+
+    def test_concurrent_postcommit_gets_own_contexts(self):
+        cfg.CONF.set_override('mechanism_driver_concurrency', 3, 'ml2')
+        port_context = mock.Mock()
+        port_context._with_own_session.side_effect = lambda: mock.Mock()
+        self.manager.create_port_postcommit(port_context)
+        contexts = [driver.obj.create_port_postcommit.call_args[0][0]
+                    for driver in self.drivers]
+        self.assertEqual(3, len(set(contexts)))
+        self.assertNotIn(port_context, contexts)
+
+    def test_concurrent_postcommit_timeout(self):
+        cfg.CONF.set_override('mechanism_driver_concurrency', 3, 'ml2')
+        cfg.CONF.set_override('mechanism_driver_timeout', 1, 'ml2')
+        # A timeout which is never started, and expires when raised
+        expired = eventlet.Timeout(None, False)
+        self.drivers[1].obj.create_port_postcommit.side_effect = expired
+        with mock.patch.object(managers.eventlet, 'Timeout',
+                               return_value=expired) as timeout:
+            self.assertRaises(ml2_exc.MechanismDriverError,
+                              self.manager.create_port_postcommit,
+                              mock.Mock())
+        timeout.assert_called_with(1, False)
+        self.assertIn(('driver0', 'end'), self.calls)
+        self.assertIn(('driver2', 'end'), self.calls)
+
+    def test_driver_stats_are_logged_periodically(self):
+        cfg.CONF.set_override('mechanism_driver_stats_interval', 10, 'ml2')
+        self.manager._driver_stats_logged_at = 0
+        with contextlib.nested(
+            mock.patch.object(managers.time, 'time', return_value=5),
+            mock.patch.object(managers.LOG, 'info')
+        ) as (time, log):
+            self.manager.create_port_postcommit(mock.Mock())
+            self.assertFalse(log.called)
+            time.return_value = 10
+            self.manager.create_port_postcommit(mock.Mock())
+            log.assert_called_once_with(mock.ANY,
+                                        self.manager.get_driver_stats())
+            self.manager.create_port_postcommit(mock.Mock())
+            self.assertEqual(1, log.call_count)
+
+    def test_get_driver_stats(self):
+        cfg.CONF.set_override('mechanism_driver_stats_interval', 0, 'ml2')
+        with mock.patch.object(managers.time, 'time',
+                               side_effect=[0, 1, 1, 3, 3, 3,
+                                            3, 5, 5, 5, 5, 9]):
+            self.manager.create_port_postcommit(mock.Mock())
+            self.manager.create_port_postcommit(mock.Mock())
+        stats = self.manager.get_driver_stats()
+        self.assertEqual({'count': 2, 'average': 1.5, 'max': 2},
+                         stats['driver0']['create_port_postcommit'])
+        self.assertEqual({'count': 2, 'average': 2, 'max': 4},
+                         stats['driver2']['create_port_postcommit'])
+
+
+class DriverContextTestCase(base.BaseTestCase):
+
+    def test_port_context_with_own_session(self):
+        plugin_context = context.Context('user', 'tenant')
+        plugin_context._session = mock.sentinel.session
+        port_context = driver_context.PortContext(
+            mock.Mock(), plugin_context, {'network_id': 'net'})
+        network_context = port_context.network()
+
+        copied = port_context._with_own_session()
+        self.assertIsNot(plugin_context, copied._plugin_context)
+        self.assertIsNone(copied._plugin_context._session)
+        self.assertIs(mock.sentinel.session, plugin_context._session)
+        self.assertIsNot(network_context, copied.network())
+        self.assertIs(copied._plugin_context,
+                      copied.network()._plugin_context)
+        self.assertEqual(network_context.current(),
+                         copied.network().current())
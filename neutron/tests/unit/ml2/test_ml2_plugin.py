@@ -13,6 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+import mock
+
+from neutron.common import topics
+from neutron import context
+from neutron import manager
+from neutron.openstack.common import rpc as c_rpc
 from neutron.plugins.ml2 import config as config
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
@@ -37,6 +45,18 @@ class Ml2PluginV2TestCase(test_plugin.NeutronDbPluginV2TestCase):
         self.port_create_status = 'DOWN'
 
 
+class TestMl2RpcListener(Ml2PluginV2TestCase):
+
+    def test_start_rpc_listener(self):
+        plugin = manager.NeutronManager.get_plugin()
+        self.assertTrue(plugin.rpc_workers_supported())
+        with mock.patch.object(c_rpc, 'create_connection') as conn:
+            plugin.start_rpc_listener()
+        conn.return_value.create_consumer.assert_called_once_with(
+            topics.PLUGIN, plugin.dispatcher, fanout=False)
+        conn.return_value.consume_in_thread.assert_called_once_with()
+
+
 class TestMl2BasicGet(test_plugin.TestBasicGet,
                       Ml2PluginV2TestCase):
     pass
@@ -52,6 +72,11 @@ class TestMl2NetworksV2(test_plugin.TestNetworksV2,
     pass
 
 
+class TestMl2CollectionQueryCount(test_plugin.TestCollectionQueryCount,
+                                  Ml2PluginV2TestCase):
+    pass
+
+
 class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
 
     def test_update_port_status_build(self):
@@ -59,6 +84,47 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
             self.assertEqual(port['port']['status'], 'DOWN')
             self.assertEqual(self.port_create_status, 'DOWN')
 
+    def test_get_devices_details_list(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as (p1, p2):
+                port_id1 = p1['port']['id']
+                port_id2 = p2['port']['id']
+                devices = ['tap' + port_id1[:11], port_id2, 'tapunknown']
+                details = plugin.callbacks.get_devices_details_list(
+                    ctx, devices=devices, agent_id='fake_agent_id')
+                self.assertEqual(devices, [d['device'] for d in details])
+                self.assertEqual(port_id1, details[0]['port_id'])
+                self.assertEqual(port_id2, details[1]['port_id'])
+                self.assertEqual('local', details[0]['network_type'])
+                self.assertNotIn('port_id', details[2])
+                port = plugin.get_port(ctx, port_id1)
+                self.assertEqual('ACTIVE', port['status'])
+
+    def test_update_devices_status(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as (p1, p2):
+                port_ids = [p1['port']['id'], p2['port']['id']]
+                devices = ['tap' + port_ids[0][:11], port_ids[1],
+                           'tapunknown']
+                for device in devices[:2]:
+                    plugin.callbacks.update_device_up(
+                        ctx, device=device, agent_id='fake_agent_id')
+                entries = plugin.callbacks.update_devices_down(
+                    ctx, devices=devices[:1] + devices[2:],
+                    agent_id='fake_agent_id')
+                self.assertEqual([{'device': devices[0], 'exists': True},
+                                  {'device': devices[2], 'exists': False}],
+                                 entries)
+                self.assertEqual('DOWN',
+                                 plugin.get_port(ctx, port_ids[0])['status'])
+                self.assertEqual('ACTIVE',
+                                 plugin.get_port(ctx, port_ids[1])['status'])
 
 # TODO(rkukura) add TestMl2PortBinding
 
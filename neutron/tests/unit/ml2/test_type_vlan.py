@@ -0,0 +1,101 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import sqlalchemy as sa
+
+import neutron.db.api as db
+from neutron.plugins.ml2 import db as ml2_db
+from neutron.plugins.ml2.drivers import helpers
+from neutron.plugins.ml2.drivers import type_vlan
+from neutron.tests import base
+
+PHYS_NET = 'physnet1'
+PHYS_NET_2 = 'physnet2'
+VLAN_MIN = 10
+VLAN_MAX = 29
+NETWORK_VLAN_RANGES = {PHYS_NET: [(VLAN_MIN, VLAN_MAX)],
+                       PHYS_NET_2: [(VLAN_MIN, VLAN_MIN + 4),
+                                    (VLAN_MIN + 2, VLAN_MIN + 6)]}
+UPDATED_VLAN_RANGES = {PHYS_NET: [(VLAN_MIN + 5, VLAN_MAX + 5)]}
+
+
+class VlanTypeTest(base.BaseTestCase):
+
+    def setUp(self):
+        super(VlanTypeTest, self).setUp()
+        ml2_db.initialize()
+        self.addCleanup(db.clear_db)
+        # Use small chunks to exercise the ranges crossing chunks
+        chunk_size = mock.patch.object(helpers, 'SYNC_CHUNK_SIZE', new=8)
+        chunk_size.start()
+        self.addCleanup(chunk_size.stop)
+        self.driver = type_vlan.VlanTypeDriver()
+        self.driver.network_vlan_ranges = NETWORK_VLAN_RANGES
+        self.driver._sync_vlan_allocations()
+        self.session = db.get_session()
+
+    def _get_allocations(self, physical_network):
+        allocs = (self.session.query(type_vlan.VlanAllocation).
+                  filter_by(physical_network=physical_network))
+        return dict((alloc.vlan_id, alloc.allocated) for alloc in allocs)
+
+    def test_sync_vlan_allocations(self):
+        self.assertEqual(
+            dict((vlan_id, False)
+                 for vlan_id in xrange(VLAN_MIN, VLAN_MAX + 1)),
+            self._get_allocations(PHYS_NET))
+        self.assertEqual(
+            dict((vlan_id, False)
+                 for vlan_id in xrange(VLAN_MIN, VLAN_MIN + 7)),
+            self._get_allocations(PHYS_NET_2))
+
+    def test_sync_vlan_allocations_updated_ranges(self):
+        with self.session.begin(subtransactions=True):
+            for vlan_id in (VLAN_MIN, VLAN_MIN + 20):
+                alloc = (self.session.query(type_vlan.VlanAllocation).
+                         filter_by(physical_network=PHYS_NET,
+                                   vlan_id=vlan_id).first())
+                if alloc:
+                    alloc.allocated = True
+                else:
+                    self.session.add(type_vlan.VlanAllocation(
+                        physical_network=PHYS_NET, vlan_id=vlan_id,
+                        allocated=True))
+            self.session.add(type_vlan.VlanAllocation(
+                physical_network=PHYS_NET_2, vlan_id=VLAN_MAX,
+                allocated=True))
+
+        self.driver.network_vlan_ranges = UPDATED_VLAN_RANGES
+        self.driver._sync_vlan_allocations()
+        self.session.expire_all()
+
+        expected = dict((vlan_id, False)
+                        for vlan_id in xrange(VLAN_MIN + 5, VLAN_MAX + 6))
+        # allocated vlans are kept, inside or outside of the ranges
+        expected[VLAN_MIN] = True
+        expected[VLAN_MIN + 20] = True
+        self.assertEqual(expected, self._get_allocations(PHYS_NET))
+        self.assertEqual({VLAN_MAX: True}, self._get_allocations(PHYS_NET_2))
+
+    def test_sync_vlan_allocations_is_idempotent(self):
+        with mock.patch.object(self.session, 'execute',
+                               wraps=self.session.execute) as execute:
+            with mock.patch.object(type_vlan.db_api, 'get_session',
+                                   return_value=self.session):
+                self.driver._sync_vlan_allocations()
+        inserts = [call for call in execute.call_args_list
+                   if isinstance(call[0][0], sa.sql.expression.Insert)]
+        self.assertEqual([], inserts)
@@ -411,12 +411,22 @@ class FakeClient:
                 parent_func = lambda x: True
 
             items = [_build_item(res_dict[res_uuid])
-                     for res_uuid in res_dict
+                     for res_uuid in sorted(res_dict)
                      if (parent_func(res_uuid) and
                          _tag_match(res_uuid) and
                          _attr_match(res_uuid))]
-            return json.dumps({'results': items,
-                               'result_count': len(items)})
+            response = {'result_count': len(items)}
+            params = urlparse.parse_qs(query or '')
+            if '_page_cursor' in params:
+                items = [item for item in items
+                         if item['uuid'] > params['_page_cursor'][0]]
+            if '_page_length' in params:
+                page_length = int(params['_page_length'][0])
+                if len(items) > page_length:
+                    items = items[:page_length]
+                    response['page_cursor'] = items[-1]['uuid']
+            response['results'] = items
+            return json.dumps(response)
 
     def _show(self, resource_type, response_file,
               uuid1, uuid2=None, relations=None):
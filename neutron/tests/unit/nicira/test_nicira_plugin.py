@@ -839,6 +839,9 @@ class NiciraExtGwModeTestCase(test_ext_gw_mode.ExtGwModeTestCase,
 class NiciraNeutronNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
                                 NiciraPluginV2TestCase):
 
+    def _synchronize_state(self):
+        manager.NeutronManager.get_plugin()._synchronizer.synchronize_state()
+
     def test_delete_network_not_in_nvp(self):
         res = self._create_network('json', 'net1', True)
         net1 = self.deserialize('json', res)
@@ -851,6 +854,7 @@ class NiciraNeutronNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         res = self._create_network('json', 'net1', True)
         self.deserialize('json', res)
         self.fc._fake_lswitch_dict.clear()
+        self._synchronize_state()
         req = self.new_list_request('networks')
         nets = self.deserialize('json', req.get_response(self.api))
         self.assertEqual(nets['networks'][0]['status'],
@@ -860,11 +864,21 @@ class NiciraNeutronNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         res = self._create_network('json', 'net1', True)
         net = self.deserialize('json', res)
         self.fc._fake_lswitch_dict.clear()
-        req = self.new_show_request('networks', net['network']['id'])
+        req = self._req('GET', 'networks', id=net['network']['id'],
+                        params='fields=status')
         net = self.deserialize('json', req.get_response(self.api))
         self.assertEqual(net['network']['status'],
                          constants.NET_STATUS_ERROR)
 
+    def test_show_network_not_in_nvp_status_from_db(self):
+        res = self._create_network('json', 'net1', True)
+        net = self.deserialize('json', res)
+        self.fc._fake_lswitch_dict.clear()
+        req = self.new_show_request('networks', net['network']['id'])
+        net = self.deserialize('json', req.get_response(self.api))
+        self.assertEqual(net['network']['status'],
+                         constants.NET_STATUS_ACTIVE)
+
     def test_delete_port_not_in_nvp(self):
         res = self._create_network('json', 'net1', True)
         net1 = self.deserialize('json', res)
@@ -881,6 +895,7 @@ class NiciraNeutronNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         res = self._create_port('json', net1['network']['id'])
         self.deserialize('json', res)
         self.fc._fake_lswitch_lport_dict.clear()
+        self._synchronize_state()
         req = self.new_list_request('ports')
         nets = self.deserialize('json', req.get_response(self.api))
         self.assertEqual(nets['ports'][0]['status'],
@@ -893,6 +908,7 @@ class NiciraNeutronNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         port = self.deserialize('json', res)
         self.fc._fake_lswitch_lport_dict.clear()
         self.fc._fake_lswitch_lportstatus_dict.clear()
+        cfg.CONF.set_override('always_read_status', True, 'NVP_SYNC')
         req = self.new_show_request('ports', port['port']['id'])
         net = self.deserialize('json', req.get_response(self.api))
         self.assertEqual(net['port']['status'],
@@ -944,6 +960,7 @@ class NiciraNeutronNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         res = self._create_router('json', 'tenant')
         self.deserialize('json', res)
         self.fc._fake_lrouter_dict.clear()
+        self._synchronize_state()
         req = self.new_list_request('routers')
         routers = self.deserialize('json', req.get_response(self.ext_api))
         self.assertEqual(routers['routers'][0]['status'],
@@ -953,6 +970,7 @@ class NiciraNeutronNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
         res = self._create_router('json', 'tenant')
         router = self.deserialize('json', res)
         self.fc._fake_lrouter_dict.clear()
+        cfg.CONF.set_override('always_read_status', True, 'NVP_SYNC')
         req = self.new_show_request('routers', router['router']['id'])
         router = self.deserialize('json', req.get_response(self.ext_api))
         self.assertEqual(router['router']['status'],
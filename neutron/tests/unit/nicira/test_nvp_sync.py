@@ -0,0 +1,127 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+from oslo.config import cfg
+
+from neutron.common import constants
+from neutron import context
+from neutron.db import models_v2
+from neutron import manager
+from neutron.plugins.nicira.common import sync
+from neutron.plugins.nicira import nvplib
+from neutron.tests.unit.nicira import test_nicira_plugin
+
+
+class NvpSyncTestCase(test_nicira_plugin.NiciraPluginV2TestCase):
+
+    def setUp(self):
+        super(NvpSyncTestCase, self).setUp()
+        cfg.CONF.set_override('chunk_size', 1, 'NVP_SYNC')
+        cfg.CONF.set_override('min_sync_req_delay', 0, 'NVP_SYNC')
+        self.synchronizer = manager.NeutronManager.get_plugin()._synchronizer
+        self.context = context.get_admin_context()
+
+    def _set_network_status(self, network_id, status):
+        with self.context.session.begin():
+            network = self.context.session.query(models_v2.Network).get(
+                network_id)
+            network.status = status
+
+    def _get_statuses(self, resources):
+        req = self.new_list_request(resources)
+        res = self.deserialize(self.fmt, req.get_response(self.api))
+        return [resource['status'] for resource in res[resources]]
+
+    def test_list_does_not_query_nvp(self):
+        with self.port():
+            with mock.patch.object(nvplib, 'do_request') as do_request:
+                self._get_statuses('networks')
+                self._get_statuses('ports')
+        self.assertFalse(do_request.called)
+
+    def test_synchronize_state_in_chunks(self):
+        with contextlib.nested(self.network(), self.network()) as nets:
+            for net in nets:
+                self._set_network_status(net['network']['id'],
+                                         constants.NET_STATUS_DOWN)
+            with mock.patch.object(nvplib, 'get_single_query_page',
+                                   wraps=nvplib.get_single_query_page) as get:
+                self.synchronizer.synchronize_state()
+            lswitch_pages = [call for call in get.call_args_list
+                             if call[0][0] == self.synchronizer.LSWITCH_URI]
+            self.assertEqual(2, len(lswitch_pages))
+            self.assertEqual([constants.NET_STATUS_ACTIVE] * 2,
+                             self._get_statuses('networks'))
+
+    def test_synchronize_port_status(self):
+        with self.port():
+            self.synchronizer.synchronize_state()
+            # The fabric status of the fake logical ports is down
+            self.assertEqual([constants.PORT_STATUS_DOWN],
+                             self._get_statuses('ports'))
+
+    def test_network_down_if_any_lswitch_down(self):
+        with self.network() as net:
+            net_id = net['network']['id']
+            down = {'uuid': net_id, 'tags': [],
+                    '_relations': {'LogicalSwitchStatus':
+                                   {'fabric_status': False}}}
+            up = {'uuid': 'extended', 'tags': [{'scope': 'quantum_net_id',
+                                                'tag': net_id}],
+                  '_relations': {'LogicalSwitchStatus':
+                                 {'fabric_status': True}}}
+            with mock.patch.object(nvplib, 'get_single_query_page',
+                                   side_effect=[([down], 'cursor'),
+                                                ([up], None)]):
+                self.synchronizer._synchronize_networks(self.context)
+            self.assertEqual([constants.NET_STATUS_DOWN],
+                             self._get_statuses('networks'))
+
+    def test_external_network_not_put_in_error(self):
+        with self.network() as net:
+            with mock.patch.object(
+                    self.synchronizer, '_get_external_network_ids',
+                    return_value=set([net['network']['id']])):
+                self.fc._fake_lswitch_dict.clear()
+                self.synchronizer.synchronize_state()
+            self.assertEqual([constants.NET_STATUS_ACTIVE],
+                             self._get_statuses('networks'))
+
+    def test_start_disabled(self):
+        cfg.CONF.set_override('state_sync_interval', 0, 'NVP_SYNC')
+        with mock.patch.object(sync.loopingcall,
+                               'FixedIntervalLoopingCall') as loop:
+            self.synchronizer.start()
+        self.assertFalse(loop.called)
+
+    def test_start(self):
+        cfg.CONF.set_override('state_sync_interval', 30, 'NVP_SYNC')
+        with mock.patch.object(sync.loopingcall,
+                               'FixedIntervalLoopingCall') as loop:
+            self.synchronizer.start()
+        loop.assert_called_once_with(self.synchronizer.synchronize_state)
+        loop.return_value.start.assert_called_once_with(interval=30,
+                                                        initial_delay=30)
+
+    def test_started_with_plugin_periodic_tasks(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with mock.patch.object(self.synchronizer, 'start') as start:
+            plugin.start_periodic_tasks()
+        start.assert_called_once_with()
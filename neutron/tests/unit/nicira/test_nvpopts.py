@@ -118,6 +118,10 @@ class ConfigurationTest(testtools.TestCase):
         self.assertEqual(5, cfg.CONF.NVP.concurrent_connections)
         self.assertEqual('access_network', cfg.CONF.NVP.metadata_mode)
         self.assertEqual('stt', cfg.CONF.NVP.default_transport_type)
+        self.assertEqual(120, cfg.CONF.NVP_SYNC.state_sync_interval)
+        self.assertEqual(500, cfg.CONF.NVP_SYNC.chunk_size)
+        self.assertEqual(1, cfg.CONF.NVP_SYNC.min_sync_req_delay)
+        self.assertFalse(cfg.CONF.NVP_SYNC.always_read_status)
 
         self.assertIsNone(cfg.CONF.default_tz_uuid)
         self.assertIsNone(cfg.CONF.nvp_cluster_uuid)
@@ -95,30 +95,37 @@ class OVS_Lib_Test(base.BaseTestCase):
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=2,dl_src=ca:fe:de:ad:be:ef"
                        ",actions=strip_vlan,output:0"],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=1,actions=normal"],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=2,actions=drop"],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=2,in_port=%s,actions=drop" % ofport],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=4,in_port=%s,dl_vlan=%s,"
                        "actions=strip_vlan,set_tunnel:%s,normal"
                        % (ofport, vid, lsw_id)],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=3,tun_id=%s,actions="
                        "mod_vlan_vid:%s,output:%s"
-                       % (lsw_id, vid, ofport)], root_helper=self.root_helper)
+                       % (lsw_id, vid, ofport)],
+                      root_helper=self.root_helper,
+                      process_input=None)
         self.mox.ReplayAll()
 
         self.br.add_flow(priority=2, dl_src="ca:fe:de:ad:be:ef",
@@ -158,8 +165,9 @@ class OVS_Lib_Test(base.BaseTestCase):
 
     def test_count_flows(self):
         utils.execute(["ovs-ofctl", "dump-flows", self.BR_NAME],
-                      root_helper=self.root_helper).AndReturn('ignore'
-                                                              '\nflow-1\n')
+                      root_helper=self.root_helper,
+                      process_input=None).AndReturn('ignore'
+                                                    '\nflow-1\n')
         self.mox.ReplayAll()
 
         # counts the number of flows as total lines of output - 2
@@ -171,11 +179,14 @@ class OVS_Lib_Test(base.BaseTestCase):
         lsw_id = 40
         vid = 39
         utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME,
-                       "in_port=" + ofport], root_helper=self.root_helper)
+                       "in_port=" + ofport],
+                      root_helper=self.root_helper, process_input=None)
         utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME,
-                       "tun_id=%s" % lsw_id], root_helper=self.root_helper)
+                       "tun_id=%s" % lsw_id],
+                      root_helper=self.root_helper, process_input=None)
         utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME,
-                       "dl_vlan=%s" % vid], root_helper=self.root_helper)
+                       "dl_vlan=%s" % vid],
+                      root_helper=self.root_helper, process_input=None)
         self.mox.ReplayAll()
 
         self.br.delete_flows(in_port=ofport)
@@ -183,6 +194,72 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.br.delete_flows(dl_vlan=vid)
         self.mox.VerifyAll()
 
+    def test_mod_flow(self):
+        utils.execute(["ovs-ofctl", "mod-flows", self.BR_NAME,
+                       "hard_timeout=0,idle_timeout=0,"
+                       "priority=1,in_port=1,actions=drop"],
+                      root_helper=self.root_helper, process_input=None)
+        self.mox.ReplayAll()
+
+        self.br.mod_flow(priority=1, in_port=1, actions="drop")
+        self.mox.VerifyAll()
+
+    def test_defer_apply_flows(self):
+        add_flow_1 = "hard_timeout=0,idle_timeout=0,priority=1,actions=normal"
+        add_flow_2 = ("hard_timeout=0,idle_timeout=0,priority=2,"
+                      "in_port=1,actions=drop")
+        add_flow_3 = ("hard_timeout=0,idle_timeout=0,priority=3,"
+                      "tun_id=2,actions=normal")
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="%s\n%s\n" % (add_flow_1, add_flow_2))
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="in_port=1\ndl_vlan=3\n")
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="%s\n" % add_flow_3)
+        self.mox.ReplayAll()
+
+        with self.br.deferred_apply():
+            self.br.add_flow(priority=1, actions="normal")
+            self.br.add_flow(priority=2, in_port=1, actions="drop")
+            self.br.delete_flows(in_port=1)
+            self.br.delete_flows(dl_vlan=3)
+            self.br.add_flow(priority=3, tun_id=2, actions="normal")
+        self.assertFalse(self.br.defer_apply_flows)
+        self.assertEqual(self.br.deferred_flows, [])
+        self.mox.VerifyAll()
+
+    def test_defer_apply_delete_all_flows_discards_pending_flows(self):
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, ""],
+                      root_helper=self.root_helper, process_input=None)
+        self.mox.ReplayAll()
+
+        self.br.defer_apply_on()
+        self.br.add_flow(priority=1, actions="normal")
+        self.br.delete_flows()
+        self.br.defer_apply_off()
+        self.mox.VerifyAll()
+
+    def test_defer_apply_flows_failure(self):
+        add_flow = "hard_timeout=0,idle_timeout=0,priority=1,actions=normal"
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="%s\n" % add_flow).AndRaise(
+                          RuntimeError())
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="in_port=1\n")
+        self.mox.ReplayAll()
+
+        self.br.defer_apply_on()
+        self.br.add_flow(priority=1, actions="normal")
+        self.br.delete_flows(in_port=1)
+        self.assertFalse(self.br.defer_apply_off())
+        self.assertEqual(self.br.deferred_flows, [])
+        self.mox.VerifyAll()
+
     def test_add_tunnel_port(self):
         pname = "tap99"
         local_ip = "1.1.1.1"
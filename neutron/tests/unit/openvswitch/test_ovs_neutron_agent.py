@@ -148,8 +148,80 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         actual = self.mock_update_ports(vif_port_set, registered_ports)
         self.assertEqual(expected, actual)
 
+    def _mock_update_ports_from_events(self, registered_ports, added=(),
+                                       removed=(), port_names=None,
+                                       int_br_ports=()):
+        if port_names is None:
+            # The monitor sees the registered and added ports
+            port_names = dict((port_id, 'tap-%s' % port_id) for port_id in
+                              registered_ports | set(added))
+        events = {'added': set(added), 'removed': set(removed),
+                  'port_names': port_names}
+        with mock.patch.object(self.agent.int_br, 'get_port_name_list',
+                               return_value=list(int_br_ports)) as get_names:
+            result = self.agent.update_ports_from_events(registered_ports,
+                                                         events)
+        return result, get_names
+
+    def test_update_ports_from_events_returns_none_without_changes(self):
+        result, get_names = self._mock_update_ports_from_events(
+            set(['port1']), added=['port1'], removed=['port2'])
+        self.assertIsNone(result)
+        self.assertFalse(get_names.called)
+
+    def test_update_ports_from_events_filters_other_bridges(self):
+        result, get_names = self._mock_update_ports_from_events(
+            set(['port1']), added=['port2', 'port3'],
+            port_names={'port1': 'tap1', 'port2': 'tap2', 'port3': 'qg-3'},
+            int_br_ports=['tap1', 'tap2'])
+        expected = dict(current=set(['port1', 'port2']),
+                        added=set(['port2']), removed=set())
+        self.assertEqual(expected, result)
+        self.assertTrue(get_names.called)
+
+    def test_update_ports_from_events_removes_without_vsctl(self):
+        result, get_names = self._mock_update_ports_from_events(
+            set(['port1', 'port2']), removed=['port2'],
+            port_names={'port1': 'tap1'})
+        expected = dict(current=set(['port1']),
+                        added=set(), removed=set(['port2']))
+        self.assertEqual(expected, result)
+        self.assertFalse(get_names.called)
+
+    def test_update_ports_from_events_vif_deleted_after_full_poll(self):
+        # The monitor never reported port2, deleted after the full poll
+        # which registered it
+        result, get_names = self._mock_update_ports_from_events(
+            set(['port1', 'port2']), added=['port1'],
+            port_names={'port1': 'tap1'})
+        expected = dict(current=set(['port1']),
+                        added=set(), removed=set(['port2']))
+        self.assertEqual(expected, result)
+        self.assertFalse(get_names.called)
+
+    def test_rpc_loop_uses_events_when_polling_not_required(self):
+        pm = mock.Mock()
+        pm.is_polling_required = False
+        pm.get_events.return_value = {'added': set(['port1']),
+                                      'removed': set(), 'port_names': {}}
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'update_ports'),
+            mock.patch.object(self.agent, 'update_ports_from_events',
+                              return_value=None),
+            mock.patch.object(ovs_neutron_agent.time, 'sleep',
+                              side_effect=SystemExit())
+        ) as (update_ports, update_from_events, sleep):
+            self.assertRaises(SystemExit, self.agent.rpc_loop,
+                              polling_manager=pm)
+        pm.force_polling.assert_called_once_with()
+        self.assertFalse(update_ports.called)
+        update_from_events.assert_called_once_with(
+            set(), pm.get_events.return_value)
+        pm.polling_completed.assert_called_once_with()
+
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_added([{}]))
 
@@ -162,8 +234,9 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         :returns: whether the named function was called
         """
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
             mock.patch.object(self.agent, func_name)
@@ -191,16 +264,18 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                                                        'treat_vif_port'))
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
-            self.assertTrue(self.agent.treat_devices_removed([{}]))
+            self.assertTrue(self.agent.treat_devices_removed(['tap0']))
 
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = dict(device='tap0', exists=port_exists)
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
+                               return_value=[details]) as update_down:
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
-                self.assertFalse(self.agent.treat_devices_removed([{}]))
+                self.assertFalse(self.agent.treat_devices_removed(['tap0']))
+        update_down.assert_called_once_with(self.agent.context, ['tap0'],
+                                            self.agent.agent_id)
         self.assertEqual(port_unbound.called, not port_exists)
 
     def test_treat_devices_removed_unbinds_port(self):
@@ -221,6 +296,33 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                 self.assertTrue(device_added.called)
                 self.assertTrue(device_removed.called)
 
+    def test_process_network_ports_defers_flows(self):
+        def check_deferred(devices):
+            self.assertTrue(self.agent.int_br.defer_apply_on.called)
+            self.assertFalse(self.agent.int_br.defer_apply_off.called)
+            return False
+
+        self.agent.enable_tunneling = True
+        reply = {'current': set(['tap0']),
+                 'added': set(['tap0'])}
+        with mock.patch.object(self.agent, 'treat_devices_added',
+                               side_effect=check_deferred):
+            self.assertFalse(self.agent.process_network_ports(reply))
+        self.agent.int_br.defer_apply_off.assert_called_once_with()
+        self.agent.tun_br.defer_apply_on.assert_called_once_with()
+        self.agent.tun_br.defer_apply_off.assert_called_once_with()
+
+    def test_process_network_ports_deferred_flows_failure(self):
+        self.agent.enable_tunneling = True
+        self.agent.int_br.defer_apply_off.return_value = False
+        reply = {'current': set(['tap0']),
+                 'added': set(['tap0'])}
+        with mock.patch.object(self.agent, 'treat_devices_added',
+                               return_value=False):
+            self.assertTrue(self.agent.process_network_ports(reply))
+        # The flows of the other bridges are still applied
+        self.agent.tun_br.defer_apply_off.assert_called_once_with()
+
     def test_report_state(self):
         with contextlib.nested(
             mock.patch.object(self.agent.int_br, "get_vif_port_set"),
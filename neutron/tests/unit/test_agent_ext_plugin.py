@@ -18,6 +18,7 @@
 import copy
 import time
 
+import mock
 from oslo.config import cfg
 from webob import exc
 
@@ -29,6 +30,7 @@ from neutron import context
 from neutron.db import agents_db
 from neutron.db import db_base_plugin_v2
 from neutron.extensions import agent
+from neutron import manager
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
@@ -183,6 +185,10 @@ class AgentDBTestCase(AgentDBTestMixIn,
         test_config['extension_manager'] = ext_mgr
         self.addCleanup(self.restore_resource_attribute_map)
         self.addCleanup(cfg.CONF.reset)
+        heartbeats = mock.patch.object(agents_db, '_heartbeats',
+                                       new=agents_db.AgentHeartbeats())
+        heartbeats.start()
+        self.addCleanup(heartbeats.stop)
         super(AgentDBTestCase, self).setUp()
 
     def restore_resource_attribute_map(self):
@@ -241,6 +247,73 @@ class AgentDBTestCase(AgentDBTestMixIn,
             query_string='binary=neutron-l3-agent&host=' + L3_HOSTB)
         self.assertFalse(agents['agents'][0]['alive'])
 
+    def _report_state(self, agent_state):
+        callback = agents_db.AgentExtRpcCallback()
+        callback.report_state(self.adminContext,
+                              agent_state={'agent_state': agent_state},
+                              time=timeutils.strtime())
+
+    def _get_agent_db(self, agent_type, host):
+        plugin = manager.NeutronManager.get_plugin()
+        agent_db = plugin._get_agent_by_type_and_host(
+            self.adminContext, agent_type, host)
+        self.adminContext.session.refresh(agent_db)
+        return agent_db
+
+    def test_unchanged_report_is_not_written(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        agents = self._register_agent_states()
+        plugin = manager.NeutronManager.get_plugin()
+        with mock.patch.object(plugin, '_write_agent') as write_agent:
+            self._report_state(agents[0])
+        self.assertFalse(write_agent.called)
+        agent_db = self._get_agent_db(constants.AGENT_TYPE_L3, L3_HOSTA)
+        self.assertTrue(agents_db.get_heartbeat_timestamp(agent_db) >
+                        agent_db.heartbeat_timestamp)
+
+    def test_changed_report_is_written(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        agents = self._register_agent_states()
+        agents[0]['configurations']['router_id'] = 'router_id'
+        self._report_state(agents[0])
+        agents[1]['start_flag'] = True
+        self._report_state(agents[1])
+        plugin = manager.NeutronManager.get_plugin()
+        agent_db = self._get_agent_db(constants.AGENT_TYPE_L3, L3_HOSTA)
+        self.assertEqual(
+            'router_id',
+            plugin.get_configuration_dict(agent_db)['router_id'])
+        agent_db = self._get_agent_db(constants.AGENT_TYPE_L3, L3_HOSTB)
+        self.assertEqual(agent_db.started_at, agent_db.heartbeat_timestamp)
+
+    def test_heartbeats_are_flushed(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        agents = self._register_agent_states()
+        for agent_state in agents:
+            self._report_state(agent_state)
+        session = self.adminContext.session
+        with mock.patch.object(session, 'execute',
+                               wraps=session.execute) as execute:
+            agents_db._heartbeats.flush(session)
+        self.assertEqual(1, execute.call_count)
+        agent_db = self._get_agent_db(constants.AGENT_TYPE_L3, L3_HOSTA)
+        self.assertEqual(agent_db.heartbeat_timestamp,
+                         agents_db.get_heartbeat_timestamp(agent_db))
+
+    def test_deleted_agent_is_created_again(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 60)
+        agents = self._register_agent_states()
+        self._report_state(agents[0])
+        session = self.adminContext.session
+        with session.begin():
+            session.query(agents_db.Agent).filter_by(
+                host=L3_HOSTA, agent_type=constants.AGENT_TYPE_L3).delete()
+        manager.NeutronManager.get_plugin()._flush_heartbeats(
+            self.adminContext)
+        self._report_state(agents[0])
+        res = self._list_agents(query_string='host=' + L3_HOSTA)
+        self.assertEqual(2, len(res['agents']))
+
 
 class AgentDBTestCaseXML(AgentDBTestCase):
     fmt = 'xml'
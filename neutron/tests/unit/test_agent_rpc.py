@@ -16,6 +16,7 @@
 #    under the License.
 
 import mock
+from oslo.config import cfg
 
 from neutron.agent import rpc
 from neutron.openstack.common import context
@@ -39,9 +40,42 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_get_device_details(self):
         self._test_rpc_call('get_device_details')
 
+    def test_get_devices_details_list(self):
+        cfg.CONF.set_override('devices_details_batch_size', 2, 'AGENT')
+        self.addCleanup(cfg.CONF.reset)
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(agent, 'call') as rpc_call:
+            rpc_call.side_effect = lambda ctxt, msg, **kwargs: [
+                {'device': device} for device in msg['args']['devices']]
+            details = agent.get_devices_details_list(
+                ctxt, ['dev1', 'dev2', 'dev3'], 'fake_agent_id')
+        self.assertEqual([{'device': 'dev1'}, {'device': 'dev2'},
+                          {'device': 'dev3'}], details)
+        self.assertEqual(2, rpc_call.call_count)
+        msgs = [call[0][1] for call in rpc_call.call_args_list]
+        self.assertEqual([['dev1', 'dev2'], ['dev3']],
+                         [msg['args']['devices'] for msg in msgs])
+        for call in rpc_call.call_args_list:
+            self.assertEqual('1.2', call[1]['version'])
+
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
+    def test_update_devices_down(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        expect_val = [{'device': 'dev1', 'exists': True}]
+        with mock.patch.object(agent, 'call',
+                               return_value=expect_val) as rpc_call:
+            actual_val = agent.update_devices_down(ctxt, ['dev1'],
+                                                   'fake_agent_id')
+        self.assertEqual(expect_val, actual_val)
+        msg = rpc_call.call_args[0][1]
+        self.assertEqual('update_devices_down', msg['method'])
+        self.assertEqual(['dev1'], msg['args']['devices'])
+        self.assertEqual('1.3', rpc_call.call_args[1]['version'])
+
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
@@ -23,6 +23,7 @@ import random
 
 import mock
 from oslo.config import cfg
+import sqlalchemy as sa
 from testtools import matchers
 import webob.exc
 
@@ -38,8 +39,10 @@ from neutron.common.test_lib import test_config
 from neutron import context
 from neutron.db import api as db
 from neutron.db import db_base_plugin_v2
+from neutron.db import ipam_backend
 from neutron.db import models_v2
 from neutron.manager import NeutronManager
+from neutron.openstack.common.db.sqlalchemy import session as db_session
 from neutron.openstack.common import timeutils
 from neutron.tests import base
 from neutron.tests.unit import test_extensions
@@ -477,6 +480,24 @@ class NeutronDbPluginV2TestCase(testlib_api.WebTestCase):
         self.assertEqual(res.status_int, webob.exc.HTTPOk.code)
         return self.deserialize(fmt, res)
 
+    def _list_with_queries(self, resource, query_params=None):
+        """List resources, returning them with the SQL statements run."""
+        statements = []
+        counting = [True]
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            # Listeners can not be removed from the engine
+            if counting[0]:
+                statements.append(statement)
+
+        sa.event.listen(db_session.get_engine(), 'before_cursor_execute',
+                        before_cursor_execute)
+        try:
+            res = self._list(resource, query_params=query_params)
+        finally:
+            counting[0] = False
+        return res, statements
+
     def _do_side_effect(self, patched_plugin, orig, *args, **kwargs):
         """Invoked by test cases for injecting failures in plugin."""
         def second_call(*args, **kwargs):
@@ -1570,6 +1591,8 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
         # set expirations to past so that recycling is checked
         reference = datetime.datetime(2012, 8, 13, 23, 11, 0)
         cfg.CONF.set_override('dhcp_lease_duration', 0)
+        # recycle expired allocations when ports are created
+        cfg.CONF.set_override('ip_allocation_reap_interval', 0)
 
         with self.subnet(cidr='10.0.1.0/24') as subnet:
             with self.port(subnet=subnet) as port:
@@ -1769,6 +1792,45 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                     self.assertEqual(update_context._recycled_networks,
                                      set([subnet['subnet']['network_id']]))
 
+    def test_reap_expired_ip_allocations(self):
+        plugin = NeutronManager.get_plugin()
+        with self.subnet() as subnet:
+            with contextlib.nested(self.port(subnet=subnet),
+                                   self.port(subnet=subnet)) as (p1, p2):
+                ctx = context.get_admin_context()
+                expired_ip = p1['port']['fixed_ips'][0]['ip_address']
+                held_ip = p2['port']['fixed_ips'][0]['ip_address']
+                qry = ctx.session.query(models_v2.IPAllocation)
+                with ctx.session.begin(subtransactions=True):
+                    for fixed_ip in qry:
+                        fixed_ip.port_id = None
+                        if fixed_ip.ip_address == expired_ip:
+                            fixed_ip.expiration = (
+                                timeutils.utcnow() -
+                                datetime.timedelta(seconds=1))
+
+                self.assertEqual(1, plugin.reap_expired_ip_allocations(ctx))
+                self.assertEqual([held_ip],
+                                 [fixed_ip.ip_address for fixed_ip in qry])
+                range_qry = ctx.session.query(models_v2.IPAvailabilityRange)
+                self.assertIn(expired_ip,
+                              [r['first_ip'] for r in range_qry])
+
+    def test_create_port_recycles_only_without_reaper(self):
+        plugin = NeutronManager.get_plugin()
+        with self.network() as net:
+            with mock.patch.object(plugin,
+                                   '_recycle_expired_ip_allocations') as rc:
+                res = self._create_port(self.fmt, net['network']['id'])
+                port = self.deserialize(self.fmt, res)
+                self._delete('ports', port['port']['id'])
+                self.assertFalse(rc.called)
+                cfg.CONF.set_override('ip_allocation_reap_interval', 0)
+                res = self._create_port(self.fmt, net['network']['id'])
+                port = self.deserialize(self.fmt, res)
+                self._delete('ports', port['port']['id'])
+                self.assertEqual(1, rc.call_count)
+
     def test_max_fixed_ips_exceeded(self):
         with self.subnet(gateway_ip='10.0.0.3',
                          cidr='10.0.0.0/24') as subnet:
@@ -3532,6 +3594,182 @@ class TestSubnetsV2(NeutronDbPluginV2TestCase):
         self.assertEqual(res.status_int, 204)
 
 
+class TestIpAvailabilityRangeBackend(NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestIpAvailabilityRangeBackend, self).setUp()
+        self.backend = ipam_backend.IpAvailabilityRangeBackend()
+        self.ctx = context.get_admin_context()
+
+    def _get_ranges(self, subnet_id):
+        range_qry = self.ctx.session.query(
+            models_v2.IPAvailabilityRange).join(models_v2.IPAllocationPool)
+        return sorted((r['first_ip'], r['last_ip'])
+                      for r in range_qry.filter_by(subnet_id=subnet_id))
+
+    def _allocation_pools_subnet(self):
+        allocation_pools = [{'start': '10.0.0.2', 'end': '10.0.0.10'},
+                            {'start': '10.0.0.20', 'end': '10.0.0.22'}]
+        return self.subnet(cidr='10.0.0.0/24',
+                           allocation_pools=allocation_pools)
+
+    def test_allocate_multiple_ips(self):
+        with self._allocation_pools_subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                ips = self.backend.allocate(self.ctx, subnet_id, 11)
+            self.assertEqual(['10.0.0.%d' % i for i in range(2, 11)] +
+                             ['10.0.0.20', '10.0.0.21'], ips)
+            self.assertEqual([('10.0.0.22', '10.0.0.22')],
+                             self._get_ranges(subnet_id))
+
+    def test_allocate_returns_available_ips_only(self):
+        with self._allocation_pools_subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                ips = self.backend.allocate(self.ctx, subnet_id, 20)
+            self.assertEqual(12, len(ips))
+            self.assertEqual([], self._get_ranges(subnet_id))
+
+    def test_allocate_specific_splits_range(self):
+        with self._allocation_pools_subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                self.backend.allocate_specific(self.ctx, subnet_id,
+                                               '10.0.0.5')
+            self.assertEqual([('10.0.0.2', '10.0.0.4'),
+                              ('10.0.0.20', '10.0.0.22'),
+                              ('10.0.0.6', '10.0.0.10')],
+                             self._get_ranges(subnet_id))
+
+    def test_release_merges_ranges(self):
+        with self._allocation_pools_subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                ips = self.backend.allocate(self.ctx, subnet_id, 12)
+            with self.ctx.session.begin(subtransactions=True):
+                self.backend.release(self.ctx, subnet_id, ips[3:6])
+                self.backend.release(self.ctx, subnet_id, ips[1:2])
+            self.assertEqual([('10.0.0.3', '10.0.0.3'),
+                              ('10.0.0.5', '10.0.0.7')],
+                             self._get_ranges(subnet_id))
+            with self.ctx.session.begin(subtransactions=True):
+                released = self.backend.release(self.ctx, subnet_id, ips)
+            self.assertEqual(sorted(ips), sorted(released))
+            self.assertEqual([('10.0.0.2', '10.0.0.10'),
+                              ('10.0.0.20', '10.0.0.22')],
+                             self._get_ranges(subnet_id))
+
+    def test_release_ignores_ips_outside_pools(self):
+        with self._allocation_pools_subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.ctx.session.begin(subtransactions=True):
+                released = self.backend.release(self.ctx, subnet_id,
+                                                ['10.0.0.15'])
+            self.assertEqual([], released)
+            self.assertEqual([('10.0.0.2', '10.0.0.10'),
+                              ('10.0.0.20', '10.0.0.22')],
+                             self._get_ranges(subnet_id))
+
+    def test_create_ports_bulk_allocates_ips_at_once(self):
+        with self._allocation_pools_subnet() as subnet:
+            net_id = subnet['subnet']['network_id']
+            backend = ipam_backend.get_backend()
+            with mock.patch.object(backend, 'allocate',
+                                   wraps=backend.allocate) as allocate:
+                res = self._create_port_bulk(self.fmt, 5, net_id,
+                                             'test', True)
+            self.assertEqual(1, allocate.call_count)
+            ports = self.deserialize(self.fmt, res)['ports']
+            ips = [p['fixed_ips'][0]['ip_address'] for p in ports]
+            self.assertEqual(['10.0.0.%d' % i for i in range(2, 7)],
+                             sorted(ips))
+            self.assertEqual([('10.0.0.20', '10.0.0.22'),
+                              ('10.0.0.7', '10.0.0.10')],
+                             self._get_ranges(subnet['subnet']['id']))
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_with_reserved_specific_ip(self):
+        with self._allocation_pools_subnet() as subnet:
+            net_id = subnet['subnet']['network_id']
+            subnet_id = subnet['subnet']['id']
+            ports = {'ports': [
+                {'port': {'network_id': net_id, 'admin_state_up': True,
+                          'tenant_id': self._tenant_id,
+                          'fixed_ips': [{'subnet_id': subnet_id,
+                                         'ip_address': '10.0.0.2'}]}},
+                {'port': {'network_id': net_id, 'admin_state_up': True,
+                          'tenant_id': self._tenant_id}}]}
+            req = self.new_create_request('ports', ports, self.fmt)
+            res = req.get_response(self.api)
+            self.assertEqual(res.status_int, 201)
+            ports = self.deserialize(self.fmt, res)['ports']
+            ips = [p['fixed_ips'][0]['ip_address'] for p in ports]
+            self.assertEqual(['10.0.0.2', '10.0.0.3'], sorted(ips))
+            self.assertEqual([('10.0.0.20', '10.0.0.22'),
+                              ('10.0.0.4', '10.0.0.10')],
+                             self._get_ranges(subnet_id))
+            for p in ports:
+                self._delete('ports', p['id'])
+
+
+class TestCollectionQueryCount(NeutronDbPluginV2TestCase):
+    """Listing resources must only query what the requested fields need."""
+
+    def test_list_networks_query_count(self):
+        with self.network() as network:
+            with self.subnet(network=network):
+                res, statements = self._list_with_queries('networks')
+                self.assertEqual(1, len(res['networks'][0]['subnets']))
+                with contextlib.nested(self.subnet(network=network,
+                                                   cidr='10.0.1.0/24'),
+                                       self.network(), self.network()):
+                    res, more_statements = self._list_with_queries(
+                        'networks')
+                    self.assertEqual(3, len(res['networks']))
+                    self.assertEqual(len(statements), len(more_statements))
+
+    def test_list_subnets_query_count(self):
+        with self.network() as network:
+            with self.subnet(network=network, cidr='10.0.0.0/24',
+                             dns_nameservers=['1.2.3.4'],
+                             host_routes=[{'destination': '12.0.0.0/8',
+                                           'nexthop': '10.0.0.3'}]):
+                res, statements = self._list_with_queries('subnets')
+                self.assertEqual(['1.2.3.4'],
+                                 res['subnets'][0]['dns_nameservers'])
+                with contextlib.nested(self.subnet(network=network,
+                                                   cidr='10.0.1.0/24'),
+                                       self.subnet(network=network,
+                                                   cidr='10.0.2.0/24')):
+                    res, more_statements = self._list_with_queries('subnets')
+                    self.assertEqual(3, len(res['subnets']))
+                    self.assertEqual(len(statements), len(more_statements))
+
+    def test_list_ports_with_column_fields(self):
+        with self.subnet() as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id']},
+                         {'subnet_id': subnet['subnet']['id']}]
+            with self.port(subnet=subnet, fixed_ips=fixed_ips,
+                           device_id='dev1') as port:
+                res, statements = self._list_with_queries(
+                    'ports', 'device_id=dev1&fields=id&fields=name')
+                self.assertEqual([{'id': port['port']['id'],
+                                   'name': port['port']['name']}],
+                                 res['ports'])
+                # The fixed ips are not read
+                self.assertFalse([s for s in statements
+                                  if 'ipallocations' in s])
+
+                # The port is returned once though joined to both its ips
+                res, statements = self._list_with_queries(
+                    'ports', 'fixed_ips=subnet_id%%3D%s&fields=id' %
+                    subnet['subnet']['id'])
+                self.assertEqual([{'id': port['port']['id']}],
+                                 res['ports'])
+
+
 class DbModelTestCase(base.BaseTestCase):
     """DB model tests."""
     def test_repr(self):
@@ -751,22 +751,62 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                                                  fake_network)
         self.dhcp.device_manager.update.assert_called_once_with(fake_network)
 
+    def _run_scheduled_reload(self, spawn_after):
+        spawn_after.assert_called_once_with(1, self.dhcp._delayed_reload,
+                                            fake_network.id)
+        self.assertEqual(self.call_driver.call_count, 0)
+        self.dhcp._delayed_reload(fake_network.id)
+
     def test_port_update_end(self):
         payload = dict(port=vars(fake_port2))
         self.cache.get_network_by_id.return_value = fake_network
-        self.dhcp.port_update_end(None, payload)
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
+            self._run_scheduled_reload(spawn_after)
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port2.network_id),
              mock.call.put_port(mock.ANY)])
         self.call_driver.assert_called_once_with('reload_allocations',
                                                  fake_network)
 
+    def test_port_update_end_coalesced(self):
+        payload = dict(port=vars(fake_port2))
+        self.cache.get_network_by_id.return_value = fake_network
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
+            self.dhcp.port_create_end(None, payload)
+            self._run_scheduled_reload(spawn_after)
+            self.call_driver.assert_called_once_with('reload_allocations',
+                                                     fake_network)
+            # The next event schedules a new reload
+            spawn_after.reset_mock()
+            self.dhcp.port_update_end(None, payload)
+            spawn_after.assert_called_once_with(
+                1, self.dhcp._delayed_reload, fake_network.id)
+
+    def test_port_update_end_no_delay(self):
+        cfg.CONF.set_override('dhcp_reload_delay', 0)
+        payload = dict(port=vars(fake_port2))
+        self.cache.get_network_by_id.return_value = fake_network
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
+            self.assertFalse(spawn_after.called)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_delayed_reload_network_removed(self):
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp._delayed_reload(fake_network.id)
+        self.assertEqual(self.call_driver.call_count, 0)
+
     def test_port_delete_end(self):
         payload = dict(port_id=fake_port2.id)
         self.cache.get_network_by_id.return_value = fake_network
         self.cache.get_port_by_id.return_value = fake_port2
 
-        self.dhcp.port_delete_end(None, payload)
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_delete_end(None, payload)
+            self._run_scheduled_reload(spawn_after)
 
         self.cache.assert_has_calls(
             [mock.call.get_port_by_id(fake_port2.id),
@@ -775,6 +815,16 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_called_once_with('reload_allocations',
                                                  fake_network)
 
+    def test_port_delete_end_network_deleted(self):
+        payload = dict(port_id=fake_port2.id)
+        self.cache.get_port_by_id.return_value = fake_port2
+        self.cache.get_network_by_id.return_value = None
+
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_delete_end(None, payload)
+        self.assertFalse(spawn_after.called)
+        self.assertFalse(self.cache.remove_port.called)
+
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
         self.cache.get_port_by_id.return_value = None
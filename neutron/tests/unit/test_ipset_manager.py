@@ -0,0 +1,83 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+
+class IpsetManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(_execute=self.execute,
+                                                root_helper='sudo')
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members('NIPv6sg', 'IPv6', ['fe80::2', 'fe80::1'])
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='create NIPv6sg hash:ip family inet6\n'
+                          'flush NIPv6sg\n'
+                          'add NIPv6sg fe80::1\n'
+                          'add NIPv6sg fe80::2\n',
+            root_helper='sudo')
+        self.assertTrue(self.ipset.set_exists('NIPv6sg'))
+
+    def test_set_members_only_applies_changes(self):
+        self.ipset.set_members('NIPv4sg', 'IPv4', ['10.0.0.1', '10.0.0.2'])
+        self.execute.reset_mock()
+        self.ipset.set_members('NIPv4sg', 'IPv4', ['10.0.0.2', '10.0.0.3'])
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='add NIPv4sg 10.0.0.3\n'
+                          'del NIPv4sg 10.0.0.1\n',
+            root_helper='sudo')
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members('NIPv4sg', 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.set_members('NIPv4sg', 'IPv4', ['10.0.0.1'])
+        self.assertFalse(self.execute.called)
+
+    def test_set_name_is_truncated(self):
+        name = 'NIPv4' + 'a' * 36
+        self.ipset.set_members(name, 'IPv4', [])
+        self.assertEqual(['NIPv4' + 'a' * 26], self.ipset.ipsets.keys())
+        self.assertTrue(self.ipset.set_exists(name))
+
+    def test_destroy_set(self):
+        self.ipset.set_members('NIPv4sg', 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.destroy_set('NIPv4sg')
+        self.ipset.destroy_set('NIPv4unknown')
+        self.execute.assert_called_once_with(
+            ['ipset', 'destroy', 'NIPv4sg'], process_input=None,
+            root_helper='sudo')
+        self.assertFalse(self.ipset.set_exists('NIPv4sg'))
+
+    def test_namespace(self):
+        self.ipset.namespace = 'qrouter'
+        self.ipset.destroy_set('NIPv4sg')
+        self.ipset.set_members('NIPv4sg', 'IPv4', [])
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'qrouter', 'ipset', 'restore', '-exist'],
+            process_input='create NIPv4sg hash:ip family inet\n'
+                          'flush NIPv4sg\n',
+            root_helper='sudo')
@@ -993,3 +993,145 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                  call.add_rule('ofake_dev', '-j $sg-fallback'),
                  call.add_rule('sg-chain', '-j ACCEPT')]
         self.v4filter_inst.assert_has_calls(calls)
+
+    def test_filter_ipv4_ingress_remote_group_ipset(self):
+        self.firewall.enable_ipset = True
+        rule = {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'protocol': 'tcp',
+                'port_range_min': 22,
+                'port_range_max': 22,
+                'remote_group_id': 'fake_sgid'}
+        ingress = call.add_rule(
+            'ifake_dev',
+            '-p tcp -m tcp --dport 22 '
+            '-m set --match-set NIPv4fake_sgid src -j RETURN')
+        egress = None
+        self._test_prepare_port_filter(rule, ingress, egress)
+        # The set is created empty until its members are known
+        self.utils_exec.assert_has_calls([
+            call(['ipset', 'restore', '-exist'],
+                 process_input='create NIPv4fake_sgid hash:ip family inet\n'
+                               'flush NIPv4fake_sgid\n',
+                 root_helper=mock.ANY)])
+
+    def test_filter_ipv6_egress_remote_group_ipset(self):
+        self.firewall.enable_ipset = True
+        rule = {'ethertype': 'IPv6',
+                'direction': 'egress',
+                'remote_group_id': 'fake_sgid'}
+        egress = call.add_rule(
+            'ofake_dev', '-m set --match-set NIPv6fake_sgid dst -j RETURN')
+        ingress = None
+        self._test_prepare_port_filter(rule, ingress, egress)
+
+    def test_update_security_group_members(self):
+        self.firewall.enable_ipset = True
+        port = self._fake_port()
+        port['security_groups'] = ['fake_sgid1']
+        self.firewall.update_security_group_rules(
+            'fake_sgid1', [{'ethertype': 'IPv4',
+                            'direction': 'ingress',
+                            'remote_group_id': 'fake_sgid'}])
+        self.firewall.update_security_group_members(
+            'fake_sgid', {'IPv4': ['10.0.0.2', '10.0.0.3'],
+                          'IPv6': ['fe80::2']})
+        self.firewall.prepare_port_filter(port)
+        self.v4filter_inst.reset_mock()
+        self.firewall.update_security_group_members(
+            'fake_sgid', {'IPv4': ['10.0.0.3', '10.0.0.4'],
+                          'IPv6': ['fe80::3']})
+        # No rule matches the IPv6 members
+        self.assertEqual(['NIPv4fake_sgid'], self.firewall.ipset.ipsets.keys())
+        self.utils_exec.assert_has_calls([
+            call(['ipset', 'restore', '-exist'],
+                 process_input='create NIPv4fake_sgid hash:ip family inet\n'
+                               'flush NIPv4fake_sgid\n'
+                               'add NIPv4fake_sgid 10.0.0.2\n'
+                               'add NIPv4fake_sgid 10.0.0.3\n',
+                 root_helper=mock.ANY),
+            call(['ipset', 'restore', '-exist'],
+                 process_input='add NIPv4fake_sgid 10.0.0.4\n'
+                               'del NIPv4fake_sgid 10.0.0.2\n',
+                 root_helper=mock.ANY)])
+        # No iptables rule is changed by a member update
+        self.assertFalse(self.v4filter_inst.add_rule.called)
+
+    def test_defer_apply_off_removes_unused_ipsets(self):
+        self.firewall.enable_ipset = True
+        port = self._fake_port()
+        port['security_groups'] = ['fake_sgid1']
+        self.firewall.update_security_group_rules(
+            'fake_sgid1', [{'ethertype': 'IPv4',
+                            'direction': 'ingress',
+                            'remote_group_id': 'fake_sgid'}])
+        with self.firewall.defer_apply():
+            self.firewall.prepare_port_filter(port)
+        self.firewall.update_security_group_rules(
+            'fake_sgid1', [{'ethertype': 'IPv4',
+                            'direction': 'ingress',
+                            'remote_group_id': 'fake_sgid2'}])
+        with self.firewall.defer_apply():
+            self.firewall.update_port_filter(port)
+        self.assertEqual(['NIPv4fake_sgid2'],
+                         self.firewall.ipset.ipsets.keys())
+        self.utils_exec.assert_has_calls([
+            call(['ipset', 'destroy', 'NIPv4fake_sgid'],
+                 process_input=None, root_helper=mock.ANY)])
+
+    def test_prepare_port_filter_with_security_group_rules(self):
+        port = self._fake_port()
+        port['security_groups'] = ['fake_sgid1']
+        self.firewall.update_security_group_rules(
+            'fake_sgid1', [{'ethertype': 'IPv4',
+                            'direction': 'ingress',
+                            'protocol': 'tcp',
+                            'port_range_min': 22,
+                            'port_range_max': 22,
+                            'remote_group_id': 'fake_sgid2'},
+                           {'ethertype': 'IPv4',
+                            'direction': 'egress'}])
+        self.firewall.update_security_group_members(
+            'fake_sgid2', {'IPv4': [FAKE_IP['IPv4'], '10.0.0.2'],
+                           'IPv6': []})
+        self.firewall.prepare_port_filter(port)
+        self.v4filter_inst.assert_has_calls(
+            [call.add_rule('ifake_dev',
+                           '-s 10.0.0.2/32 -p tcp -m tcp --dport 22 '
+                           '-j RETURN'),
+             call.add_rule('ifake_dev', '-j $sg-fallback')])
+        self.v4filter_inst.assert_has_calls(
+            [call.add_rule('ofake_dev', '-j RETURN'),
+             call.add_rule('ofake_dev', '-j $sg-fallback')])
+        # The port does not need a rule for its own address
+        self.assertNotIn(
+            call.add_rule('ifake_dev',
+                          '-s 10.0.0.1/32 -p tcp -m tcp --dport 22 '
+                          '-j RETURN'),
+            self.v4filter_inst.mock_calls)
+        # The cached rules are left as is
+        self.assertEqual('fake_sgid2',
+                         self.firewall.sg_rules['fake_sgid1'][0][
+                             'remote_group_id'])
+
+    def test_defer_apply_off_removes_unused_security_groups(self):
+        port = self._fake_port()
+        port['security_groups'] = ['fake_sgid1']
+        rules = [{'ethertype': 'IPv4',
+                  'direction': 'ingress',
+                  'remote_group_id': 'fake_sgid2'}]
+        with self.firewall.defer_apply():
+            self.firewall.update_security_group_rules('fake_sgid1', rules)
+            self.firewall.update_security_group_rules('fake_sgid3', [])
+            self.firewall.update_security_group_members(
+                'fake_sgid2', {'IPv4': ['10.0.0.2']})
+            self.firewall.update_security_group_members(
+                'fake_sgid4', {'IPv4': ['10.0.0.3']})
+            self.firewall.prepare_port_filter(port)
+        self.assertEqual({'fake_sgid1': rules}, self.firewall.sg_rules)
+        self.assertEqual({'fake_sgid2': {'IPv4': ['10.0.0.2']}},
+                         self.firewall.sg_members)
+        with self.firewall.defer_apply():
+            self.firewall.remove_port_filter(port)
+        self.assertEqual({}, self.firewall.sg_rules)
+        self.assertEqual({}, self.firewall.sg_members)
@@ -114,11 +114,16 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=NAT_DUMP + filter_dump_mod,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-c'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore', '-c'],
-                              process_input=NAT_DUMP + FILTER_DUMP,
+        filter_remove = ('# Generated by iptables_manager\n'
+                         '*filter\n'
+                         ':%(bn)s-filter - [0:0]\n'
+                         '-X %(bn)s-filter\n'
+                         'COMMIT\n'
+                         '# Completed by iptables_manager\n'
+                         % IPTABLES_ARG)
+
+        self.iptables.execute(['iptables-restore', '-n'],
+                              process_input=filter_remove,
                               root_helper=self.root_helper).AndReturn(None)
 
         self.mox.ReplayAll()
@@ -160,13 +165,18 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=NAT_DUMP + filter_dump_mod,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-c'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore', '-c'],
-                              process_input=NAT_DUMP + FILTER_DUMP,
-                              root_helper=self.root_helper
-                              ).AndReturn(None)
+        filter_remove = ('# Generated by iptables_manager\n'
+                         '*filter\n'
+                         ':%(bn)s-INPUT - [0:0]\n'
+                         ':%(bn)s-filter - [0:0]\n'
+                         '-X %(bn)s-filter\n'
+                         'COMMIT\n'
+                         '# Completed by iptables_manager\n'
+                         % IPTABLES_ARG)
+
+        self.iptables.execute(['iptables-restore', '-n'],
+                              process_input=filter_remove,
+                              root_helper=self.root_helper).AndReturn(None)
 
         self.mox.ReplayAll()
 
@@ -188,24 +198,6 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.mox.VerifyAll()
 
     def test_add_nat_rule(self):
-        nat_dump = ('# Generated by iptables_manager\n'
-                    '*nat\n'
-                    ':neutron-postrouting-bottom - [0:0]\n'
-                    ':%(bn)s-float-snat - [0:0]\n'
-                    ':%(bn)s-POSTROUTING - [0:0]\n'
-                    ':%(bn)s-PREROUTING - [0:0]\n'
-                    ':%(bn)s-OUTPUT - [0:0]\n'
-                    ':%(bn)s-snat - [0:0]\n'
-                    '[0:0] -A PREROUTING -j %(bn)s-PREROUTING\n'
-                    '[0:0] -A OUTPUT -j %(bn)s-OUTPUT\n'
-                    '[0:0] -A POSTROUTING -j %(bn)s-POSTROUTING\n'
-                    '[0:0] -A POSTROUTING -j neutron-postrouting-bottom\n'
-                    '[0:0] -A neutron-postrouting-bottom -j %(bn)s-snat\n'
-                    '[0:0] -A %(bn)s-snat -j %(bn)s-float-snat\n'
-                    'COMMIT\n'
-                    '# Completed by iptables_manager\n'
-                    % IPTABLES_ARG)
-
         nat_dump_mod = ('# Generated by iptables_manager\n'
                         '*nat\n'
                         ':neutron-postrouting-bottom - [0:0]\n'
@@ -236,11 +228,17 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=nat_dump_mod + FILTER_DUMP,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-c'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore', '-c'],
-                              process_input=nat_dump + FILTER_DUMP,
+        nat_remove = ('# Generated by iptables_manager\n'
+                      '*nat\n'
+                      ':%(bn)s-PREROUTING - [0:0]\n'
+                      ':%(bn)s-nat - [0:0]\n'
+                      '-X %(bn)s-nat\n'
+                      'COMMIT\n'
+                      '# Completed by iptables_manager\n'
+                      % IPTABLES_ARG)
+
+        self.iptables.execute(['iptables-restore', '-n'],
+                              process_input=nat_remove,
                               root_helper=self.root_helper).AndReturn(None)
 
         self.mox.ReplayAll()
@@ -265,6 +263,77 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.iptables.apply()
         self.mox.VerifyAll()
 
+    def _replay_full_apply(self):
+        self.iptables.execute(['iptables-save', '-c'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore', '-c'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+
+    def test_apply_only_changed_chains(self):
+        self._replay_full_apply()
+
+        filter_mod = ('# Generated by iptables_manager\n'
+                      '*filter\n'
+                      ':%(bn)s-INPUT - [0:0]\n'
+                      ':%(bn)s-filter - [0:0]\n'
+                      '-A %(bn)s-INPUT -s 192.168.0.2 -j DROP\n'
+                      '-A %(bn)s-INPUT -s 192.168.0.3 -j %(bn)s-filter\n'
+                      '-A %(bn)s-filter -j DROP\n'
+                      'COMMIT\n'
+                      '# Completed by iptables_manager\n'
+                      % IPTABLES_ARG)
+
+        self.iptables.execute(['iptables-restore', '-n'],
+                              process_input=filter_mod,
+                              root_helper=self.root_helper).AndReturn(None)
+
+        self.mox.ReplayAll()
+
+        self.iptables.ipv4['filter'].add_rule('INPUT',
+                                              '-s 192.168.0.2 -j DROP')
+        self.iptables.apply()
+
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT',
+                                              '-s 192.168.0.3 -j $filter')
+        self.iptables.apply()
+
+        # Nothing changed, iptables-restore is not run
+        self.iptables.ipv4['filter'].remove_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_unwrapped_rule_rewrites_tables(self):
+        self._replay_full_apply()
+        self._replay_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_incremental_failure_rewrites_tables(self):
+        self._replay_full_apply()
+        self.iptables.execute(['iptables-restore', '-n'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper
+                              ).AndRaise(RuntimeError())
+        self._replay_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j DROP')
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
     def test_add_rule_to_a_nonexistent_chain(self):
         self.assertRaises(LookupError, self.iptables.ipv4['filter'].add_rule,
                           'nonexistent', '-j DROP')
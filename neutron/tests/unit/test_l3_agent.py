@@ -503,32 +503,78 @@ class TestBasicRouterOperations(base.BaseTestCase):
             {'id': _uuid(),
              'admin_state_up': False,
              'external_gateway_info': {}}]
-        agent._process_routers(routers)
+        agent._process_routers(routers, None)
         self.assertNotIn(routers[0]['id'], agent.router_info)
 
+    def test_process_routers_skips_unchanged_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        router = {'id': _uuid(),
+                  'admin_state_up': True,
+                  'external_gateway_info': {},
+                  l3_constants.ROUTER_REVISION_KEY: 'rev1'}
+        with mock.patch.object(agent, 'process_router') as process_router:
+            agent._process_routers([router], None)
+            self.assertEqual(1, process_router.call_count)
+            self.assertEqual({router['id']: 'rev1'},
+                             agent._router_revisions())
+
+            unchanged = {'id': router['id'],
+                         l3_constants.ROUTER_REVISION_KEY: 'rev1',
+                         l3_constants.ROUTER_UNCHANGED_KEY: True}
+            agent._process_routers([unchanged], None)
+        self.assertEqual(1, process_router.call_count)
+        self.assertIn(router['id'], agent.router_info)
+
+    def test_process_routers_failure_resets_revision(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        router = {'id': _uuid(),
+                  'admin_state_up': True,
+                  'external_gateway_info': {},
+                  l3_constants.ROUTER_REVISION_KEY: 'rev1'}
+        with mock.patch.object(agent, 'process_router',
+                               side_effect=RuntimeError()):
+            self.assertRaises(RuntimeError, agent._process_routers,
+                              [router], None)
+        self.assertEqual({}, agent._router_revisions())
+
+    def _queued_updates(self, agent):
+        updates = []
+        while len(agent.router_queue):
+            update = agent.router_queue.get()
+            agent.router_queue.done(update)
+            updates.append((update.router_id, update.action,
+                            update.priority))
+        return updates
+
     def test_router_deleted(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_deleted(None, FAKE_ID)
-        # verify that will set fullsync
-        self.assertTrue(FAKE_ID in agent.removed_routers)
+        self.assertEqual([(FAKE_ID, l3_agent.DELETE_ROUTER,
+                           l3_agent.PRIORITY_RPC_UPDATE)],
+                         self._queued_updates(agent))
 
     def test_routers_updated(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.routers_updated(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertTrue(FAKE_ID in agent.updated_routers)
+        self.assertEqual([(FAKE_ID, l3_agent.UPDATE_ROUTER,
+                           l3_agent.PRIORITY_RPC_UPDATE)],
+                         self._queued_updates(agent))
 
     def test_removed_from_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_removed_from_agent(None, {'router_id': FAKE_ID})
-        # verify that will set fullsync
-        self.assertTrue(FAKE_ID in agent.removed_routers)
+        self.assertEqual([(FAKE_ID, l3_agent.DELETE_ROUTER,
+                           l3_agent.PRIORITY_RPC_UPDATE)],
+                         self._queued_updates(agent))
 
     def test_added_to_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_added_to_agent(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertTrue(FAKE_ID in agent.updated_routers)
+        self.assertEqual([(FAKE_ID, l3_agent.UPDATE_ROUTER,
+                           l3_agent.PRIORITY_RPC_UPDATE)],
+                         self._queued_updates(agent))
 
     def test_process_router_delete(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -545,8 +591,126 @@ class TestBasicRouterOperations(base.BaseTestCase):
             'gw_port': ex_gw_port}
         agent._router_added(router['id'], router)
         agent.router_deleted(None, router['id'])
-        agent._process_router_delete()
-        self.assertFalse(list(agent.removed_routers))
+        agent._process_router_batch([agent.router_queue.get()])
+        self.assertNotIn(router['id'], agent.router_info)
+
+    def _get_batch(self, agent, size=10):
+        return agent.router_queue.get_batch(size, l3_agent._needs_fetch)
+
+    def test_process_router_batch_fetches_routers_once(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = [{'id': _uuid(), 'admin_state_up': True}
+                   for i in range(2)]
+        self.plugin_api.get_routers.return_value = routers
+        router_ids = [router['id'] for router in routers]
+        agent.routers_updated(None, router_ids)
+        updates = self._get_batch(agent)
+        self.assertEqual(router_ids, [u.router_id for u in updates])
+        with mock.patch.object(agent, '_process_routers') as process:
+            agent._process_router_batch(updates)
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, router_ids, {})
+        self.assertEqual(1, self.plugin_api.get_external_network_id.call_count)
+        self.assertEqual(1, self.device_exists.call_count)
+        target_ex_net_id = self.plugin_api.get_external_network_id.return_value
+        self.assertEqual([mock.call([router], target_ex_net_id)
+                          for router in routers],
+                         process.call_args_list)
+        self.assertEqual(0, agent.router_queue.get_stats()['processing'])
+
+    def test_process_router_batch_releases_routers_when_processed(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = [{'id': _uuid(), 'admin_state_up': True}
+                   for i in range(2)]
+        self.plugin_api.get_routers.return_value = routers
+        agent.routers_updated(None, [router['id'] for router in routers])
+        processing = []
+
+        def process_routers(routers, target_ex_net_id):
+            processing.append(agent.router_queue.get_stats()['processing'])
+
+        with mock.patch.object(agent, '_process_routers',
+                               side_effect=process_routers):
+            agent._process_router_batch(self._get_batch(agent))
+        self.assertEqual([2, 1], processing)
+
+    def test_process_router_batch_removes_unscheduled_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        agent.router_info[router_id] = mock.Mock()
+        self.plugin_api.get_routers.return_value = []
+        agent.routers_updated(None, [router_id])
+        with mock.patch.object(agent, '_router_removed') as removed:
+            agent._process_router_batch(self._get_batch(agent))
+        removed.assert_called_once_with(router_id)
+        self.assertFalse(self.plugin_api.get_external_network_id.called)
+
+    def test_process_router_batch_failure_sets_fullsync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        routers = [{'id': _uuid(), 'admin_state_up': True}
+                   for i in range(2)]
+        self.plugin_api.get_routers.return_value = routers
+        agent.routers_updated(None, [router['id'] for router in routers])
+        with mock.patch.object(agent, '_process_routers',
+                               side_effect=[RuntimeError(), None]):
+            agent._process_router_batch(self._get_batch(agent))
+        self.assertTrue(agent.fullsync)
+        self.assertEqual(0, agent.router_queue.get_stats()['processing'])
+        # Only the router processed is recorded as up to date
+        old = [l3_agent.RouterUpdate(router['id'],
+                                     l3_agent.PRIORITY_RPC_UPDATE,
+                                     timestamp=1)
+               for router in routers]
+        self.assertEqual([False, True],
+                         [agent.router_queue.is_stale(u) for u in old])
+
+    def test_process_router_batch_fetch_failure_releases_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_routers.side_effect = RuntimeError()
+        agent.routers_updated(None, [_uuid(), _uuid()])
+        self.assertRaises(RuntimeError, agent._process_router_batch,
+                          self._get_batch(agent))
+        self.assertEqual(0, agent.router_queue.get_stats()['processing'])
+
+    def test_resync_updates_processed_one_at_a_time(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = [{'id': _uuid(), 'admin_state_up': True}
+                   for i in range(2)]
+        self.plugin_api.get_routers.return_value = routers
+        agent._sync_routers_task(agent.context)
+        with mock.patch.object(agent, '_process_routers') as process:
+            for router in routers:
+                updates = self._get_batch(agent)
+                self.assertEqual([router['id']],
+                                 [u.router_id for u in updates])
+                agent._process_router_batch(updates)
+        self.assertEqual(2, process.call_count)
+        self.assertEqual(1, self.plugin_api.get_routers.call_count)
+        # The external network is checked once for the whole resync
+        self.assertEqual(1, self.plugin_api.get_external_network_id.call_count)
+
+    def test_sync_routers_task_queues_updates(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        known_id, removed_id = _uuid(), _uuid()
+        agent.router_info[known_id] = mock.Mock()
+        agent.router_info[removed_id] = mock.Mock()
+        unchanged = {'id': known_id,
+                     l3_constants.ROUTER_UNCHANGED_KEY: True}
+        added = {'id': _uuid()}
+        self.plugin_api.get_routers.return_value = [unchanged, added]
+        agent.routers_updated(None, [FAKE_ID])
+
+        agent._sync_routers_task(agent.context)
+
+        self.assertFalse(agent.fullsync)
+        self.assertEqual(
+            [(FAKE_ID, l3_agent.UPDATE_ROUTER, l3_agent.PRIORITY_RPC_UPDATE),
+             (added['id'], l3_agent.UPDATE_ROUTER,
+              l3_agent.PRIORITY_SYNC_ROUTERS),
+             (removed_id, l3_agent.DELETE_ROUTER,
+              l3_agent.PRIORITY_SYNC_ROUTERS)],
+            self._queued_updates(agent))
 
     def testDestroyNamespace(self):
 
@@ -699,3 +863,96 @@ class TestL3AgentEventHandler(base.BaseTestCase):
                 ])
         finally:
             self.external_process_p.start()
+
+
+class TestRouterUpdateQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterUpdateQueue, self).setUp()
+        self.queue = l3_agent.RouterUpdateQueue()
+
+    def _add(self, router_id, priority=l3_agent.PRIORITY_SYNC_ROUTERS,
+             timestamp=None, action=l3_agent.UPDATE_ROUTER):
+        update = l3_agent.RouterUpdate(router_id, priority, action=action,
+                                       timestamp=timestamp)
+        self.queue.add(update)
+        return update
+
+    def test_get_by_priority_then_order(self):
+        self._add('r1')
+        self._add('r2', priority=l3_agent.PRIORITY_RPC_UPDATE)
+        self._add('r3')
+        self.assertEqual(['r2', 'r1', 'r3'],
+                         [self.queue.get().router_id for i in range(3)])
+
+    def test_add_keeps_latest_update_with_highest_priority(self):
+        self._add('r1', priority=l3_agent.PRIORITY_RPC_UPDATE, timestamp=1)
+        self._add('r2', timestamp=1)
+        update = self._add('r1', timestamp=2, action=l3_agent.DELETE_ROUTER)
+        self._add('r1', timestamp=1)
+        self.assertEqual(2, len(self.queue))
+        self.assertIs(update, self.queue.get())
+        self.assertEqual(l3_agent.PRIORITY_RPC_UPDATE, update.priority)
+        self.assertEqual('r2', self.queue.get().router_id)
+        self.assertEqual(0, len(self.queue))
+
+    def test_router_processed_by_one_worker_at_a_time(self):
+        first = self._add('r1')
+        self.assertIs(first, self.queue.get())
+        second = self._add('r1')
+        self._add('r2')
+        self.assertEqual('r2', self.queue.get().router_id)
+        self.queue.done(first)
+        self.assertIs(second, self.queue.get())
+
+    def test_get_batch_only_batches_batchable_updates(self):
+        self._add('r1', priority=l3_agent.PRIORITY_RPC_UPDATE)
+        self._add('r2', priority=l3_agent.PRIORITY_RPC_UPDATE)
+        self.queue.add(l3_agent.RouterUpdate(
+            'r3', l3_agent.PRIORITY_SYNC_ROUTERS, router={'id': 'r3'}))
+        self._add('r4')
+        batches = [[u.router_id for u in
+                    self.queue.get_batch(10, l3_agent._needs_fetch)]
+                   for i in range(3)]
+        self.assertEqual([['r1', 'r2'], ['r3'], ['r4']], batches)
+        self.assertIsNone(self.queue.get(blocking=False))
+
+    def test_get_batch_size(self):
+        for router_id in ('r1', 'r2', 'r3'):
+            self._add(router_id)
+        self.assertEqual(
+            ['r1', 'r2'],
+            [u.router_id for u in
+             self.queue.get_batch(2, l3_agent._needs_fetch)])
+        self.assertEqual('r3', self.queue.get().router_id)
+
+    def test_get_batch_skips_router_being_processed(self):
+        first = self._add('r1')
+        self.assertIs(first, self.queue.get())
+        self._add('r2')
+        self._add('r1')
+        self._add('r3')
+        self.assertEqual(
+            ['r2', 'r3'],
+            [u.router_id for u in
+             self.queue.get_batch(10, l3_agent._needs_fetch)])
+        self.queue.done(first)
+        self.assertEqual('r1', self.queue.get().router_id)
+
+    def test_is_stale(self):
+        self._add('r1')
+        self.queue.done(self.queue.get(), timestamp=10)
+        self.assertTrue(self.queue.is_stale(self._add('r1', timestamp=5)))
+        self.assertFalse(self.queue.is_stale(self._add('r1', timestamp=15)))
+        self.queue.forget(20)
+        self.assertFalse(self.queue.is_stale(self._add('r1', timestamp=5)))
+
+    def test_get_stats(self):
+        self._add('r1')
+        self._add('r2')
+        with mock.patch.object(l3_agent.time, 'time', side_effect=[1, 4]):
+            self.queue.done(self.queue.get())
+        stats = self.queue.get_stats()
+        self.assertEqual({'pending': 1, 'processing': 0,
+                          'latency': {'count': 1, 'average': 3, 'max': 3}},
+                         stats)
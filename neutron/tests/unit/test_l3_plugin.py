@@ -37,6 +37,7 @@ from neutron.common.test_lib import test_config
 from neutron import context
 from neutron.db import db_base_plugin_v2
 from neutron.db import l3_db
+from neutron.db import l3_rpc_base
 from neutron.db import models_v2
 from neutron.extensions import l3
 from neutron.manager import NeutronManager
@@ -1711,6 +1712,29 @@ class L3NatDBTestCase(L3NatTestCaseBase):
             self.assertTrue(floatingips[0]['fixed_ip_address'] is not None)
             self.assertTrue(floatingips[0]['router_id'] is not None)
 
+    def test_l3_agent_routers_sync_revisions(self):
+        with contextlib.nested(self.router(), self.router()) as (r1, r2):
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            ctx = context.get_admin_context()
+            routers = l3_rpc.sync_routers(ctx)
+            revisions = dict((r['id'], r[l3_constants.ROUTER_REVISION_KEY])
+                             for r in routers)
+            self._update('routers', r1['router']['id'],
+                         {'router': {'name': 'renamed'}})
+            routers = dict((r['id'], r) for r in
+                           l3_rpc.sync_routers(ctx, revisions=revisions))
+            router1 = routers[r1['router']['id']]
+            router2 = routers[r2['router']['id']]
+            self.assertEqual('renamed', router1['name'])
+            self.assertNotIn(l3_constants.ROUTER_UNCHANGED_KEY, router1)
+            self.assertNotEqual(revisions[router1['id']],
+                                router1[l3_constants.ROUTER_REVISION_KEY])
+            self.assertEqual({'id': router2['id'],
+                              l3_constants.ROUTER_REVISION_KEY:
+                              revisions[router2['id']],
+                              l3_constants.ROUTER_UNCHANGED_KEY: True},
+                             router2)
+
     def test_router_delete_subnet_inuse_returns_409(self):
         with self.router() as r:
             with self.subnet() as s:
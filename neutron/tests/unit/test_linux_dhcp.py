@@ -17,6 +17,7 @@
 
 import os
 import socket
+import tempfile
 
 import mock
 from oslo.config import cfg
@@ -678,6 +679,34 @@ tag:tag1,249,%s,%s""".lstrip() % (fake_v6,
                                     mock.call(exp_opt_name, exp_opt_data)])
         self.execute.assert_called_once_with(exp_args, 'sudo')
 
+    def test_reload_allocations_unchanged(self):
+        with mock.patch.object(dhcp.Dnsmasq, 'active') as active:
+            active.__get__ = mock.Mock(return_value=True)
+            with mock.patch.object(dhcp.Dnsmasq, 'pid') as pid:
+                pid.__get__ = mock.Mock(return_value=5)
+                dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                                  namespace='qdhcp-ns', version=float(2.59))
+                with mock.patch.object(dm, '_replace_conf_file') as replace:
+                    replace.return_value = False
+                    with mock.patch.object(dm, '_make_opts_file'):
+                        dm.reload_allocations()
+                    self.assertEqual(2, replace.call_count)
+
+        # dnsmasq is not signaled when its files are unchanged
+        self.assertFalse(self.execute.called)
+
+    def test_replace_conf_file(self):
+        self.conf.set_override('dhcp_confs', tempfile.mkdtemp())
+        dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork())
+        file_name = dm.get_conf_file_name('host', ensure_conf_dir=True)
+        with open(file_name, 'w') as f:
+            f.write('data')
+
+        self.assertFalse(dm._replace_conf_file('host', 'data'))
+        self.assertFalse(self.safe.called)
+        self.assertTrue(dm._replace_conf_file('host', 'new data'))
+        self.safe.assert_called_once_with(file_name, 'new data')
+
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('neutron.agent.linux.ip_lib.IPDevice') as ip_dev:
             ip_dev.return_value.addr.list.return_value = [
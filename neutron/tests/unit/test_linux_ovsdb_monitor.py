@@ -0,0 +1,166 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Red Hat, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet.event
+import mock
+
+from neutron.agent.linux import ovsdb_monitor
+from neutron.openstack.common import jsonutils
+from neutron.tests import base
+
+
+HEADINGS = ['row', 'action', 'name', 'external_ids']
+
+
+def _vif_row(row, action, name, iface_id, mac='fa:16:3e:00:00:01'):
+    return [row, action, name,
+            ['map', [['attached-mac', mac], ['iface-id', iface_id]]]]
+
+
+def _update(*rows):
+    return jsonutils.dumps({'data': list(rows), 'headings': HEADINGS})
+
+
+class TestOvsdbMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestOvsdbMonitor, self).setUp()
+        self.root_helper = 'sudo'
+        self.monitor = ovsdb_monitor.OvsdbMonitor('Interface',
+                                                  root_helper=self.root_helper)
+
+    def test_cmd_includes_columns_and_format(self):
+        monitor = ovsdb_monitor.OvsdbMonitor('Interface',
+                                             columns=['name', 'ofport'],
+                                             format='json')
+        self.assertEqual(['ovsdb-client', 'monitor', 'Interface',
+                          'name,ofport', '--format=json'], monitor.cmd)
+
+    def read_output_queues_and_returns_result(self, output_type, output):
+        with mock.patch.object(self.monitor, '_process') as mock_process:
+            with mock.patch.object(mock_process, output_type) as mock_file:
+                with mock.patch.object(mock_file, 'readline') as mock_readline:
+                    mock_readline.return_value = output
+                    func = getattr(self.monitor,
+                                   '_read_%s' % output_type,
+                                   None)
+                    return func()
+
+    def test__read_stdout_returns_output(self):
+        output = '{"data": []}\n'
+        result = self.read_output_queues_and_returns_result('stdout', output)
+        self.assertEqual(result, output)
+        self.assertEqual([output.strip()], list(self.monitor.iter_stdout()))
+
+    def test__read_stderr_returns_none(self):
+        result = self.read_output_queues_and_returns_result('stderr', 'foo\n')
+        self.assertIsNone(result)
+
+
+class TestSimpleInterfaceMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSimpleInterfaceMonitor, self).setUp()
+        self.monitor = ovsdb_monitor.SimpleInterfaceMonitor()
+
+    def _feed(self, *updates):
+        for update in updates:
+            self.monitor._stdout_lines.put(update)
+
+    def test_is_active_is_false_by_default(self):
+        self.assertFalse(self.monitor.is_active)
+
+    def test_is_active_can_be_true(self):
+        self.monitor.data_received = True
+        self.monitor._kill_event = eventlet.event.Event()
+        self.assertTrue(self.monitor.is_active)
+
+    def test_is_active_is_false_if_data_not_received(self):
+        self.monitor._kill_event = eventlet.event.Event()
+        self.assertFalse(self.monitor.is_active)
+
+    def test__read_stdout_sets_data_received_and_returns_output(self):
+        output = 'foo\n'
+        with mock.patch.object(self.monitor, '_process') as mock_process:
+            mock_process.stdout.readline.return_value = output
+            self.assertEqual(self.monitor._read_stdout(), output)
+        self.assertTrue(self.monitor.data_received)
+
+    def test__kill_sets_data_received_to_false(self):
+        self.monitor.data_received = True
+        with mock.patch(
+                'neutron.agent.linux.ovsdb_monitor.OvsdbMonitor._kill'):
+            self.monitor._kill()
+        self.assertFalse(self.monitor.data_received)
+
+    def test__spawn_discards_previous_state(self):
+        self._feed(_update(_vif_row('r1', 'initial', 'tap1', 'port1')))
+        self.monitor.get_events()
+        self._feed('stale')
+        with mock.patch(
+                'neutron.agent.linux.ovsdb_monitor.OvsdbMonitor._spawn'):
+            self.monitor._spawn()
+        self.assertEqual([], list(self.monitor.iter_stdout()))
+        self.assertFalse(self.monitor.pop_resync_required())
+        self.assertEqual(set(), self.monitor.get_events()['added'])
+
+    def test_get_events_reports_initial_vifs_as_added(self):
+        self._feed(_update(_vif_row('r1', 'initial', 'tap1', 'port1'),
+                           ['r2', 'initial', 'br-int', ['map', []]]))
+        events = self.monitor.get_events()
+        self.assertEqual(set(['port1']), events['added'])
+        self.assertEqual(set(), events['removed'])
+        self.assertEqual({'port1': 'tap1'}, events['port_names'])
+
+    def test_get_events_only_reports_changes_once(self):
+        self._feed(_update(_vif_row('r1', 'insert', 'tap1', 'port1')))
+        self.monitor.get_events()
+        events = self.monitor.get_events()
+        self.assertEqual(set(), events['added'])
+        self.assertEqual(set(), events['removed'])
+
+    def test_get_events_reports_deleted_vifs_as_removed(self):
+        self._feed(_update(_vif_row('r1', 'insert', 'tap1', 'port1')))
+        self.monitor.get_events()
+        self._feed(_update(_vif_row('r1', 'delete', 'tap1', 'port1')))
+        events = self.monitor.get_events()
+        self.assertEqual(set(), events['added'])
+        self.assertEqual(set(['port1']), events['removed'])
+
+    def test_get_events_nets_out_transient_vifs(self):
+        self._feed(_update(_vif_row('r1', 'insert', 'tap1', 'port1')),
+                   _update(_vif_row('r1', 'delete', 'tap1', 'port1')))
+        events = self.monitor.get_events()
+        self.assertEqual(set(), events['added'])
+        self.assertEqual(set(), events['removed'])
+
+    def test_get_events_handles_iface_id_modification(self):
+        self._feed(_update(['r1', 'insert', 'tap1', ['map', []]]))
+        self.assertEqual(set(), self.monitor.get_events()['added'])
+        self._feed(_update(['r1', 'old', '', ['map', []]],
+                           _vif_row('r1', 'new', 'tap1', 'port1')))
+        self.assertEqual(set(['port1']), self.monitor.get_events()['added'])
+
+    def test_xenserver_vif_requires_resync(self):
+        self._feed(_update(['r1', 'insert', 'tap1',
+                            ['map', [['attached-mac', 'fa:16:3e:00:00:01'],
+                                     ['xs-vif-uuid', 'xs1']]]]))
+        self.assertTrue(self.monitor.pop_resync_required())
+        self.assertFalse(self.monitor.pop_resync_required())
+
+    def test_unparseable_output_requires_resync(self):
+        self._feed('not json')
+        self.assertTrue(self.monitor.pop_resync_required())
@@ -0,0 +1,134 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+from oslo.config import cfg
+
+from neutron.common import rpc as q_rpc
+from neutron import service
+from neutron.tests import base
+
+
+class TestServeRpc(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestServeRpc, self).setUp()
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('periodic_interval', 0)
+        self.plugin = mock.Mock()
+        get_plugin = mock.patch.object(service.manager.NeutronManager,
+                                       'get_plugin',
+                                       return_value=self.plugin)
+        get_plugin.start()
+        self.addCleanup(get_plugin.stop)
+        dispose = mock.patch.object(service.db_api, 'dispose')
+        self.dispose = dispose.start()
+        self.addCleanup(dispose.stop)
+
+    def test_serve_rpc_not_supported(self):
+        self.plugin.rpc_workers_supported.return_value = False
+        self.assertRaises(NotImplementedError, service.serve_rpc)
+        self.assertFalse(self.plugin.start_rpc_listener.called)
+
+    def test_serve_rpc_in_process(self):
+        rpc = service.serve_rpc()
+        self.plugin.start_rpc_listener.assert_called_once_with()
+        self.dispose.assert_called_once_with()
+        rpc.wait()
+        server = self.plugin.start_rpc_listener.return_value
+        server.wait.assert_called_once_with()
+
+    @mock.patch('neutron.openstack.common.service.ProcessLauncher')
+    def test_serve_rpc_workers(self, ProcessLauncher):
+        cfg.CONF.set_override('rpc_workers', 2)
+        launcher = service.serve_rpc()
+        self.assertEqual(ProcessLauncher.return_value, launcher)
+        launcher.launch_service.assert_called_once_with(mock.ANY, workers=2)
+        self.assertFalse(self.plugin.start_rpc_listener.called)
+
+    @mock.patch('neutron.openstack.common.service.ProcessLauncher')
+    def test_serve_rpc_workers_shared_launcher(self, ProcessLauncher):
+        cfg.CONF.set_override('rpc_workers', 2)
+        launcher = mock.Mock()
+        self.assertEqual(launcher, service.serve_rpc(launcher))
+        launcher.launch_service.assert_called_once_with(mock.ANY, workers=2)
+        self.assertFalse(ProcessLauncher.called)
+
+    @mock.patch('neutron.openstack.common.service.ProcessLauncher')
+    def test_create_process_launcher(self, ProcessLauncher):
+        self.assertIsNone(service.create_process_launcher())
+        cfg.CONF.set_override('api_workers', 2)
+        self.assertEqual(ProcessLauncher.return_value,
+                         service.create_process_launcher())
+        cfg.CONF.set_override('api_workers', 0)
+        cfg.CONF.set_override('rpc_workers', 2)
+        self.assertEqual(ProcessLauncher.return_value,
+                         service.create_process_launcher())
+        self.assertEqual(2, ProcessLauncher.call_count)
+
+    def test_rpc_worker_stop(self):
+        rpc = service.RpcWorker(self.plugin)
+        rpc.start()
+        server = self.plugin.start_rpc_listener.return_value
+        with mock.patch.object(rpc, 'report_stats') as report_stats:
+            rpc.stop()
+        server.kill.assert_called_once_with()
+        report_stats.assert_called_once_with()
+
+    def test_rpc_worker_report_stats(self):
+        rpc = service.RpcWorker(self.plugin)
+        with contextlib.nested(
+            mock.patch.object(service.q_rpc, 'get_dispatch_stats'),
+            mock.patch.object(service.rpc_common, 'get_message_stats'),
+            mock.patch.object(service.LOG, 'info')
+        ) as (get_dispatch_stats, get_message_stats, log_info):
+            rpc.report_stats()
+        self.assertEqual(2, log_info.call_count)
+        logged = [call[0][1]['stats'] for call in log_info.call_args_list]
+        self.assertEqual([get_dispatch_stats.return_value,
+                          get_message_stats.return_value], logged)
+
+
+class FakeCallback(object):
+
+    RPC_API_VERSION = '1.0'
+
+    def get_device_details(self, context):
+        pass
+
+
+class TestDispatchStats(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDispatchStats, self).setUp()
+        stats = mock.patch.dict(q_rpc._dispatch_stats, clear=True)
+        stats.start()
+        self.addCleanup(stats.stop)
+
+    def test_get_dispatch_stats(self):
+        dispatcher = q_rpc.PluginRpcDispatcher([FakeCallback()])
+        rpc_ctxt = mock.Mock()
+        rpc_ctxt.to_dict.return_value = {}
+        with mock.patch.object(q_rpc.time, 'time',
+                               side_effect=[0, 1, 1, 4]):
+            dispatcher.dispatch(rpc_ctxt, '1.0', 'get_device_details', None)
+            dispatcher.dispatch(rpc_ctxt, '1.0', 'get_device_details', None)
+        self.assertEqual(
+            {'get_device_details': {'count': 2, 'average': 2, 'max': 3}},
+            q_rpc.get_dispatch_stats())
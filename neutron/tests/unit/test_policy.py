@@ -14,6 +14,7 @@
 # limitations under the License.
 
 """Test of Policy Engine For Neutron"""
+import contextlib
 
 import json
 import StringIO
@@ -166,6 +167,94 @@ class PolicyTestCase(base.BaseTestCase):
         policy.enforce(admin_context, uppercase_action, self.target)
 
 
+class CompiledRulesTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(CompiledRulesTestCase, self).setUp()
+        self.rules = common_policy.Rules(dict(
+            (k, common_policy.parse_rule(v)) for k, v in {
+                "admin": "role:admin",
+                "admin_or_owner": "rule:admin or tenant_id:%(tenant_id)s",
+                "not_admin": "not rule:admin",
+                "loop": "rule:loop or role:admin",
+                "default": "!",
+            }.items()), 'default')
+        self.compiled = policy.CompiledRules(self.rules)
+
+    def _creds(self, roles, tenant_id='fake'):
+        return {'roles': roles, 'tenant_id': tenant_id, 'is_admin': False,
+                policy.DECISION_KEY: (frozenset(roles), False)}
+
+    def test_static_decisions_are_cached(self):
+        creds = self._creds(['admin'])
+        self.assertTrue(self.compiled.check('admin', {}, creds))
+        self.assertFalse(self.compiled.check('not_admin', {}, creds))
+        self.assertEqual(
+            {('admin', creds[policy.DECISION_KEY]): True,
+             ('not_admin', creds[policy.DECISION_KEY]): False},
+            self.compiled._decisions)
+
+    def test_target_dependent_decisions_are_not_cached(self):
+        creds = self._creds(['member'])
+        self.assertTrue(self.compiled.check('admin_or_owner',
+                                            {'tenant_id': 'fake'}, creds))
+        self.assertFalse(self.compiled.check('admin_or_owner',
+                                             {'tenant_id': 'other'}, creds))
+        self.assertNotIn(('admin_or_owner', creds[policy.DECISION_KEY]),
+                         self.compiled._decisions)
+
+    def test_missing_rule_uses_default_rule(self):
+        self.rules.default_rule = 'admin'
+        self.assertTrue(self.compiled.check('missing', {},
+                                            self._creds(['admin'])))
+        self.assertFalse(self.compiled.check('missing', {},
+                                             self._creds(['member'])))
+
+    def test_missing_rule_without_default_rule_fails_closed(self):
+        self.rules.default_rule = None
+        self.assertFalse(self.compiled.check('missing', {},
+                                             self._creds(['admin'])))
+
+    def test_self_referencing_rule(self):
+        self.assertTrue(self.compiled.check('loop', {},
+                                            self._creds(['admin'])))
+
+    def test_rule_replaced_in_place_is_compiled_again(self):
+        creds = self._creds(['member'])
+        self.assertFalse(self.compiled.check('admin', {}, creds))
+        self.rules['admin'] = common_policy.parse_rule('@')
+        self.assertTrue(self.compiled.check('admin', {}, creds))
+
+    def test_referenced_rule_replaced_in_place(self):
+        self.rules['admin_only'] = common_policy.parse_rule('rule:admin')
+        creds = self._creds(['member'])
+        self.assertFalse(self.compiled.check('admin_only',
+                                             {'tenant_id': 'fake'}, creds))
+        self.rules['admin'] = common_policy.parse_rule(
+            'tenant_id:%(tenant_id)s')
+        self.assertTrue(self.compiled.check('admin_only',
+                                            {'tenant_id': 'fake'}, creds))
+        self.assertFalse(self.compiled.check('admin_only',
+                                             {'tenant_id': 'other'}, creds))
+
+    def test_referenced_rule_added(self):
+        self.rules['new_or_admin'] = common_policy.parse_rule(
+            'rule:new or rule:admin')
+        creds = self._creds(['member'])
+        self.rules.default_rule = None
+        self.assertFalse(self.compiled.check('new_or_admin', {}, creds))
+        self.rules['new'] = common_policy.parse_rule('@')
+        self.assertTrue(self.compiled.check('new_or_admin', {}, creds))
+
+    def test_static_checks_are_evaluated_first(self):
+        owner_check = mock.Mock(return_value=True)
+        self.rules['owner_or_admin'] = common_policy.OrCheck(
+            [owner_check, common_policy.RoleCheck('role', 'admin')])
+        self.assertTrue(self.compiled.check('owner_or_admin', {},
+                                            self._creds(['admin'])))
+        self.assertFalse(owner_check.called)
+
+
 class DefaultPolicyTestCase(base.BaseTestCase):
 
     def setUp(self):
@@ -409,6 +498,50 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             result = policy.enforce(self.context, action, target)
             self.assertTrue(result)
 
+    def test_enforce_parent_resource_is_cached_on_context(self):
+        plugin = manager.NeutronManager.get_instance().plugin
+        with mock.patch.object(plugin, 'get_network',
+                               return_value={'tenant_id': 'fake'}) as f:
+            for i in range(3):
+                target = {'network_id': 'whatever'}
+                self.assertTrue(policy.enforce(self.context,
+                                               "create_port:mac", target))
+        self.assertEqual(1, f.call_count)
+        self.assertEqual({('network', 'whatever'): {'tenant_id': 'fake'}},
+                         self.context._policy_parents)
+
+    def test_prefetch_parents(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_network_owner")
+        plugin = manager.NeutronManager.get_instance().plugin
+        targets = [{'network_id': 'net1'}, {'network_id': 'net2'},
+                   {'network_id': 'net1'}]
+        networks = [{'id': 'net1', 'tenant_id': 'fake'},
+                    {'id': 'net2', 'tenant_id': 'somebody_else'}]
+        with contextlib.nested(
+            mock.patch.object(plugin, 'get_networks', return_value=networks),
+            mock.patch.object(plugin, 'get_network')
+        ) as (get_networks, get_network):
+            policy.prefetch_parents(self.context, 'get_port', targets)
+            results = [policy.check(self.context, 'get_port', target)
+                       for target in targets]
+        self.assertEqual([True, False, True], results)
+        self.assertEqual(1, get_networks.call_count)
+        args, kwargs = get_networks.call_args
+        self.assertEqual(['net1', 'net2'], sorted(kwargs['filters']['id']))
+        self.assertEqual(['id', 'tenant_id'], kwargs['fields'])
+        self.assertFalse(get_network.called)
+
+    def test_prefetch_parents_skipped_for_admin(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_network_owner")
+        plugin = manager.NeutronManager.get_instance().plugin
+        admin_context = context.get_admin_context()
+        with mock.patch.object(plugin, 'get_networks') as get_networks:
+            policy.prefetch_parents(admin_context, 'get_port',
+                                    [{'network_id': 'net1'}])
+        self.assertFalse(get_networks.called)
+
     def test_enforce_plugin_failure(self):
 
         def fakegetnetwork(*args, **kwargs):
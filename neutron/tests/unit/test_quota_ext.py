@@ -1,3 +1,6 @@
+import contextlib
+import datetime
+
 import mock
 from oslo.config import cfg
 import testtools
@@ -9,12 +12,16 @@ from neutron.common import config
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import api as db
+from neutron.db import models_v2
 from neutron.db import quota_db
 from neutron import manager
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common.db.sqlalchemy import session as db_session
 from neutron.plugins.linuxbridge.db import l2network_db_v2
 from neutron import quota
 from neutron.tests import base
 from neutron.tests.unit import test_api_v2
+from neutron.tests.unit import test_db_plugin
 from neutron.tests.unit import test_extensions
 from neutron.tests.unit import testlib_api
 
@@ -384,3 +391,135 @@ class TestDbQuotaDriver(base.BaseTestCase):
             get_tenant_quotas.assert_called_once_with(ctx,
                                                       default_quotas,
                                                       target_tenant)
+
+
+class TestTrackedQuotaDriver(test_db_plugin.NeutronDbPluginV2TestCase):
+    """Test for neutron.db.quota_db.TrackedQuotaDriver."""
+
+    def setUp(self):
+        super(TestTrackedQuotaDriver, self).setUp()
+        cfg.CONF.set_override('quota_driver',
+                              'neutron.db.quota_db.TrackedQuotaDriver',
+                              group='QUOTAS')
+        cfg.CONF.set_override('quota_network', 2, group='QUOTAS')
+        self.addCleanup(setattr, quota, 'QUOTAS', quota.QUOTAS)
+        quota.QUOTAS = quota.QuotaEngine()
+        quota.register_resources_from_config()
+        self.plugin = manager.NeutronManager.get_plugin()
+        self.session = db.get_session()
+
+    def _get_usage(self, resource='network'):
+        self.session.expire_all()
+        return self.session.query(quota_db.QuotaUsage).filter_by(
+            tenant_id=self._tenant_id, resource=resource).one()
+
+    def _create_network(self):
+        return super(TestTrackedQuotaDriver, self)._create_network(
+            self.fmt, 'net', True)
+
+    def test_usage_tracked_without_counting(self):
+        with mock.patch.object(self.plugin, 'get_networks_count',
+                               wraps=self.plugin.get_networks_count) as count:
+            self.assertEqual(201, self._create_network().status_int)
+            self.assertEqual(201, self._create_network().status_int)
+            self.assertEqual(409, self._create_network().status_int)
+        # The usage is only counted when first checked
+        self.assertEqual(1, count.call_count)
+        usage = self._get_usage()
+        self.assertEqual(2, usage.in_use)
+        self.assertEqual(0, usage.reserved)
+
+    def test_usage_decreased_on_delete(self):
+        net = self.deserialize(self.fmt, self._create_network())
+        self._create_network()
+        self._delete('networks', net['network']['id'])
+        self.assertEqual(1, self._get_usage().in_use)
+        self.assertEqual(201, self._create_network().status_int)
+
+    def test_reservation_cancelled_on_failure(self):
+        with mock.patch.object(self.plugin, 'create_network',
+                               side_effect=RuntimeError()):
+            self.assertEqual(500, self._create_network().status_int)
+        usage = self._get_usage()
+        self.assertEqual(0, usage.in_use)
+        self.assertEqual(0, usage.reserved)
+        self.assertFalse(self.session.query(quota_db.Reservation).all())
+
+    def test_bulk_delete_marks_usage_dirty(self):
+        self._create_network()
+        with self.session.begin():
+            self.session.query(models_v2.Network).delete()
+        self.assertTrue(self._get_usage().dirty)
+        self.assertEqual(201, self._create_network().status_int)
+        usage = self._get_usage()
+        self.assertFalse(usage.dirty)
+        self.assertEqual(1, usage.in_use)
+
+    def test_usage_resync(self):
+        self._create_network()
+        with self.session.begin():
+            usage = self._get_usage()
+            usage.in_use = 2
+            usage.synced_at = datetime.datetime(2013, 1, 1)
+        self.assertEqual(201, self._create_network().status_int)
+        self.assertEqual(2, self._get_usage().in_use)
+
+    def test_expired_reservations_released_on_resync(self):
+        ctx = context.get_admin_context()
+        reservation_id = quota.QUOTAS.make_reservation(
+            ctx, self._tenant_id, 'network', 2, self.plugin, 'networks')
+        self.assertEqual(2, self._get_usage().reserved)
+        self.assertEqual(409, self._create_network().status_int)
+        with self.session.begin():
+            usage = self._get_usage()
+            usage.dirty = True
+            self.session.query(quota_db.Reservation).update(
+                {'expiration': datetime.datetime(2013, 1, 1)})
+        self.assertEqual(201, self._create_network().status_int)
+        self.assertEqual(0, self._get_usage().reserved)
+        # Committing the expired reservation does not change the usage
+        quota.QUOTAS.commit_reservation(ctx, reservation_id)
+        self.assertEqual(0, self._get_usage().reserved)
+
+    def test_expired_reservations_purged_on_reservation(self):
+        ctx = context.get_admin_context()
+        reservation_id = quota.QUOTAS.make_reservation(
+            ctx, self._tenant_id, 'network', 2, self.plugin, 'networks')
+        with self.session.begin():
+            self.session.query(quota_db.Reservation).update(
+                {'expiration': datetime.datetime(2013, 1, 1)})
+        self.assertEqual(201, self._create_network().status_int)
+        usage = self._get_usage()
+        self.assertFalse(usage.dirty)
+        self.assertEqual(0, usage.reserved)
+        self.assertFalse(self.session.query(quota_db.Reservation).all())
+        quota.QUOTAS.cancel_reservation(ctx, reservation_id)
+        self.assertEqual(0, self._get_usage().reserved)
+
+    def test_usage_inserted_concurrently(self):
+        driver = quota.QUOTAS._driver
+        lock_usage = driver._lock_usage
+
+        def insert_usage(context, tenant_id, resource):
+            if lock.call_count > 1:
+                return lock_usage(context, tenant_id, resource)
+            # Another request inserts the usage after it was looked up
+            with self.session.begin():
+                self.session.add(quota_db.QuotaUsage(
+                    tenant_id=tenant_id, resource=resource,
+                    in_use=0, reserved=0))
+
+        # The message of the duplicate entry errors depends on the version
+        # of sqlite
+        with contextlib.nested(
+            mock.patch.object(driver, '_lock_usage',
+                              side_effect=insert_usage),
+            mock.patch.object(db_session, '_raise_if_duplicate_entry_error',
+                              side_effect=db_exc.DBDuplicateEntry())
+        ) as (lock, duplicate_entry):
+            self.assertEqual(201, self._create_network().status_int)
+        self.assertTrue(duplicate_entry.called)
+        self.assertEqual(3, lock.call_count)
+        usage = self._get_usage()
+        self.assertEqual(1, usage.in_use)
+        self.assertEqual(0, usage.reserved)
@@ -0,0 +1,144 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.openstack.common import rpc
+from neutron.openstack.common.rpc import amqp
+from neutron.openstack.common.rpc import common as rpc_common
+from neutron.openstack.common.rpc import proxy
+from neutron.tests import base
+
+
+LARGE_MSG = {'method': 'sync_routers',
+             'args': {'routers': ['router%d' % i for i in range(10000)]}}
+
+
+class TestMessageEnvelope(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMessageEnvelope, self).setUp()
+        self.addCleanup(cfg.CONF.reset)
+        stats = mock.patch.dict(rpc_common._message_stats)
+        stats.start()
+        self.addCleanup(stats.stop)
+
+    def test_small_message_is_not_compressed(self):
+        msg = rpc_common.serialize_msg({'method': 'echo'}, compress=True)
+        self.assertEqual('2.0', msg['oslo.version'])
+        self.assertNotIn('oslo.compression', msg)
+
+    def test_large_message_is_compressed(self):
+        msg = rpc_common.serialize_msg(LARGE_MSG, compress=True)
+        self.assertEqual('2.1', msg['oslo.version'])
+        self.assertEqual('zlib', msg['oslo.compression'])
+        self.assertTrue(len(msg['oslo.message']) <
+                        cfg.CONF.rpc_compression_threshold)
+        self.assertEqual(LARGE_MSG, rpc_common.deserialize_msg(msg))
+
+    def test_compression_not_supported_by_receiver(self):
+        msg = rpc_common.serialize_msg(LARGE_MSG)
+        self.assertEqual('2.0', msg['oslo.version'])
+        self.assertNotIn('oslo.compression', msg)
+
+    def test_compression_disabled(self):
+        cfg.CONF.set_override('rpc_compression_threshold', 0)
+        msg = rpc_common.serialize_msg(LARGE_MSG, compress=True)
+        self.assertNotIn('oslo.compression', msg)
+
+    def test_batch_envelope_version(self):
+        msg = rpc_common.serialize_msg(
+            rpc_common.make_batch_msg([{'method': 'echo'}]))
+        self.assertEqual('2.1', msg['oslo.version'])
+
+    def test_unknown_compression(self):
+        msg = {'oslo.version': '2.1', 'oslo.message': '{}',
+               'oslo.compression': 'lzma'}
+        self.assertRaises(rpc_common.UnsupportedRpcEnvelopeVersion,
+                          rpc_common.deserialize_msg, msg)
+
+    def test_get_message_stats(self):
+        rpc_common._message_stats.update(
+            {'count': 0, 'total': 0, 'max': 0,
+             'compressed': 0, 'compressed_total': 0})
+        small = rpc_common.serialize_msg({})
+        large = rpc_common.serialize_msg(LARGE_MSG, compress=True)
+        stats = rpc_common.get_message_stats()
+        self.assertEqual(2, stats['count'])
+        self.assertEqual(len(small['oslo.message']) +
+                         len(rpc_common.jsonutils.dumps(LARGE_MSG)),
+                         stats['total'])
+        self.assertEqual(1, stats['compressed'])
+        self.assertEqual(len(large['oslo.message']),
+                         stats['compressed_total'])
+
+
+class TestReplyCompression(base.BaseTestCase):
+
+    def test_unpack_context_reply_compression(self):
+        ctxt = amqp.unpack_context(cfg.CONF,
+                                   {'_msg_id': 'id',
+                                    '_reply_compression': 'zlib'})
+        self.assertEqual('zlib', ctxt.deepcopy().reply_compression)
+        with mock.patch.object(amqp, 'msg_reply') as msg_reply:
+            ctxt.reply('result', connection_pool=mock.sentinel.pool)
+        msg_reply.assert_called_once_with(
+            cfg.CONF, 'id', None, mock.sentinel.pool, 'result', None,
+            False, True, True)
+
+    def test_msg_reply_compressed(self):
+        pool = mock.Mock()
+        conn = pool.get.return_value
+        amqp.msg_reply(cfg.CONF, 'id', None, pool, reply=LARGE_MSG,
+                       compress=True)
+        msg = conn.direct_send.call_args[0][1]
+        self.assertEqual('zlib', msg['oslo.compression'])
+        self.assertEqual(LARGE_MSG,
+                         rpc_common.deserialize_msg(msg)['result'])
+
+
+class TestBatch(base.BaseTestCase):
+
+    def test_proxy_callback_dispatches_batch(self):
+        callback = amqp.ProxyCallback(cfg.CONF, mock.Mock(), mock.Mock())
+        msgs = [{'method': 'port_update', 'args': {'port': 'p1'},
+                 'version': '1.1', 'namespace': None},
+                {'method': 'port_update', 'args': {'port': 'p2'},
+                 'version': '1.1', 'namespace': None}]
+        batch = rpc_common.make_batch_msg(msgs)
+        batch['_context_user_id'] = 'user'
+        with mock.patch.object(callback.pool, 'spawn_n') as spawn_n:
+            callback(batch)
+        self.assertEqual(2, spawn_n.call_count)
+        for call, msg in zip(spawn_n.call_args_list, msgs):
+            ctxt = call[0][1]
+            self.assertEqual('user', ctxt.user_id)
+            self.assertEqual(('1.1', 'port_update', None, msg['args']),
+                             call[0][2:])
+
+    def test_cast_batch(self):
+        rpc_proxy = proxy.RpcProxy('topic', '1.0')
+        with mock.patch.object(rpc, 'cast') as cast:
+            rpc_proxy.cast_batch(
+                mock.sentinel.context,
+                [rpc_proxy.make_msg('port_update', port='p%d' % i)
+                 for i in range(2)], version='1.1')
+        batch = cast.call_args[0][2]
+        self.assertEqual(['1.1', '1.1'],
+                         [msg['version'] for msg in batch['oslo.batch']])
+        cast.assert_called_once_with(mock.sentinel.context, 'topic', batch)
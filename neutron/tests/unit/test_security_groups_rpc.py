@@ -29,6 +29,7 @@ from neutron.agent import securitygroups_rpc as sg_rpc
 from neutron import context
 from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import securitygroup as ext_sg
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.tests import base
 from neutron.tests.unit import test_extension_security_group as test_sg
@@ -213,6 +214,75 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_info_for_devices_ipv4_source_group(self):
+
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', 'tcp', '24',
+                    '25', remote_group_id=sg2['security_group']['id'])
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, 201)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                devices = [port_id1, 'no_exist_device']
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                port_rpc = sg_info['devices'][port_id1]
+                expected = [{'direction': 'egress', 'ethertype': 'IPv4',
+                             'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': 'IPv6',
+                             'security_group_id': sg1_id},
+                            {'direction': u'ingress',
+                             'protocol': u'tcp', 'ethertype': u'IPv4',
+                             'port_range_max': 25, 'port_range_min': 24,
+                             'remote_group_id': sg2_id,
+                             'security_group_id': sg1_id},
+                            ]
+                # The rules are returned once per group, not per port
+                self.assertEqual([sg1_id], sg_info['security_groups'].keys())
+                self.assertEqual(
+                    sorted(sg_info['security_groups'][sg1_id]),
+                    sorted(expected))
+                self.assertEqual(port_rpc['security_group_rules'], [])
+                self.assertEqual(port_rpc['security_groups'], [sg1_id])
+                self.assertEqual(port_rpc['security_group_source_groups'],
+                                 [sg2_id])
+                self.assertEqual(sg_info['sg_member_ips'],
+                                 {sg2_id: {'IPv4': ['10.0.0.3'],
+                                           'IPv6': []}})
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
+    def test_security_group_info_for_devices_no_devices(self):
+        ctx = context.get_admin_context()
+        sg_info = self.rpc.security_group_info_for_devices(ctx, devices=[])
+        self.assertEqual({'devices': {},
+                          'security_groups': {},
+                          'sg_member_ips': {}}, sg_info)
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = test_fw.FAKE_PREFIX['IPv6']
         with self.network() as n:
@@ -437,6 +507,7 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.agent.firewall = self.firewall
         rpc = mock.Mock()
         self.agent.plugin_rpc = rpc
+        self.agent._use_enhanced_rpc = False
         self.fake_device = {'device': 'fake_device',
                             'security_groups': ['fake_sgid1', 'fake_sgid2'],
                             'security_group_source_groups': ['fake_sgid2'],
@@ -515,6 +586,130 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.firewall.assert_has_calls([])
 
 
+class SecurityGroupAgentEnhancedRpcTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupAgentEnhancedRpcTestCase, self).setUp()
+        self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
+        self.agent.context = None
+        self.firewall = mock.Mock()
+        firewall_object = firewall_base.FirewallDriver()
+        self.firewall.defer_apply.side_effect = firewall_object.defer_apply
+        self.firewall.supports_security_group_info = True
+        self.agent.firewall = self.firewall
+        rpc = mock.Mock()
+        self.agent.plugin_rpc = rpc
+        self.agent._use_enhanced_rpc = True
+        self.fake_device = {'device': 'fake_device',
+                            'security_groups': ['fake_sgid1'],
+                            'security_group_source_groups': ['fake_sgid2'],
+                            'security_group_rules': []}
+        self.firewall.ports = {'fake_device': self.fake_device}
+        self.rules = {'fake_sgid1': [{'security_group_id': 'fake_sgid1',
+                                      'direction': 'ingress',
+                                      'ethertype': 'IPv4',
+                                      'remote_group_id': 'fake_sgid2'}]}
+        self.members = {'fake_sgid2': {'IPv4': ['10.0.0.2'], 'IPv6': []}}
+        rpc.security_group_info_for_devices.return_value = {
+            'devices': {'fake_device': self.fake_device},
+            'security_groups': self.rules,
+            'sg_member_ips': self.members}
+
+    def test_prepare_devices_filter(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.plugin_rpc.security_group_info_for_devices.assert_has_calls(
+            [call(None, ['fake_device'])])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_rules_for_devices.called)
+        self.firewall.assert_has_calls(
+            [call.update_security_group_rules('fake_sgid1',
+                                              self.rules['fake_sgid1']),
+             call.update_security_group_members('fake_sgid2',
+                                                self.members['fake_sgid2']),
+             call.defer_apply(),
+             call.prepare_port_filter(self.fake_device)])
+
+    def test_security_groups_member_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.firewall.assert_has_calls(
+            [call.update_security_group_members('fake_sgid2',
+                                                self.members['fake_sgid2']),
+             call.defer_apply(),
+             call.update_port_filter(self.fake_device)])
+
+    def test_security_groups_rule_updated(self):
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.firewall.assert_has_calls(
+            [call.update_security_group_rules('fake_sgid1',
+                                              self.rules['fake_sgid1']),
+             call.update_security_group_members('fake_sgid2',
+                                                self.members['fake_sgid2']),
+             call.defer_apply(),
+             call.update_port_filter(self.fake_device)])
+
+    def test_enhanced_rpc_is_supported_by_server(self):
+        self.agent._use_enhanced_rpc = None
+        self.assertTrue(self.agent.use_enhanced_rpc)
+        self.agent.plugin_rpc.security_group_info_for_devices.assert_has_calls(
+            [call(None, [])])
+
+    def _test_enhanced_rpc_not_supported_by_server(self, exc):
+        self.agent._use_enhanced_rpc = None
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.side_effect = exc
+        rpc.security_group_rules_for_devices.return_value = {
+            'fake_device': self.fake_device}
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.refresh_firewall()
+        self.assertFalse(self.agent.use_enhanced_rpc)
+        # The server is only asked once
+        self.assertEqual(1, rpc.security_group_info_for_devices.call_count)
+        rpc.security_group_rules_for_devices.assert_has_calls(
+            [call(None, ['fake_device']), call(None, ['fake_device'])])
+
+    def test_enhanced_rpc_not_supported_by_server(self):
+        self._test_enhanced_rpc_not_supported_by_server(
+            rpc_common.RemoteError('UnsupportedRpcVersion'))
+
+    def test_enhanced_rpc_server_error(self):
+        self.agent._use_enhanced_rpc = None
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.side_effect = (
+            rpc_common.RemoteError('DBError'))
+        self.assertRaises(rpc_common.RemoteError,
+                          self.agent.prepare_devices_filter, ['fake_device'])
+        # The server is asked again on the next call
+        rpc.security_group_info_for_devices.side_effect = None
+        self.assertTrue(self.agent.use_enhanced_rpc)
+
+    def test_enhanced_rpc_not_supported_by_firewall(self):
+        self.agent._use_enhanced_rpc = None
+        self.firewall.supports_security_group_info = False
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_rules_for_devices.return_value = {
+            'fake_device': self.fake_device}
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.assertFalse(self.agent.use_enhanced_rpc)
+        self.assertFalse(rpc.security_group_info_for_devices.called)
+        rpc.security_group_rules_for_devices.assert_has_calls(
+            [call(None, ['fake_device'])])
+
+
+class SecurityGroupAgentRpcWithIpsetTestCase(
+    SecurityGroupAgentEnhancedRpcTestCase):
+    def setUp(self):
+        super(SecurityGroupAgentRpcWithIpsetTestCase, self).setUp()
+        cfg.CONF.set_override('enable_ipset', True, group='SECURITYGROUP')
+        self.addCleanup(cfg.CONF.reset)
+
+    def test_security_groups_member_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.firewall.assert_has_calls(
+            [call.update_security_group_members('fake_sgid2',
+                                                self.members['fake_sgid2'])])
+        # The port filters are not rebuilt
+        self.assertFalse(self.firewall.update_port_filter.called)
+
+
 class FakeSGRpcApi(agent_rpc.PluginApi,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
     pass
@@ -537,6 +732,17 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [call(None,
+             {'args':
+                 {'devices': ['fake_device']},
+             'method': 'security_group_info_for_devices',
+             'namespace': None},
+             version=sg_rpc.SG_INFO_RPC_VERSION,
+             topic='fake_topic')])
+
 
 class FakeSGNotifierAPI(proxy.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -1090,6 +1296,180 @@ COMMIT
 # Completed by iptables_manager
 """ % IPTABLES_ARG
 
+# Incremental updates of the filter table between the states above
+
+IPTABLES_DIFF_1_TO_1_2 = """# Generated by iptables_manager
+*filter
+:%(bn)s-i_port1 - [0:0]
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.4 -j RETURN
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+COMMIT
+# Completed by iptables_manager
+""" % IPTABLES_ARG
+
+IPTABLES_DIFF_2_TO_2_2 = """# Generated by iptables_manager
+*filter
+:%(bn)s-i_port1 - [0:0]
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+COMMIT
+# Completed by iptables_manager
+""" % IPTABLES_ARG
+
+IPTABLES_DIFF_1_2_TO_2 = """# Generated by iptables_manager
+*filter
+:%(bn)s-FORWARD - [0:0]
+:%(bn)s-INPUT - [0:0]
+:%(bn)s-i_port2 - [0:0]
+:%(bn)s-o_port2 - [0:0]
+:%(bn)s-sg-chain - [0:0]
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-o_port2
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port2 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port2 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port2 -s 10.0.0.3 -j RETURN
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
+-A %(bn)s-o_port2 -p udp -m udp --sport 68 --dport 67 -j RETURN
+-A %(bn)s-o_port2 ! -s 10.0.0.4 -j DROP
+-A %(bn)s-o_port2 -p udp -m udp --sport 67 --dport 68 -j DROP
+-A %(bn)s-o_port2 -m state --state INVALID -j DROP
+-A %(bn)s-o_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-o_port2 -j RETURN
+-A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-i_port2
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-o_port2
+-A %(bn)s-sg-chain -j ACCEPT
+COMMIT
+# Completed by iptables_manager
+""" % IPTABLES_ARG
+
+IPTABLES_DIFF_V6_1_TO_2 = """# Generated by iptables_manager
+*filter
+:%(bn)s-FORWARD - [0:0]
+:%(bn)s-INPUT - [0:0]
+:%(bn)s-i_port2 - [0:0]
+:%(bn)s-o_port2 - [0:0]
+:%(bn)s-sg-chain - [0:0]
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-o_port2
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
+-A %(bn)s-o_port2 -p icmpv6 -j RETURN
+-A %(bn)s-o_port2 -m state --state INVALID -j DROP
+-A %(bn)s-o_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-i_port2
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port2 \
+%(physdev_is_bridged)s -j %(bn)s-o_port2
+-A %(bn)s-sg-chain -j ACCEPT
+COMMIT
+# Completed by iptables_manager
+""" % IPTABLES_ARG
+
+# Same for IPv4 and IPv6
+IPTABLES_DIFF_2_TO_1 = """# Generated by iptables_manager
+*filter
+:%(bn)s-FORWARD - [0:0]
+:%(bn)s-INPUT - [0:0]
+:%(bn)s-i_port2 - [0:0]
+:%(bn)s-o_port2 - [0:0]
+:%(bn)s-sg-chain - [0:0]
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-sg-chain
+-A %(bn)s-INPUT %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-INGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev_mod)s --physdev-EGRESS tap_port1 \
+%(physdev_is_bridged)s -j %(bn)s-o_port1
+-A %(bn)s-sg-chain -j ACCEPT
+-X %(bn)s-i_port2
+-X %(bn)s-o_port2
+COMMIT
+# Completed by iptables_manager
+""" % IPTABLES_ARG
+
+# Same for IPv4 and IPv6
+IPTABLES_DIFF_1_TO_EMPTY = """# Generated by iptables_manager
+*filter
+:%(bn)s-FORWARD - [0:0]
+:%(bn)s-INPUT - [0:0]
+:%(bn)s-i_port1 - [0:0]
+:%(bn)s-o_port1 - [0:0]
+:%(bn)s-sg-chain - [0:0]
+-X %(bn)s-i_port1
+-X %(bn)s-o_port1
+COMMIT
+# Completed by iptables_manager
+""" % IPTABLES_ARG
+
+IPTABLES_DIFF_2_TO_2_3 = """# Generated by iptables_manager
+*filter
+:%(bn)s-i_port1 - [0:0]
+:%(bn)s-i_port2 - [0:0]
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port1 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port1 -s 10.0.0.4 -j RETURN
+-A %(bn)s-i_port1 -p icmp -j RETURN
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state RELATED,ESTABLISHED -j RETURN
+-A %(bn)s-i_port2 -s 10.0.0.2 -p udp -m udp --sport 67 --dport 68 -j RETURN
+-A %(bn)s-i_port2 -p tcp -m tcp --dport 22 -j RETURN
+-A %(bn)s-i_port2 -s 10.0.0.3 -j RETURN
+-A %(bn)s-i_port2 -p icmp -j RETURN
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+COMMIT
+# Completed by iptables_manager
+""" % IPTABLES_ARG
+
 FIREWALL_BASE_PACKAGE = 'neutron.agent.linux.iptables_firewall.'
 FIREWALL_IPTABLES_DRIVER = FIREWALL_BASE_PACKAGE + 'IptablesFirewallDriver'
 FIREWALL_HYBRID_DRIVER = (FIREWALL_BASE_PACKAGE +
@@ -1134,6 +1514,7 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
 
         self.rpc = mock.Mock()
         self.agent.plugin_rpc = self.rpc
+        self.agent._use_enhanced_rpc = False
         rule1 = [{'direction': 'ingress',
                   'protocol': 'udp',
                   'ethertype': 'IPv4',
@@ -1223,10 +1604,24 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
             process_input=self._regex(v6_filter),
             root_helper=self.root_helper).AndReturn('')
 
+    def _replay_iptables_diff(self, v4_diff, v6_diff):
+        # Only the changed chains are rewritten after the first apply
+        if v4_diff:
+            self.iptables.execute(
+                ['iptables-restore', '-n'],
+                process_input=self._regex(v4_diff),
+                root_helper=self.root_helper).AndReturn('')
+        if v6_diff:
+            self.iptables.execute(
+                ['ip6tables-restore', '-n'],
+                process_input=self._regex(v6_diff),
+                root_helper=self.root_helper).AndReturn('')
+
     def test_prepare_remove_port(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices1
         self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_EMPTY, IPTABLES_FILTER_V6_EMPTY)
+        self._replay_iptables_diff(IPTABLES_DIFF_1_TO_EMPTY,
+                                   IPTABLES_DIFF_1_TO_EMPTY)
         self.mox.ReplayAll()
 
         self.agent.prepare_devices_filter(['tap_port1'])
@@ -1236,11 +1631,14 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
     def test_security_group_member_updated(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices1
         self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_1_2, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_2_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_EMPTY, IPTABLES_FILTER_V6_EMPTY)
+        self._replay_iptables_diff(IPTABLES_DIFF_1_TO_1_2, None)
+        self._replay_iptables_diff(IPTABLES_DIFF_1_2_TO_2,
+                                   IPTABLES_DIFF_V6_1_TO_2)
+        self._replay_iptables_diff(IPTABLES_DIFF_2_TO_2_2, None)
+        self._replay_iptables_diff(IPTABLES_DIFF_2_TO_1,
+                                   IPTABLES_DIFF_2_TO_1)
+        self._replay_iptables_diff(IPTABLES_DIFF_1_TO_EMPTY,
+                                   IPTABLES_DIFF_1_TO_EMPTY)
         self.mox.ReplayAll()
 
         self.agent.prepare_devices_filter(['tap_port1'])
@@ -1257,7 +1655,7 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
     def test_security_group_rule_updated(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices2
         self._replay_iptables(IPTABLES_FILTER_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_2_3, IPTABLES_FILTER_V6_2)
+        self._replay_iptables_diff(IPTABLES_DIFF_2_TO_2_3, None)
         self.mox.ReplayAll()
 
         self.agent.prepare_devices_filter(['tap_port1', 'tap_port3'])
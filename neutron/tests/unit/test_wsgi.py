@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 import socket
 import urllib2
@@ -55,6 +56,45 @@ class TestWSGIServer(base.BaseTestCase):
         server.stop()
         server.wait()
 
+    @mock.patch('neutron.openstack.common.service.ProcessLauncher')
+    def test_start_multiple_workers(self, ProcessLauncher):
+        launcher = ProcessLauncher.return_value
+
+        server = wsgi.Server("test_multiple_processes")
+        server.start(None, 0, host="127.0.0.1", workers=2)
+        launcher.running = True
+        launcher.launch_service.assert_called_once_with(server._server,
+                                                        workers=2)
+
+        server.stop()
+        self.assertFalse(launcher.running)
+
+        server.wait()
+        launcher.wait.assert_called_once_with()
+
+    @mock.patch('neutron.openstack.common.service.ProcessLauncher')
+    def test_start_multiple_workers_shared_launcher(self, ProcessLauncher):
+        launcher = mock.Mock()
+
+        server = wsgi.Server("test_multiple_processes")
+        server.start(None, 0, host="127.0.0.1", workers=2, launcher=launcher)
+        launcher.launch_service.assert_called_once_with(server._server,
+                                                        workers=2)
+        self.assertFalse(ProcessLauncher.called)
+        server.stop()
+
+    def test_worker_service_drops_parent_db_connections(self):
+        server = wsgi.Server("test_worker")
+        server._socket = mock.Mock()
+        worker = wsgi.WorkerService(server, None)
+        with contextlib.nested(
+            mock.patch.object(wsgi.api, 'dispose'),
+            mock.patch.object(server.pool, 'spawn')
+        ) as (dispose, spawn):
+            worker.start()
+        dispose.assert_called_once_with()
+        spawn.assert_called_once_with(server._run, None, server._socket)
+
     def test_ipv6_listen_called_with_scope(self):
         server = wsgi.Server("test_app")
 
@@ -0,0 +1,132 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark concurrent port creation on a single /16 subnet.
+
+Ports are created by several threads through the db base plugin, either
+one by one or with create_port_bulk, and the throughput and number of
+failed requests (e.g. deadlocks) are reported. Use a MySQL or PostgreSQL
+connection to get meaningful locking behaviour:
+
+    python tools/ipam_benchmark.py --connection mysql://u:p@host/bench \\
+        --workers 8 --ports 2000 --bulk-size 50
+"""
+
+import optparse
+import sys
+import threading
+import time
+
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import config  # noqa
+from neutron import context
+from neutron.db import api as db
+from neutron.db import db_base_plugin_v2
+
+TENANT_ID = 'ipam-benchmark'
+
+
+def _context():
+    return context.Context('', TENANT_ID, is_admin=False)
+
+
+def _create_subnet(plugin, ctx, cidr):
+    network = plugin.create_network(ctx, {'network': {
+        'name': 'ipam-benchmark', 'admin_state_up': True,
+        'shared': False, 'tenant_id': TENANT_ID}})
+    return plugin.create_subnet(ctx, {'subnet': {
+        'name': 'ipam-benchmark', 'network_id': network['id'],
+        'tenant_id': TENANT_ID, 'cidr': cidr, 'ip_version': 4,
+        'enable_dhcp': True,
+        'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+        'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+        'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+        'host_routes': attributes.ATTR_NOT_SPECIFIED}})
+
+
+def _port(network_id):
+    return {'port': {'name': '', 'network_id': network_id,
+                     'tenant_id': TENANT_ID, 'admin_state_up': True,
+                     'device_id': '', 'device_owner': '',
+                     'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                     'fixed_ips': attributes.ATTR_NOT_SPECIFIED}}
+
+
+def _worker(plugin, network_id, count, bulk_size, results):
+    created = failed = 0
+    while created + failed < count:
+        size = min(bulk_size, count - created - failed)
+        ctx = _context()
+        try:
+            if bulk_size > 1:
+                plugin.create_port_bulk(
+                    ctx, {'ports': [_port(network_id)] * size})
+            else:
+                plugin.create_port(ctx, _port(network_id))
+            created += size
+        except Exception as e:
+            print >> sys.stderr, 'Port creation failed: %s' % e
+            failed += size
+    results.append((created, failed))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--connection', default='sqlite:///ipam_benchmark.db',
+                      help='SQLAlchemy connection string of a scratch '
+                           'database')
+    parser.add_option('--cidr', default='10.0.0.0/16')
+    parser.add_option('--workers', type='int', default=8)
+    parser.add_option('--ports', type='int', default=2000,
+                      help='Total number of ports to create')
+    parser.add_option('--bulk-size', type='int', default=1,
+                      help='Number of ports per request, 1 disables bulk')
+    options, args = parser.parse_args()
+
+    cfg.CONF([], project='neutron')
+    cfg.CONF.set_override('connection', options.connection, 'database')
+    db.configure_db()
+    plugin = db_base_plugin_v2.NeutronDbPluginV2()
+    subnet = _create_subnet(plugin, _context(), options.cidr)
+
+    results = []
+    per_worker = options.ports // options.workers
+    threads = [threading.Thread(target=_worker,
+                                args=(plugin, subnet['network_id'],
+                                      per_worker, options.bulk_size,
+                                      results))
+               for i in range(options.workers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    created = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+    print('%d ports created, %d failed in %.2fs (%.1f ports/s) with %d '
+          'workers and bulk size %d' %
+          (created, failed, elapsed, created / elapsed, options.workers,
+           options.bulk_size))
+    db.clear_db()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the policy checks done when listing ports.
+
+The checks done by the API for a list of ports, one check for the port
+and one for each attribute subject to the policy, are run with the
+compiled policy engine and with the generic check tree of the policy
+library. Run it from the top of the source tree to use etc/policy.json:
+
+    python tools/policy_benchmark.py --ports 1000
+"""
+
+import optparse
+import time
+
+from oslo.config import cfg
+
+from neutron.common import config  # noqa
+from neutron.common import exceptions
+from neutron import context
+from neutron.openstack.common import policy as common_policy
+from neutron.openstack.common import uuidutils
+from neutron import policy
+
+ATTRIBUTES = ['id', 'name', 'network_id', 'admin_state_up', 'status',
+              'mac_address', 'fixed_ips', 'device_id', 'device_owner',
+              'tenant_id', 'security_groups']
+# Attributes whose visibility is checked against the policy
+POLICY_ATTRIBUTES = ['binding:vif_type', 'binding:capabilities',
+                     'binding:host_id', 'binding:profile']
+
+
+def _generic_check(rule_names, target, credentials):
+    match_rule = common_policy.AndCheck(
+        [common_policy.RuleCheck('rule', rule_name)
+         for rule_name in rule_names])
+    return common_policy.check(match_rule, target, credentials)
+
+
+def _list_ports(ctx, ports):
+    visible = 0
+    for port in ports:
+        if not policy.check(ctx, 'get_port', port):
+            continue
+        for attr in POLICY_ATTRIBUTES:
+            try:
+                policy.check_if_exists(ctx, 'get_port:%s' % attr, port)
+            except exceptions.PolicyRuleNotFound:
+                pass
+        visible += 1
+    return visible
+
+
+def _run(ctx, ports, repeat):
+    start = time.time()
+    for i in range(repeat):
+        visible = _list_ports(ctx, ports)
+    return (time.time() - start) / repeat, visible
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--policy-file', default='policy.json')
+    parser.add_option('--ports', type='int', default=1000)
+    parser.add_option('--repeat', type='int', default=10)
+    options, args = parser.parse_args()
+
+    cfg.CONF([], project='neutron')
+    cfg.CONF.set_override('policy_file', options.policy_file)
+    tenant_id = uuidutils.generate_uuid()
+    ports = [dict((attr, None) for attr in ATTRIBUTES + POLICY_ATTRIBUTES)
+             for i in range(options.ports)]
+    for i, port in enumerate(ports):
+        port['tenant_id'] = tenant_id if i % 2 else 'somebody_else'
+    ctx = context.Context('', tenant_id, roles=['member'])
+
+    compiled, visible = _run(ctx, ports, options.repeat)
+    compiled_check = policy._check
+    policy._check = _generic_check
+    try:
+        generic, visible = _run(ctx, ports, options.repeat)
+    finally:
+        policy._check = compiled_check
+    print('%d ports (%d visible): %.1f ms with the compiled engine, '
+          '%.1f ms with the generic check tree' %
+          (options.ports, visible, compiled * 1000, generic * 1000))
+
+
+if __name__ == '__main__':
+    main()